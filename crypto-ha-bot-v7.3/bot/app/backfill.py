@@ -0,0 +1,176 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from binance.spot import Spot as SpotClient
+from .config import settings
+from .database import engine, Base, get_session, insert_ignore
+from .migrations import run_migrations
+from .models import MarketData, BackfillCheckpoint
+from .binance_client import get_client, set_client, weight_budget, ENDPOINT_WEIGHTS, INTERVAL_MS
+from .indicators import Bar, IndicatorSet
+
+# Historia świec z Binance klines do market_data, strona po stronie (PAGE świec na zapytanie).
+# Każda strona to jeden wielowierszowy INSERT IGNORE (duplikaty (pair, ts) pomijane) i zapis
+# checkpointu w tej samej transakcji, więc przerwany przebieg wznawia się od pierwszej
+# niezapisanej świecy, z tym samym stanem EMA. Wiersz = zamknięta świeca, ts = jej zamknięcie
+# (jak świece ze streamu). Bez --to: do najstarszego wiersza pary w market_data (albo do teraz).
+# Pary pobierane równolegle; waga zapytań liczona we wspólnym budżecie (--weight-per-min).
+# Retencja jest opt-in: domyślnie pobrana historia zostaje w 5m; dopiero przy RETENTION_ENABLED=true
+# świece starsze niż RETENTION_RAW_DAYS zwinie do 1h najbliższe zadanie retencji.
+
+PAGE = 1000
+
+def _dt(ms: int) -> datetime:
+    return datetime.utcfromtimestamp(ms / 1000)
+
+def _ms(dt: datetime) -> int:
+    return int((dt - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+def parse_when(v: str) -> datetime:
+    # ISO 8601 albo "30d"/"12h" wstecz od teraz, do pełnej doby/godziny: ponowne uruchomienie trafia w ten sam checkpoint
+    if v[:-1].isdigit() and v[-1] in "dh":
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        if v[-1] == "d":
+            return now.replace(hour=0) - timedelta(days=int(v[:-1]))
+        return now - timedelta(hours=int(v[:-1]))
+    d = datetime.fromisoformat(v.replace("Z", "+00:00"))
+    return d.replace(tzinfo=None) - (d.utcoffset() or timedelta(0)) if d.tzinfo else d
+
+class Backfill:
+    def __init__(self, client, interval: str = "5m"):
+        self.client = client
+        self.interval = interval
+        self.step = INTERVAL_MS[interval]
+        # prawdziwy klient liczy wagę w TrackedSession; inne (FakeSpot) tutaj
+        self.paced = not isinstance(client, SpotClient)
+        self.requests = 0
+
+    def _klines(self, pair: str, **kw) -> list:
+        if self.paced:
+            weight_budget.acquire(ENDPOINT_WEIGHTS["/api/v3/klines"])
+        self.requests += 1
+        return self.client.klines(pair, self.interval, **kw)
+
+    def _checkpoint(self, s, pair: str, start_ms: int, end_ms: int | None) -> BackfillCheckpoint:
+        cp = s.get(BackfillCheckpoint, (pair, self.interval, start_ms))
+        if cp is None:
+            if end_ms is None:
+                first = s.execute(select(func.min(MarketData.ts)).where(MarketData.pair == pair)).scalar()
+                end_ms = _ms(first) if first is not None else int(time.time() * 1000)
+                end_ms -= end_ms % self.step
+            cp = BackfillCheckpoint(pair=pair, interval=self.interval, start_ms=start_ms, end_ms=end_ms, next_ms=start_ms,
+                                    rows=0, done=False, updated_at=datetime.utcnow())
+            s.add(cp)
+            s.commit()
+        elif end_ms is not None and end_ms > cp.end_ms:
+            cp.end_ms, cp.done = end_ms, False  # ten sam początek, dalszy koniec: dociągnij od next_ms
+            s.commit()
+        return cp
+
+    def _indicators(self, pair: str, cp: BackfillCheckpoint) -> IndicatorSet:
+        ind = IndicatorSet()
+        if cp.indicators:
+            st = json.loads(cp.indicators)
+            for name, item in ind.items.items():
+                if name in st["items"]:
+                    item.load(st["items"][name])
+            ind.last_open_time = st["last_open_time"]
+        elif cp.next_ms == cp.start_ms:
+            # rozgrzewka EMA świecami sprzed zakresu: pierwsze wiersze od razu z wartościami
+            for k in self._klines(pair, endTime=cp.start_ms - 1, limit=settings.INDICATOR_WARMUP):
+                ind.update(Bar(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])))
+        return ind
+
+    def pair(self, pair: str, start_ms: int, end_ms: int | None = None) -> dict:
+        start_ms -= start_ms % self.step
+        if end_ms is not None:
+            end_ms -= end_ms % self.step
+        s = get_session()
+        try:
+            cp = self._checkpoint(s, pair, start_ms, end_ms)
+            if cp.done:
+                return {"pair": pair, "rows": cp.rows, "requests": 0, "done": True}
+            ind = self._indicators(pair, cp)
+            per_hour = 3_600_000 // self.step
+            requests = 0
+            while cp.next_ms < cp.end_ms:
+                now_ms = int(time.time() * 1000)
+                kl = self._klines(pair, startTime=cp.next_ms, endTime=cp.end_ms - 1, limit=PAGE)
+                requests += 1
+                closed = [k for k in kl if int(k[6]) < now_ms]
+                rows = []
+                for k in closed:
+                    ind.update(Bar(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])))
+                    v = ind.values()
+                    rows.append(dict(ts=_dt(int(k[0]) + self.step), pair=pair, price=float(k[4]), volume=float(k[5]),
+                                     trades_per_hour=int(k[8]) * per_hour, ema_fast=v.get("ema_fast"), ema_slow=v.get("ema_slow")))
+                if rows:
+                    s.execute(insert_ignore(MarketData), rows)
+                    cp.next_ms = int(closed[-1][0]) + self.step
+                    cp.rows += len(rows)
+                    cp.indicators = json.dumps({"last_open_time": ind.last_open_time,
+                                                "items": {n: i.state() for n, i in ind.items.items()}})
+                # mniej niż strona: w zakresie nie ma więcej świec (para notowana krócej, koniec w przyszłości)
+                exhausted = len(kl) < PAGE
+                cp.done = cp.next_ms >= cp.end_ms or (exhausted and cp.end_ms <= now_ms)
+                cp.updated_at = datetime.utcnow()
+                s.commit()
+                if exhausted or not rows:
+                    break
+            return {"pair": pair, "rows": cp.rows, "requests": requests, "done": cp.done}
+        finally:
+            s.close()
+
+    def run(self, pairs: list[str], start: datetime, end: datetime | None, concurrency: int) -> list[dict]:
+        start_ms, end_ms = _ms(start), (_ms(end) if end is not None else None)
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pairs))), thread_name_prefix="backfill") as ex:
+            return list(ex.map(lambda p: self.pair(p, start_ms, end_ms), pairs))
+
+def status() -> list[dict]:
+    s = get_session()
+    try:
+        rows = s.scalars(select(BackfillCheckpoint).order_by(BackfillCheckpoint.pair, BackfillCheckpoint.start_ms)).all()
+    finally:
+        s.close()
+    return [{"pair": r.pair, "interval": r.interval, "from": _dt(r.start_ms).isoformat(), "to": _dt(r.end_ms).isoformat(),
+             "next": _dt(r.next_ms).isoformat(), "rows": r.rows, "done": r.done} for r in rows]
+
+def main():
+    ap = argparse.ArgumentParser(description="Wznawialne pobranie historii świec (klines) do market_data")
+    ap.add_argument("--pairs", help="np. BTCUSDC,ETHUSDC (domyślnie DEFAULT_PAIRS)")
+    ap.add_argument("--from", dest="start", default="365d", help="ISO 8601 albo np. 365d (domyślnie rok wstecz)")
+    ap.add_argument("--to", dest="end", help="ISO 8601 albo np. 1d; domyślnie najstarszy wiersz pary w market_data")
+    ap.add_argument("--interval", default="5m", choices=list(INTERVAL_MS))
+    ap.add_argument("--concurrency", type=int, default=settings.COLLECTOR_CONCURRENCY)
+    ap.add_argument("--weight-per-min", type=int, default=settings.BINANCE_WEIGHT_PER_MIN,
+                    help="budżet wagi REST tego procesu (zostaw zapas dla działającego bota)")
+    ap.add_argument("--fake", action="store_true", help="FakeSpot zamiast Binance (offline)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="opóźnienie FakeSpot")
+    ap.add_argument("--status", action="store_true", help="pokaż checkpointy i zakończ")
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations()
+    if args.status:
+        for r in status():
+            print(r)
+        return
+    pairs = [p.strip().upper() for p in args.pairs.split(",") if p.strip()] if args.pairs else settings.DEFAULT_PAIRS
+    if args.fake:
+        from .fake_exchange import FakeSpot
+        set_client(FakeSpot(pairs, latency_ms=args.latency_ms))
+    weight_budget.limit = args.weight_per_min
+    bf = Backfill(get_client(), args.interval)
+    t = time.perf_counter()
+    results = bf.run(pairs, parse_when(args.start), parse_when(args.end) if args.end else None, args.concurrency)
+    dt = time.perf_counter() - t
+    for r in results:
+        print(r)
+    print(f"{len(pairs)} par, {sum(r['rows'] for r in results)} świec, {bf.requests} zapytań, {dt:.1f}s, "
+          f"oczekiwanie na wagę {weight_budget.throttled_sec:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import argparse
+import csv
+import json
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, asdict
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from .config import settings
+from .database import engine
+from .indicators import Bar, REGISTRY
+from .models import MarketData, PairConfig
+from .strategies import SimpleStrategy, StrategyParams
+
+# Offline replay market_data / plików OHLCV przez logikę SimpleStrategy z loop_task:
+# sprzedaż per pakiet (min zysk + histereza od szczytu), potem kupno z mnożnikiem i risk_scale.
+# Sygnały kupna liczone wektorowo; wyjście każdego pakietu rozwiązywane offline w O(n log n),
+# bo pakiety są od siebie niezależne (decyzja kupna nie zależy od otwartych pozycji).
+
+LOOKBACK_SEC = {"day": 86400, "week": 7 * 86400, "month": 30 * 86400}
+
+@dataclass
+class Series:
+    pair: str
+    ts: np.ndarray        # int64, sekundy UTC
+    price: np.ndarray     # float64
+    tph: np.ndarray       # float64
+    ema_fast: np.ndarray  # float64, NaN = brak
+
+@dataclass
+class PairResult:
+    pair: str
+    buys: int
+    sells: int
+    open_packages: int
+    realized_pnl_usd: float
+    unrealized_pnl_usd: float
+    fees_usd: float
+    max_drawdown_usd: float
+    max_exposure_usd: float
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    # minimum z okna [i-window+1, i] (van Herk/Gil-Werman: min prefiksów i sufiksów w blokach)
+    n = len(x)
+    if n == 0 or window <= 1:
+        return x.copy()
+    m = -(-n // window)
+    pad = np.full(m * window, np.inf)
+    pad[:n] = x
+    blocks = pad.reshape(m, window)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    out = np.empty(n)
+    head = min(window - 1, n)
+    out[:head] = np.minimum.accumulate(x[:head])
+    idx = np.arange(head, n)
+    out[head:] = np.minimum(suffix[idx - window + 1], prefix[idx])
+    return out
+
+def buy_signals(p: StrategyParams, price, ref_low, tph, downtrend):
+    # wektorowy odpowiednik SimpleStrategy.should_buy -> (kupno?, mnożnik)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(ref_low > 0, (price - ref_low) / ref_low * 100.0, np.inf)
+    near = (ref_low > 0) & (dd <= p.buy_drawdown_pct)
+    buy = (tph >= p.min_trades_per_hour) & (near | downtrend) & (price > 0)
+    mult = np.where(near & ~downtrend, 1.0, p.downtrend_multiplier)
+    return buy, mult
+
+def last_at_least(price: np.ndarray, hysteresis_pct: float) -> np.ndarray:
+    # L[t] = ostatni indeks j<t z price[j] >= price[t]/(1-h): pakiet kupiony w i<=L[t]
+    # ma od wejścia szczyt, od którego cena w t spadła o co najmniej histerezę
+    h = hysteresis_pct / 100.0
+    out = np.full(len(price), -1, dtype=np.int64)
+    stack_i: list[int] = []
+    stack_neg: list[float] = []  # -cena, rosnąco (ceny na stosie maleją)
+    for t, px in enumerate(price.tolist()):
+        while stack_neg and -stack_neg[-1] <= px:
+            stack_neg.pop(); stack_i.pop()
+        stack_neg.append(-px); stack_i.append(t)
+        x = px / (1 - h) if h < 1 else np.inf
+        k = bisect_right(stack_neg, -x) - 1
+        if k >= 0:
+            out[t] = min(stack_i[k], t - 1)
+    return out
+
+def exit_indices(p: StrategyParams, price: np.ndarray, entries: np.ndarray, cache: dict | None = None) -> np.ndarray:
+    # wyjście pakietu i = min t: L[t] >= i oraz price[t] >= price[i]*(1+min_profit);
+    # zapytania dominacji 2D offline: zdarzenia po L malejąco, drzewo Fenwicka (min t) po progu ceny
+    n = len(price)
+    out = np.full(len(entries), -1, dtype=np.int64)
+    if len(entries) == 0:
+        return out
+    key = ("L", p.hysteresis_pct)
+    L = cache.get(key) if cache is not None else None
+    if L is None:
+        L = last_at_least(price, p.hysteresis_pct)
+        if cache is not None: cache[key] = L
+    thr = price / (1 + p.min_profit_pct / 100.0)
+    ev = np.nonzero(L >= entries.min())[0]
+    if len(ev) == 0:
+        return out
+    ev = ev[np.argsort(-L[ev], kind="stable")]
+    levels = np.unique(thr[ev])[::-1]  # ranga 0 = najwyższy próg
+    ev_rank = np.searchsorted(-levels, -thr[ev])
+    size = len(levels)
+    tree = [n] * (size + 1)
+    q_order = np.argsort(-entries, kind="stable")
+    # pakiet o cenie wejścia e: pasują zdarzenia z progiem >= e -> prefiks rang [0, r)
+    q_rank = np.searchsorted(-levels, -price[entries], side="right")
+    ev_L = L[ev].tolist(); ev_t = ev.tolist(); ev_r = ev_rank.tolist()
+    j = 0
+    for qi in q_order.tolist():
+        i = int(entries[qi])
+        while j < len(ev_t) and ev_L[j] >= i:
+            r = ev_r[j] + 1; t = ev_t[j]
+            while r <= size:
+                if t < tree[r]: tree[r] = t
+                r += r & -r
+            j += 1
+        r = int(q_rank[qi]); best = n
+        while r > 0:
+            if tree[r] < best: best = tree[r]
+            r -= r & -r
+        if best < n:
+            out[qi] = best
+    return out
+
+def simulate(series: Series, params: StrategyParams, risk_level: int = 5, fee_pct: float = 0.0,
+             cache: dict | None = None) -> tuple[PairResult, np.ndarray]:
+    # cache (opcjonalny, per seria): wyniki zależne tylko od części parametrów, np. w sweepie
+    price, n = series.price, len(series.price)
+    if n == 0:
+        return PairResult(series.pair, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0), np.zeros(0)
+    step = float(np.median(np.diff(series.ts))) if n > 1 else 300.0
+    window = max(1, int(round(LOOKBACK_SEC.get(params.buy_lookback, 86400) / max(step, 1.0))))
+    ref_low = cache.get(("low", window)) if cache is not None else None
+    if ref_low is None:
+        ref_low = rolling_min(price, window)
+        if cache is not None: cache[("low", window)] = ref_low
+    downtrend = ~np.isnan(series.ema_fast) & (price < np.nan_to_num(series.ema_fast, nan=-np.inf))
+    buy, mult = buy_signals(params, price, ref_low, series.tph, downtrend)
+
+    entries = np.nonzero(buy)[0]
+    risk_scale = max(0.2, min(2.0, (risk_level + 1) / 5.0))
+    quote = params.base_package_usd * mult[entries] * risk_scale
+    qty = quote / price[entries]
+    exits = exit_indices(params, price, entries, cache)
+    sold = exits >= 0
+    fee = fee_pct / 100.0
+    cost = quote * (1 + fee)
+    exit_value = qty[sold] * price[exits[sold]]
+    fees = quote * fee
+    fees[sold] += exit_value * fee
+    pnl = exit_value * (1 - fee) - cost[sold]
+
+    # krzywa kapitału: zrealizowane + niezrealizowane (p_t*Q_t - C_t), wszystko przez różnice/cumsum
+    realized = np.zeros(n)
+    np.add.at(realized, exits[sold], pnl)
+    realized = np.cumsum(realized)
+    dq = np.zeros(n + 1); dc = np.zeros(n + 1)
+    np.add.at(dq, entries, qty); np.add.at(dc, entries, cost)
+    np.add.at(dq, exits[sold], -qty[sold]); np.add.at(dc, exits[sold], -cost[sold])
+    Q = np.cumsum(dq[:n]); C = np.cumsum(dc[:n])
+    equity = realized + price * Q - C
+    drawdown = float(np.max(np.maximum.accumulate(np.maximum(equity, 0.0)) - equity)) if n else 0.0
+    res = PairResult(
+        pair=series.pair, buys=int(len(entries)), sells=int(sold.sum()), open_packages=int((~sold).sum()),
+        realized_pnl_usd=float(pnl.sum()), unrealized_pnl_usd=float(price[-1] * Q[-1] - C[-1]),
+        fees_usd=float(fees.sum()), max_drawdown_usd=drawdown, max_exposure_usd=float(C.max()),
+    )
+    return res, equity
+
+def simulate_reference(series: Series, params: StrategyParams, risk_level: int = 5) -> PairResult:
+    # wolna pętla wywołująca SimpleStrategy wprost (tick po ticku) - do weryfikacji silnika wektorowego
+    strat = SimpleStrategy(params)
+    step = float(np.median(np.diff(series.ts))) if len(series.ts) > 1 else 300.0
+    window = max(1, int(round(LOOKBACK_SEC.get(params.buy_lookback, 86400) / max(step, 1.0))))
+    ref_low = rolling_min(series.price, window)
+    open_pkgs, realized, buys, sells = [], 0.0, 0, 0
+    for t in range(len(series.price)):
+        px = float(series.price[t])
+        for pk in list(open_pkgs):
+            pk[2] = max(pk[2], px)
+            sell, _ = strat.should_sell(px, pk[0], pk[2])
+            if sell:
+                realized += (px - pk[0]) * pk[1]; sells += 1
+                open_pkgs.remove(pk)
+        ema = series.ema_fast[t]
+        down = not np.isnan(ema) and px < ema
+        will_buy, _, mult = strat.should_buy(px, float(ref_low[t]), series.tph[t], down)
+        if will_buy and px:
+            quote = params.base_package_usd * mult * max(0.2, min(2.0, (risk_level + 1) / 5.0))
+            open_pkgs.append([px, quote / px, px]); buys += 1
+    last = float(series.price[-1]) if len(series.price) else 0.0
+    unreal = sum((last - e) * q for e, q, _ in open_pkgs)
+    return PairResult(series.pair, buys, sells, len(open_pkgs), realized, unreal, 0.0, 0.0, 0.0)
+
+def load_market_data(pairs: list[str] | None = None, since=None, until=None) -> dict[str, Series]:
+    q = select(MarketData.pair, MarketData.ts, MarketData.price, MarketData.trades_per_hour, MarketData.ema_fast)
+    if pairs: q = q.where(MarketData.pair.in_(pairs))
+    if since: q = q.where(MarketData.ts >= since)
+    if until: q = q.where(MarketData.ts < until)
+    cols: dict[str, tuple[list, list, list, list]] = {}
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(q.order_by(MarketData.pair, MarketData.ts))
+        for chunk in result.partitions(50_000):
+            for pair, ts, price, tph, ema_fast in chunk:
+                c = cols.setdefault(pair, ([], [], [], []))
+                c[0].append(ts); c[1].append(price); c[2].append(tph or 0); c[3].append(np.nan if ema_fast is None else ema_fast)
+    return {
+        pair: Series(pair, np.array(c[0], dtype="datetime64[s]").astype(np.int64), np.asarray(c[1], dtype=np.float64),
+                     np.asarray(c[2], dtype=np.float64), np.asarray(c[3], dtype=np.float64))
+        for pair, c in cols.items()
+    }
+
+def load_klines_csv(path: str, pair: str) -> Series:
+    # CSV w formacie klines Binance: open_time(ms), open, high, low, close, volume, close_time, quote_vol, trades, ...
+    # ema_fast liczona tym samym wskaźnikiem co bot (indicators.REGISTRY), NaN przed rozgrzaniem
+    ts, close, trades, ema_fast = [], [], [], []
+    ema = REGISTRY["ema_fast"]()
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip().lstrip("-").isdigit():
+                continue  # nagłówek
+            ts.append(int(row[0]) // 1000); close.append(float(row[4])); trades.append(int(float(row[8])) if len(row) > 8 else 0)
+            v = ema.update(Bar(int(row[0]), *(float(x) for x in row[1:6])))
+            ema_fast.append(np.nan if v is None else v)
+    ts_a = np.asarray(ts, dtype=np.int64)
+    price = np.asarray(close, dtype=np.float64)
+    step = float(np.median(np.diff(ts_a))) if len(ts_a) > 1 else 300.0
+    tph = np.asarray(trades, dtype=np.float64) * (3600.0 / max(step, 1.0))
+    return Series(pair, ts_a, price, tph, np.asarray(ema_fast, dtype=np.float64))
+
+def pair_risk_levels(pairs) -> dict[str, int]:
+    with engine.connect() as conn:
+        return {p: r for p, r in conn.execute(select(PairConfig.pair, PairConfig.risk_level).where(PairConfig.pair.in_(list(pairs))))}
+
+def combined_drawdown(series: dict[str, Series], equities: dict[str, np.ndarray]) -> float:
+    # krzywe par na wspólnej osi czasu (ostatnia znana wartość), potem max spadek od szczytu
+    if not equities:
+        return 0.0
+    axis = np.unique(np.concatenate([series[p].ts for p in equities]))
+    total = np.zeros(len(axis))
+    for p, eq in equities.items():
+        idx = np.searchsorted(series[p].ts, axis, side="right") - 1
+        total += np.where(idx >= 0, eq[np.maximum(idx, 0)], 0.0)
+    return float(np.max(np.maximum.accumulate(np.maximum(total, 0.0)) - total))
+
+def run_backtest(series: dict[str, Series], params: StrategyParams, risk: dict[str, int] | None = None, fee_pct: float = 0.0,
+                 caches: dict[str, dict] | None = None) -> dict:
+    risk = risk or {}
+    results, equities = [], {}
+    for pair, s in series.items():
+        cache = caches.setdefault(pair, {}) if caches is not None else None
+        res, eq = simulate(s, params, risk.get(pair, 5), fee_pct, cache)
+        results.append(res); equities[pair] = eq
+    return {
+        "params": asdict(params),
+        "realized_pnl_usd": sum(r.realized_pnl_usd for r in results),
+        "unrealized_pnl_usd": sum(r.unrealized_pnl_usd for r in results),
+        "buys": sum(r.buys for r in results),
+        "sells": sum(r.sells for r in results),
+        "max_drawdown_usd": combined_drawdown(series, equities),
+        "pairs": [asdict(r) for r in results],
+    }
+
+def params_from_settings() -> StrategyParams:
+    return StrategyParams(
+        min_profit_pct=settings.STRAT_MIN_PROFIT_PCT,
+        hysteresis_pct=settings.STRAT_HYSTERESIS_PCT,
+        buy_drawdown_pct=settings.STRAT_BUY_DRAWDOWN_PCT,
+        min_trades_per_hour=settings.STRAT_MIN_TRADES_PER_HOUR,
+        base_package_usd=settings.STRAT_BASE_PACKAGE_USD,
+        downtrend_multiplier=settings.STRAT_DOWNTREND_MULTIPLIER,
+        buy_lookback=settings.STRAT_BUY_LOOKBACK,
+    )
+
+def add_param_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--pairs", help="np. BTCUSDC,ETHUSDC (domyślnie wszystkie w market_data)")
+    ap.add_argument("--since", help="ISO, np. 2024-01-01")
+    ap.add_argument("--until")
+    ap.add_argument("--csv", action="append", default=[], help="PARA=ścieżka.csv (klines Binance), można powtarzać")
+    ap.add_argument("--export-dir", help="czytaj historię z plików app.export (mmap) zamiast z bazy")
+    ap.add_argument("--fee-pct", type=float, default=0.0)
+
+def load_series(args) -> dict[str, Series]:
+    if args.csv:
+        return {pair.upper(): load_klines_csv(path, pair.upper()) for pair, path in (c.split("=", 1) for c in args.csv)}
+    pairs = [p.strip().upper() for p in args.pairs.split(",")] if args.pairs else None
+    if args.export_dir:
+        from .export import load_series as load_exported
+        parse = lambda v: datetime.fromisoformat(v) if v else None
+        return load_exported(args.export_dir, pairs, parse(args.since), parse(args.until))
+    return load_market_data(pairs, args.since, args.until)
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest SimpleStrategy na market_data lub plikach klines CSV")
+    add_param_args(ap)
+    d = params_from_settings()
+    ap.add_argument("--min-profit-pct", type=float, default=d.min_profit_pct)
+    ap.add_argument("--hysteresis-pct", type=float, default=d.hysteresis_pct)
+    ap.add_argument("--buy-drawdown-pct", type=float, default=d.buy_drawdown_pct)
+    ap.add_argument("--min-trades-per-hour", type=int, default=d.min_trades_per_hour)
+    ap.add_argument("--base-package-usd", type=float, default=d.base_package_usd)
+    ap.add_argument("--downtrend-multiplier", type=float, default=d.downtrend_multiplier)
+    ap.add_argument("--buy-lookback", choices=list(LOOKBACK_SEC), default=d.buy_lookback)
+    args = ap.parse_args()
+    params = StrategyParams(
+        min_profit_pct=args.min_profit_pct,
+        hysteresis_pct=args.hysteresis_pct,
+        buy_drawdown_pct=args.buy_drawdown_pct,
+        min_trades_per_hour=args.min_trades_per_hour,
+        base_package_usd=args.base_package_usd,
+        downtrend_multiplier=args.downtrend_multiplier,
+        buy_lookback=args.buy_lookback,
+    )
+    t0 = time.perf_counter()
+    series = load_series(args)
+    t1 = time.perf_counter()
+    risk = {} if args.csv else pair_risk_levels(series)
+    report = run_backtest(series, params, risk, args.fee_pct)
+    report["rows"] = int(sum(len(s.price) for s in series.values()))
+    report["load_sec"] = round(t1 - t0, 3)
+    report["replay_sec"] = round(time.perf_counter() - t1, 3)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Benchmark bota bez testnetu i MariaDB: FakeSpot (fake_exchange.py) + lokalna baza SQLite
+# (domyślnie plik w /dev/shm) albo dowolny --db, np. jednorazowa MariaDB.
+#   python -m app.bench --pairs 10,100,500 --packages 5000 --latency-ms 20 --out bench.json
+#   python -m app.bench --baseline bench.json   # porównanie z poprzednim wynikiem
+# Dla każdej liczby par: kolektor (zimny i ciepły), ticki pętli handlu, ścieżki zleceń
+# i endpointy odczytu (cache trafiony i pominięty). Wyniki w JSON-ie do śledzenia regresji.
+# UWAGA: --db jest czyszczona (drop_all) przed każdym rozmiarem.
+
+READ_ENDPOINTS = ("/dashboard", "/logs?limit=100", "/alerts?limit=100", "/config", "/market/history?pair={pair}&limit=100",
+                  "/market/history?pair={pair}&from={start}&resolution=auto", "/portfolio/history")
+
+def _env(db_url: str):
+    # przed importem app.*: config czyta środowisko przy imporcie
+    os.environ["DB_URL"] = db_url
+    os.environ.update({"FX_ENABLED": "false", "EQUITIES_ENABLED": "false", "STREAM_ENABLED": "false",
+                       "RETENTION_ENABLED": "false", "WORKER_MODE": "external", "PROFILE_TICKS": "false"})
+
+def _pct(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    at = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"n": len(v), "mean_ms": round(statistics.fmean(v) * 1000, 3), "p50_ms": round(at(0.5) * 1000, 3),
+            "p99_ms": round(at(0.99) * 1000, 3), "max_ms": round(v[-1] * 1000, 3)}
+
+def _timed(fn, *a, **kw) -> float:
+    t = time.perf_counter()
+    fn(*a, **kw)
+    return time.perf_counter() - t
+
+def pair_names(n: int, quote: str = "USDC") -> list[str]:
+    return [f"B{i:04d}{quote}" for i in range(n)]
+
+def reset_state(pairs: list[str]):
+    from .database import Base, engine
+    from .migrations import run_migrations
+    from .indicators import indicator_engine
+    from .lookback import lookback_cache
+    from .symbols import symbol_index
+    from .cache import response_cache
+    from . import engine as trading_engine
+    from .portfolio import portfolio_tracker
+    from .positions import position_book
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations()
+    indicator_engine.pairs.clear(); indicator_engine.loaded.clear()
+    lookback_cache.windows.clear()
+    symbol_index.invalidate()
+    response_cache.invalidate()
+    trading_engine.last_alert.clear()
+    portfolio_tracker.reset()
+    position_book.reset()
+    now = datetime.utcnow()
+    # kolektory zewnętrzne i retencja poza pomiarem
+    trading_engine.last_fx_fetch = trading_engine.last_eq_fetch = trading_engine.last_retention = now
+
+def seed(fake, pairs: list[str], packages: int, logs: int, alerts: int):
+    from sqlalchemy import insert
+    from .database import get_session
+    from .models import Package, TradeLog, Alert
+    now = datetime.utcnow()
+    ms = int(time.time() * 1000)
+    pk, lg, al = [], [], []
+    for i in range(packages):
+        pair = pairs[i % len(pairs)]
+        px = fake.price(pair, ms - (i % 500) * 60_000)
+        # wejścia rozrzucone wokół bieżącej ceny: część pakietów spełni warunek sprzedaży
+        entry = px * (0.9 + (i % 21) / 100)
+        pk.append(dict(pair=pair, quantity=50 / entry, entry_price=entry, peak_price=entry, created_at=now - timedelta(minutes=i % 1000)))
+    for i in range(logs):
+        lg.append(dict(ts=now - timedelta(seconds=i), level="INFO", pair=pairs[i % len(pairs)], message=f"bench log {i}", strategy="BENCH"))
+    for i in range(alerts):
+        al.append(dict(ts=now - timedelta(seconds=i), pair=pairs[i % len(pairs)], pnl_usd=1.0, pnl_percent=5.0, type="positive"))
+    s = get_session()
+    for model, rows in ((Package, pk), (TradeLog, lg), (Alert, al)):
+        for i in range(0, len(rows), 5000):
+            s.execute(insert(model), rows[i:i + 5000])
+    s.commit(); s.close()
+
+def bench_collector(pairs: list[str], rounds: int) -> dict:
+    from .collector import fetch_and_store_pairs
+    from .indicators import indicator_engine
+    cold = _timed(fetch_and_store_pairs, pairs)  # pełne okno rozgrzewkowe INDICATOR_WARMUP
+    warm = []
+    for _ in range(rounds):
+        warm.append(_timed(fetch_and_store_pairs, pairs))  # przyrostowo od ostatniej świecy
+    # restart procesu: stan wskaźników z bazy zamiast okna rozgrzewkowego
+    indicator_engine.pairs.clear(); indicator_engine.loaded.clear()
+    restart = _timed(fetch_and_store_pairs, pairs)
+    return {"cold_sec": round(cold, 4), "warm": _pct(warm), "restart_sec": round(restart, 4)}
+
+def bench_ticks(pairs: list[str], rounds: int) -> dict:
+    # ciało loop_task bez snu: odczyt bot_control -> run_tick -> heartbeat
+    from .control import update_control, load_control, apply_control, heartbeat
+    from . import engine as trading_engine
+    update_control(running=True, autotrade=True, pairs=pairs)
+    durations, phases, queries = [], {}, []
+    for _ in range(rounds):
+        t = time.perf_counter()
+        ctrl = load_control()
+        apply_control(ctrl)
+        asyncio.run(trading_engine.run_tick(None, ctrl.autotrade))
+        heartbeat(trading_engine.WORKER_ID, dict(trading_engine.tick_stats))
+        durations.append(time.perf_counter() - t)
+        queries.append(trading_engine.tick_stats.get("queries", 0))
+        for k, v in trading_engine.tick_stats.get("phases", {}).items():
+            phases.setdefault(k, []).append(v)
+    return {"tick": _pct(durations), "db_queries_max": max(queries, default=0),
+            "snapshot_queries": trading_engine.tick_stats.get("snapshot_queries"),
+            "phases": {k: _pct(v) for k, v in sorted(phases.items())}}
+
+def bench_orders(pairs: list[str], rounds: int) -> dict:
+    from sqlalchemy import select
+    from .database import get_session
+    from .models import Package
+    from .orders import market_buy_package, market_sell_package, market_sell_packages
+    buy, sell, batch = [], [], []
+    for i in range(rounds):
+        pair = pairs[i % len(pairs)]
+        t = time.perf_counter()
+        res = market_buy_package(pair, 50)
+        buy.append(time.perf_counter() - t)
+        sell.append(_timed(market_sell_package, res["package_id"], pair))
+    batch_sizes = []
+    for pair in pairs[:rounds]:
+        s = get_session()
+        n = len(s.scalars(select(Package.id).where(Package.pair == pair, Package.sold_at.is_(None))).all())
+        s.close()
+        if n:
+            batch.append(_timed(market_sell_packages, pair))
+            batch_sizes.append(n)
+    return {"buy": _pct(buy), "sell": _pct(sell), "sell_batch": {**_pct(batch), "packages_mean": round(statistics.fmean(batch_sizes), 1) if batch_sizes else 0}}
+
+def bench_reads(pairs: list[str], rounds: int) -> dict:
+    from fastapi.testclient import TestClient
+    from .main import app
+    from .cache import response_cache
+    client = TestClient(app)  # bez startup: ani silnik, ani tailer zdarzeń
+    start = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S")
+    out = {}
+    for path in READ_ENDPOINTS:
+        url = path.format(pair=pairs[0], start=start)
+        miss, hit, revalidate = [], [], []
+        etag = None
+        for _ in range(rounds):
+            response_cache.invalidate()
+            t = time.perf_counter()
+            r = client.get(url)
+            miss.append(time.perf_counter() - t)
+            r.raise_for_status()
+            etag = r.headers.get("etag")
+        for _ in range(rounds):
+            hit.append(_timed(client.get, url))
+            if etag:
+                revalidate.append(_timed(client.get, url, headers={"If-None-Match": etag}))
+        out[path.split("?")[0] if "{start}" not in path else "/market/history (range)"] = {
+            "miss": _pct(miss), "hit": _pct(hit), "not_modified": _pct(revalidate), "bytes": len(r.content)}
+    return out
+
+def run_size(fake, n_pairs: int, args) -> dict:
+    from .binance_client import set_client
+    from .logger import log_sink
+    pairs = pair_names(n_pairs)
+    fake.pairs = pairs
+    fake.calls.clear()
+    set_client(fake)
+    reset_state(pairs)
+    t0 = time.perf_counter()
+    seed(fake, pairs, args.packages, args.logs, args.alerts)
+    result = {"pairs": n_pairs, "packages": args.packages, "seed_sec": round(time.perf_counter() - t0, 3)}
+    log_sink.start()
+    try:
+        result["collector"] = bench_collector(pairs, args.rounds)
+        result["ticks"] = bench_ticks(pairs, args.ticks)
+        result["orders"] = bench_orders(pairs, args.order_rounds)
+    finally:
+        log_sink.stop()
+    result["reads"] = bench_reads(pairs, args.read_rounds)
+    result["exchange_calls"] = dict(fake.calls)
+    return result
+
+def _flatten(d: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else str(k)
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and (key.endswith("_ms") or key.endswith("_sec")):
+            out[key] = float(v)
+    return out
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    # regresje mediany i czasów całkowitych większe niż threshold (ułamek) względem baseline;
+    # p99/max z kilkudziesięciu próbek są zbyt zaszumione, żeby na nich oblewać
+    old = {str(r["pairs"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in current.get("results", []):
+        b = old.get(str(r["pairs"]))
+        if b is None:
+            continue
+        fo, fn = _flatten(b), _flatten(r)
+        for key, v in fn.items():
+            if not (key.endswith("p50_ms") or key.endswith("_sec")):
+                continue
+            ov = fo.get(key)
+            if ov and v - ov >= 1e-3 * (1000 if key.endswith("_ms") else 1) and v > ov * (1 + threshold):
+                regressions.append(f"pairs={r['pairs']} {key}: {ov:g} -> {v:g} (+{(v / ov - 1) * 100:.0f}%)")
+    return regressions
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark kolektora, ticków, zleceń i endpointów na FakeSpot + lokalnej bazie")
+    ap.add_argument("--pairs", default="10,100,500", help="liczby par, np. 10,100,500")
+    ap.add_argument("--packages", type=int, default=5000, help="otwarte pakiety (łącznie, rozłożone na pary)")
+    ap.add_argument("--logs", type=int, default=20000)
+    ap.add_argument("--alerts", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="opóźnienie każdego wywołania FakeSpot")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--rounds", type=int, default=5, help="ciepłe przebiegi kolektora")
+    ap.add_argument("--ticks", type=int, default=3)
+    ap.add_argument("--order-rounds", type=int, default=20)
+    ap.add_argument("--read-rounds", type=int, default=30)
+    ap.add_argument("--db", help="URL SQLAlchemy (domyślnie SQLite w /dev/shm, usuwana po przebiegu)")
+    ap.add_argument("--out", help="zapisz wyniki do pliku JSON")
+    ap.add_argument("--baseline", help="poprzedni wynik JSON do porównania")
+    ap.add_argument("--threshold", type=float, default=0.2, help="próg regresji (0.2 = +20%%)")
+    args = ap.parse_args()
+
+    tmp = None
+    db_url = args.db
+    if not db_url:
+        tmp = tempfile.mkdtemp(prefix="bench-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        db_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    _env(db_url)
+    from .fake_exchange import FakeSpot
+    from .config import settings
+
+    fake = FakeSpot(latency_ms=args.latency_ms, seed=args.seed)
+    report = {
+        "meta": {"started_at": datetime.utcnow().isoformat(), "git": _git_rev(), "python": sys.version.split()[0],
+                 "platform": platform.platform(), "db": db_url.split("://")[0], "latency_ms": args.latency_ms,
+                 "seed": args.seed, "collector_concurrency": settings.COLLECTOR_CONCURRENCY},
+        "results": [],
+    }
+    try:
+        for n in (int(x) for x in args.pairs.split(",") if x.strip()):
+            t = time.perf_counter()
+            r = run_size(fake, n, args)
+            r["total_sec"] = round(time.perf_counter() - t, 2)
+            report["results"].append(r)
+            c, tk = r["collector"], r["ticks"]["tick"]
+            print(f"pairs={n:5d}  collector cold={c['cold_sec']:.3f}s warm p50={c['warm'].get('p50_ms')}ms  "
+                  f"tick p50={tk.get('p50_ms')}ms  dashboard hit p50={r['reads']['/dashboard']['hit'].get('p50_ms')}ms  "
+                  f"({r['total_sec']}s)", flush=True)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Zapisano {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for line in regressions:
+            print("REGRESJA", line)
+        if regressions:
+            sys.exit(1)
+        print("Brak regresji względem", args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,160 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
 from binance.spot import Spot as SpotClient
 from .config import settings
-def get_client():
+from .metrics import Gauge, binance_request_seconds, binance_weight, binance_errors
+
+# interwały klines Binance (ms) z otwarciem świec wyrównanym do epoki (3d/1w/1M mają inne wyrównanie)
+INTERVAL_MS = {"1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000, "1h": 3_600_000,
+               "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000, "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000}
+
+# szacunkowa waga endpointów (przed wysłaniem); rzeczywiste zużycie bierzemy z nagłówka X-MBX-USED-WEIGHT-1M
+ENDPOINT_WEIGHTS = {
+    "/api/v3/klines": 2,
+    "/api/v3/ticker/24hr": 2,
+    "/api/v3/exchangeInfo": 20,
+    "/api/v3/account": 20,
+    "/api/v3/order": 1,
+    "/api/v3/ping": 1,
+}
+
+class WeightBudget:
+    # Budżet wagi REST w bieżącej minucie (okno Binance resetuje się co pełną minutę).
+    # acquire() czeka, gdy zużycie + waga przekroczyłyby limit; observe() koryguje stan
+    # wartością z nagłówka odpowiedzi, a 429/418 blokuje wszystkich do Retry-After.
+    def __init__(self, limit_per_min: int):
+        self.limit = limit_per_min
+        self.minute = 0
+        self.used = 0
+        self.server_used = 0
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.throttled_sec = 0.0
+        self.lock = threading.Lock()
+
+    def _roll(self, now: float):
+        m = int(now // 60)
+        if m != self.minute:
+            self.minute, self.used, self.server_used = m, 0, 0
+
+    def acquire(self, weight: int = 1):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                self._roll(now)
+                if now >= self.blocked_until and (self.used + weight <= self.limit or self.used == 0):
+                    self.used += weight
+                    if waited:
+                        self.throttled += 1
+                        self.throttled_sec += waited
+                    return
+                # 429/418: do Retry-After; wyczerpany budżet: do początku następnej minuty
+                wait = max(self.blocked_until - now if now < self.blocked_until else (self.minute + 1) * 60 - now, 0.01)
+            time.sleep(wait)
+            waited += wait
+
+    def observe(self, headers, status_code: int):
+        with self.lock:
+            self._roll(time.time())
+            v = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("x-mbx-used-weight-1m")
+            if v is not None:
+                self.server_used = int(v)
+                self.used = max(self.used, self.server_used)
+            if status_code in (418, 429):
+                retry = float(headers.get("Retry-After", 60))
+                self.blocked_until = max(self.blocked_until, time.time() + retry)
+
+    def stats(self) -> dict:
+        return {"limit_per_min": self.limit, "used_1m": self.used, "server_used_1m": self.server_used,
+                "throttled": self.throttled, "throttled_sec": round(self.throttled_sec, 3)}
+
+class RequestStats:
+    # liczba wywołań, błędy, czas i szacowana waga per endpoint
+    def __init__(self):
+        self.endpoints: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def record(self, path: str, seconds: float, weight: int, error: bool):
+        with self.lock:
+            e = self.endpoints.setdefault(path, {"count": 0, "errors": 0, "total_sec": 0.0, "max_sec": 0.0, "weight": 0})
+            e["count"] += 1
+            e["errors"] += int(error)
+            e["total_sec"] += seconds
+            e["max_sec"] = max(e["max_sec"], seconds)
+            e["weight"] += weight
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {p: {**e, "avg_ms": round(e["total_sec"] / e["count"] * 1000, 2) if e["count"] else 0.0}
+                    for p, e in self.endpoints.items()}
+
+weight_budget = WeightBudget(settings.BINANCE_WEIGHT_PER_MIN)
+request_stats = RequestStats()
+Gauge("bot_binance_weight_used_1m", "Zużyta waga REST w bieżącej minucie (szacunek/nagłówek)", fn=lambda: weight_budget.used)
+Gauge("bot_binance_server_weight_1m", "X-MBX-USED-WEIGHT-1M z ostatniej odpowiedzi", fn=lambda: weight_budget.server_used)
+Gauge("bot_binance_throttled_seconds", "Łączny czas oczekiwania na budżet wagi", fn=lambda: weight_budget.throttled_sec)
+
+class TrackedSession(requests.Session):
+    # wspólna sesja keep-alive z pulą połączeń; każde zapytanie przechodzi przez budżet wagi
+    def __init__(self, pool_size: int):
+        super().__init__()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        path = urlsplit(url).path
+        weight = ENDPOINT_WEIGHTS.get(path, 1)
+        weight_budget.acquire(weight)
+        t0 = time.perf_counter()
+        binance_weight.inc(weight, endpoint=path)
+        try:
+            resp = super().request(method, url, *args, **kwargs)
+        except Exception:
+            dt = time.perf_counter() - t0
+            request_stats.record(path, dt, weight, True)
+            binance_request_seconds.observe(dt, endpoint=path)
+            binance_errors.inc(endpoint=path)
+            raise
+        dt = time.perf_counter() - t0
+        request_stats.record(path, dt, weight, resp.status_code >= 400)
+        binance_request_seconds.observe(dt, endpoint=path)
+        if resp.status_code >= 400:
+            binance_errors.inc(endpoint=path)
+        weight_budget.observe(resp.headers, resp.status_code)
+        return resp
+
+_client = None
+_client_lock = threading.Lock()
+
+def _make_client():
+    kw = {"timeout": settings.BINANCE_TIMEOUT_SEC}
     if settings.BINANCE_TESTNET:
-        return SpotClient(key=settings.BINANCE_API_KEY, secret=settings.BINANCE_API_SECRET, base_url='https://testnet.binance.vision')
-    return SpotClient(key=settings.BINANCE_API_KEY, secret=settings.BINANCE_API_SECRET)
+        kw["base_url"] = 'https://testnet.binance.vision'
+    client = SpotClient(api_key=settings.BINANCE_API_KEY, api_secret=settings.BINANCE_API_SECRET, **kw)
+    session = TrackedSession(settings.BINANCE_POOL_SIZE)
+    session.headers.update(client.session.headers)
+    client.session = session
+    return client
+
+def get_client():
+    # jeden długo żyjący klient na proces (zamiast nowej sesji HTTP i handshake TLS przy każdym wywołaniu)
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _make_client()
+    return _client
+
+def set_client(client):
+    # podmiana klienta procesu (np. FakeSpot w benchmarkach); None = utwórz ponownie z ustawień
+    global _client
+    with _client_lock:
+        _client = client
+
+def client_stats() -> dict:
+    return {"weight": weight_budget.stats(), "endpoints": request_stats.stats()}
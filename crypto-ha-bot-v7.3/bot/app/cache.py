@@ -0,0 +1,107 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from sqlalchemy import text
+from .config import settings
+from .database import engine
+
+# Cache odpowiedzi endpointów tylko do odczytu (/config, /logs, /alerts, /market/history, /dashboard, /portfolio/history).
+# Wersja danych = MAX(id) tabel + bot_control.version, sprawdzana jednym zapytaniem najwyżej
+# co RESPONSE_CACHE_TTL_SEC. Zapisy w tym procesie (kolektor, log sink, sterowanie) wołają
+# invalidate(temat), więc nowe wiersze widać od razu, a wpisy innych tematów zostają;
+# zapisy innego procesu (worker) po TTL.
+
+TOPICS = ("market", "logs", "alerts", "control", "portfolio")
+
+_VERSION_SQL = text(
+    "SELECT (SELECT MAX(id) FROM market_data), (SELECT MAX(id) FROM trade_logs), "
+    "(SELECT MAX(id) FROM alerts), (SELECT version FROM bot_control WHERE id = 1), (SELECT MAX(id) FROM portfolio_history)"
+)
+
+class CachedResponse:
+    __slots__ = ("version", "body", "etag", "last_modified")
+
+    def __init__(self, version, body: bytes, etag: str, last_modified: float):
+        self.version, self.body, self.etag, self.last_modified = version, body, etag, last_modified
+
+class ResponseCache:
+    def __init__(self, ttl_sec: float, max_entries: int):
+        self.ttl = ttl_sec
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.versions: dict[str, object] = {}
+        self.epochs = dict.fromkeys(TOPICS, 0)  # lokalne zmiany per temat, także te bez nowego MAX(id) (np. DELETE /alerts)
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def invalidate(self, *topics: str):
+        # bez argumentów: wszystkie tematy
+        with self.lock:
+            for t in topics or TOPICS:
+                self.epochs[t] += 1
+            self.checked_at = 0.0
+
+    def _current(self) -> dict[str, object]:
+        now = time.monotonic()
+        if now - self.checked_at < self.ttl and self.versions:
+            return self.versions
+        with engine.connect() as conn:
+            row = conn.execute(_VERSION_SQL).one()
+        with self.lock:
+            self.versions = dict(zip(TOPICS, row))
+            self.checked_at = now
+        return self.versions
+
+    def version(self, deps) -> tuple:
+        v = self._current()
+        return tuple((self.epochs[t], v[t]) for t in deps)
+
+    def get(self, key: str, deps, build) -> CachedResponse:
+        version = self.version(deps)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        body = json.dumps(build(), separators=(",", ":"), default=str).encode()
+        etag = 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        with self.lock:
+            self.misses += 1
+            old = self.entries.get(key)
+            # ta sama treść przy nowej wersji danych -> zachowaj Last-Modified
+            modified = old.last_modified if old is not None and old.etag == etag else time.time()
+            entry = self.entries[key] = CachedResponse(version, body, etag, modified)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def is_fresh(self, entry: CachedResponse, if_none_match: str | None, if_modified_since: str | None) -> bool:
+        if if_none_match:
+            fresh = entry.etag in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+        elif if_modified_since:
+            try:
+                fresh = int(entry.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                fresh = False
+        else:
+            return False
+        if fresh:
+            with self.lock:
+                self.not_modified += 1
+        return fresh
+
+    def headers(self, entry: CachedResponse) -> dict:
+        return {"ETag": entry.etag, "Last-Modified": formatdate(entry.last_modified, usegmt=True), "Cache-Control": "no-cache"}
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "not_modified": self.not_modified}
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_TTL_SEC, settings.RESPONSE_CACHE_MAX)
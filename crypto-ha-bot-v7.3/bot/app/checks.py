@@ -1,6 +1,7 @@
 from .config import settings
 from .database import engine
 from .binance_client import get_client
+from .symbols import symbol_index
 from sqlalchemy import text
 
 def check_db():
@@ -9,12 +10,19 @@ def check_db():
     return True
 
 def check_binance():
-    client = get_client()
-    exch = client.exchange_info()
-    return len(exch.get("symbols", []))
+    # ping + indeks filtrów symboli (jeden exchangeInfo, potem cache)
+    get_client().ping()
+    symbol_index.ensure()
+    return len(symbol_index.symbols)
 
 def is_quote_allowed(pair: str) -> bool:
-    # Na końcu pary zwykle jest quote (np. BTCUSDC -> USDC)
+    # quoteAsset z exchangeInfo; gdy indeks niedostępny - sufiks pary (np. BTCUSDC -> USDC)
+    try:
+        f = symbol_index.get(pair)
+    except Exception:
+        f = None
+    if symbol_index.symbols:
+        return f is not None and f.quote_asset in settings.ALLOWED_QUOTES
     for q in settings.ALLOWED_QUOTES:
         if pair.endswith(q):
             return True
@@ -1,29 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
 from .binance_client import get_client
-from .database import get_session
+from .database import get_session, insert_ignore, query_stats
 from .models import MarketData, FxRate, EquityPrice
 from .config import settings
-from .utils import ema
+from .logger import log
+from .pnl import update_peaks
+from .indicators import Bar, indicator_engine
+from .cache import response_cache
+from .portfolio import fx_cache, portfolio_tracker
+from .positions import position_book
 from datetime import datetime
+import time
 import requests
 
+BAR_MS = 300_000
+
+def _fetch_pair(client, pair: str, ts: datetime):
+    # Pobieramy tylko świece 5m od ostatniej policzonej (zwykle 2: zamknięta + bieżąca);
+    # pełne okno rozgrzewkowe tylko bez zapisanego stanu albo po zbyt długiej przerwie.
+    ind = indicator_engine.get(pair)
+    now_ms = int(time.time() * 1000)
+    missing = (now_ms - ind.last_open_time) // BAR_MS + 1 if ind.last_open_time is not None else None
+    if missing is None or missing > settings.INDICATOR_WARMUP:
+        indicator_engine.reset(pair)
+        kw = {"limit": settings.INDICATOR_WARMUP}
+    else:
+        kw = {"startTime": ind.last_open_time, "limit": int(missing) + 1}
+    klines = client.klines(pair, '5m', **kw)
+    if not klines:
+        return None
+    closed = [k for k in klines if int(k[6]) < now_ms]
+    values = indicator_engine.update(pair, (Bar(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in closed))
+    last = klines[-1]
+    tph_src = closed[-1] if closed else last
+    trades_5m = int(tph_src[8]) if len(tph_src) > 8 else 0
+    return dict(
+        ts=ts, pair=pair, price=float(last[4]), volume=float(last[5]),
+        trades_per_hour=trades_5m * 12, ema_fast=values["ema_fast"], ema_slow=values["ema_slow"]
+    )
+
+def _fetch_pair_safe(client, pair: str, ts: datetime):
+    try:
+        return _fetch_pair(client, pair, ts), None
+    except Exception as e:
+        return None, e
+
 def fetch_and_store_pairs(pairs: list[str]):
+    # Blokujące zapytania REST idą równolegle w puli wątków (limit COLLECTOR_CONCURRENCY),
+    # a wszystkie wiersze trafiają do bazy jednym wielowierszowym INSERT-em.
+    if not pairs:
+        return 0
     client = get_client()
-    s = get_session()
-    for pair in pairs:
-        # 12 ostatnich świec 5m do EMA (ok. 1h)
-        klines = client.klines(pair, '5m', limit=12)
-        if not klines: 
-            continue
-        prices = [float(k[4]) for k in klines]
-        volumes = [float(k[5]) for k in klines]
-        trades_5m = int(klines[-1][8]) if len(klines[-1]) > 8 else 0
-        tph = trades_5m * 12
-        row = MarketData(
-            ts=datetime.utcnow(), pair=pair, price=prices[-1], volume=volumes[-1], 
-            trades_per_hour=tph, ema_fast=ema(prices, 12), ema_slow=ema(prices, 26)
-        )
-        s.add(row)
-    s.commit(); s.close()
+    indicator_engine.ensure_loaded(pairs)
+    now = datetime.utcnow()
+    workers = max(1, min(settings.COLLECTOR_CONCURRENCY, len(pairs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="collector") as ex:
+        results = list(ex.map(query_stats.wrap(lambda p: _fetch_pair_safe(client, p, now)), pairs))
+    rows = []
+    for pair, (row, err) in zip(pairs, results):
+        if err is not None:
+            log(pair, f"Błąd pobierania klines: {err}", "WARN")
+        elif row:
+            rows.append(row)
+    if rows:
+        s = get_session()
+        s.execute(insert_ignore(MarketData), rows)
+        s.commit(); s.close()
+        response_cache.invalidate("market")
+        prices = {r["pair"]: r["price"] for r in rows}
+        update_peaks(prices)
+        position_book.observe_prices(prices)
+        portfolio_tracker.observe_prices(prices)
+        indicator_engine.save([r["pair"] for r in rows])
+    return len(rows)
 
 def fetch_fx():
     if not settings.FX_ENABLED:
@@ -38,6 +87,7 @@ def fetch_fx():
         for q, r in rates.items():
             s.add(FxRate(base="USD", quote=q, rate=float(r)))
         s.commit(); s.close()
+        fx_cache.set(rates)
     except Exception:
         pass
 
@@ -10,17 +10,47 @@ class Settings:
     BINANCE_TESTNET = getenv_bool("BINANCE_TESTNET", True)
     DEFAULT_PAIRS = [s.strip().upper() for s in os.getenv("DEFAULT_PAIRS","BTCUSDC,ETHUSDC").split(",") if s.strip()]
     ALLOWED_QUOTES = [s.strip().upper() for s in os.getenv("ALLOWED_QUOTES","USDC,BTC,BNB").split(",") if s.strip()]
+    BINANCE_WEIGHT_PER_MIN = int(os.getenv("BINANCE_WEIGHT_PER_MIN","1000"))  # limit Binance: 6000/min (testnet 1200)
+    BINANCE_TIMEOUT_SEC = float(os.getenv("BINANCE_TIMEOUT_SEC","10"))
+    BINANCE_POOL_SIZE = int(os.getenv("BINANCE_POOL_SIZE","16"))  # połączenia keep-alive w puli HTTP
+    SYMBOLS_REFRESH_SEC = int(os.getenv("SYMBOLS_REFRESH_SEC","3600"))  # odświeżanie filtrów z exchangeInfo
 
+    DB_URL = os.getenv("DB_URL","")  # pełny URL SQLAlchemy (np. sqlite:///bench.db); pusty = MariaDB z DB_*
     DB_HOST = os.getenv("DB_HOST","localhost")
     DB_PORT = int(os.getenv("DB_PORT","3306"))
     DB_NAME = os.getenv("DB_NAME","crypto_bot")
     DB_USER = os.getenv("DB_USER","crypto_bot")
     DB_PASSWORD = os.getenv("DB_PASSWORD","")
+    MIGRATE_DEDUPE_MARKET_DATA = getenv_bool("MIGRATE_DEDUPE_MARKET_DATA", False)  # migracja do unikalnego (pair, ts) kasuje duplikaty
 
     BOT_INTERVAL_SEC = int(os.getenv("BOT_INTERVAL_SEC","300"))
     BASE_CURRENCY = os.getenv("BASE_CURRENCY","PLN")
     SHOW_CHARTS = getenv_bool("SHOW_CHARTS", True)
     AUTO_TRADE = getenv_bool("AUTO_TRADE", False)
+    WORKER_MODE = os.getenv("WORKER_MODE","thread").lower()  # thread = pętla w wątku procesu API; external = python -m app.worker
+    CONTROL_POLL_SEC = float(os.getenv("CONTROL_POLL_SEC","5"))
+    WORKER_STALE_SEC = int(os.getenv("WORKER_STALE_SEC", str(2 * BOT_INTERVAL_SEC + 60)))  # bez heartbeatu dłużej = worker martwy
+    SHARD_ENABLED = getenv_bool("SHARD_ENABLED", False)  # kilka workerów dzieli pary przez dzierżawy w bazie
+    SHARD_LEASE_SEC = float(os.getenv("SHARD_LEASE_SEC","30"))  # po tylu sekundach bez odnowienia para przechodzi do innego workera
+    SHARD_RENEW_SEC = float(os.getenv("SHARD_RENEW_SEC","10"))
+    SHARD_VNODES = int(os.getenv("SHARD_VNODES","64"))  # wirtualne węzły na workera w pierścieniu haszującym
+    RESPONSE_CACHE_TTL_SEC = float(os.getenv("RESPONSE_CACHE_TTL_SEC","2"))  # jak często sprawdzać wersję danych w bazie
+    RESPONSE_CACHE_MAX = int(os.getenv("RESPONSE_CACHE_MAX","256"))
+    HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS","300"))  # domyślna liczba punktów/świec /market/history z zakresem
+    HISTORY_MAX_POINTS_LIMIT = int(os.getenv("HISTORY_MAX_POINTS_LIMIT","2000"))
+    EVENTS_POLL_SEC = float(os.getenv("EVENTS_POLL_SEC","1"))  # tailer SSE /events (jeden na proces API)
+    EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER","1000"))  # bufor do odtworzenia po Last-Event-ID
+    EVENTS_BATCH = int(os.getenv("EVENTS_BATCH","500"))
+    EVENTS_KEEPALIVE_SEC = float(os.getenv("EVENTS_KEEPALIVE_SEC","15"))
+    METRICS_PORT = int(os.getenv("METRICS_PORT","9108"))  # /metrics workera (WORKER_MODE=external); 0 = wyłączone
+    PROFILE_TICKS = getenv_bool("PROFILE_TICKS", False)  # profiler próbkujący; zapis najwolniejszego ticku
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS","5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR","profiles")
+    STREAM_ENABLED = getenv_bool("STREAM_ENABLED", False)
+    STREAM_STALE_SEC = int(os.getenv("STREAM_STALE_SEC","60"))
+    BINANCE_WS_URL = os.getenv("BINANCE_WS_URL","")  # pusty = domyślny stream Binance (testnet/prod)
+    COLLECTOR_CONCURRENCY = int(os.getenv("COLLECTOR_CONCURRENCY","8"))
+    INDICATOR_WARMUP = int(os.getenv("INDICATOR_WARMUP","100"))  # świec 5m do rozgrzania EMA bez zapisanego stanu
 
     STRAT_MIN_PROFIT_PCT = float(os.getenv("STRAT_MIN_PROFIT_PCT","5.0"))
     STRAT_HYSTERESIS_PCT = float(os.getenv("STRAT_HYSTERESIS_PCT","1.0"))
@@ -29,11 +59,32 @@ class Settings:
     STRAT_BASE_PACKAGE_USD = float(os.getenv("STRAT_BASE_PACKAGE_USD","50.0"))
     STRAT_DOWNTREND_MULTIPLIER = float(os.getenv("STRAT_DOWNTREND_MULTIPLIER","2.0"))
     STRAT_BUY_LOOKBACK = os.getenv("STRAT_BUY_LOOKBACK","day").lower()
+    LOOKBACK_PERSIST = getenv_bool("LOOKBACK_PERSIST", True)  # świece 1h week/month także w bazie
 
     ALERT_PNL_POSITIVE = float(os.getenv("ALERT_PNL_POSITIVE","10"))
     ALERT_PNL_NEGATIVE = float(os.getenv("ALERT_PNL_NEGATIVE","-5"))
 
+    LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX","10000"))
+    LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE","200"))
+    LOG_FLUSH_SEC = float(os.getenv("LOG_FLUSH_SEC","2"))
+    LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY","drop").lower()  # drop | block
+    LOG_QUEUE_BLOCK_SEC = float(os.getenv("LOG_QUEUE_BLOCK_SEC","5"))
+
+    RETENTION_ENABLED = getenv_bool("RETENTION_ENABLED", False)  # opt-in: kasuje surowe 5m starsze niż RETENTION_RAW_DAYS
+    RETENTION_RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS","30"))    # 5m -> świece 1h
+    RETENTION_1H_DAYS = int(os.getenv("RETENTION_1H_DAYS","365"))     # 1h -> świece 1d
+    RETENTION_BATCH = int(os.getenv("RETENTION_BATCH","5000"))
+    RETENTION_INTERVAL_SEC = int(os.getenv("RETENTION_INTERVAL_SEC","3600"))
+    LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS","0"))      # opt-in: trade_logs; 0 = bez limitu (nic nie kasuje)
+    ALERT_RETENTION_DAYS = int(os.getenv("ALERT_RETENTION_DAYS","0"))  # alerts; 0 = bez limitu
+    LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR","")                  # JSONL.gz przed skasowaniem; puste = bez archiwum
+    LOGS_PAGE_MAX = int(os.getenv("LOGS_PAGE_MAX","1000"))
+    EXPORT_DIR = os.getenv("EXPORT_DIR","")                  # eksport Arrow przed retencją; puste = wyłączony
+    EXPORT_BATCH = int(os.getenv("EXPORT_BATCH","200000"))
+    EXPORT_MAX_PARTS = int(os.getenv("EXPORT_MAX_PARTS","8"))  # części miesiąca pary przed scaleniem
+
     FX_ENABLED = getenv_bool("FX_ENABLED", True)
+    FX_CACHE_SEC = float(os.getenv("FX_CACHE_SEC","300"))  # jak często proces doczytuje najnowsze kursy z fx_rates
     EQUITIES_ENABLED = getenv_bool("EQUITIES_ENABLED", False)
 
     API_BIND = os.getenv("API_BIND","0.0.0.0")
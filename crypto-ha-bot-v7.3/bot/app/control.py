@@ -0,0 +1,110 @@
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, delete
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .database import get_session
+from .models import BotControl, WorkerHeartbeat
+from .cache import response_cache
+
+# Kanał sterowania API -> worker: wiersz bot_control (id=1). API tylko zapisuje intencję
+# (/start, /stop, /autotrade, PUT /config), worker czyta ją przed każdą iteracją
+# i odsyła heartbeat ze statystykami ostatniego ticku (worker_heartbeats, wiersz per worker).
+
+# pole /config -> (atrybut settings, typ)
+STRATEGY_FIELDS = {
+    "min_profit_pct": ("STRAT_MIN_PROFIT_PCT", float),
+    "hysteresis_pct": ("STRAT_HYSTERESIS_PCT", float),
+    "buy_drawdown_pct": ("STRAT_BUY_DRAWDOWN_PCT", float),
+    "min_trades_per_hour": ("STRAT_MIN_TRADES_PER_HOUR", int),
+    "base_package_usd": ("STRAT_BASE_PACKAGE_USD", float),
+    "downtrend_multiplier": ("STRAT_DOWNTREND_MULTIPLIER", float),
+    "buy_lookback": ("STRAT_BUY_LOOKBACK", lambda v: str(v).lower()),
+}
+
+@dataclass
+class ControlState:
+    running: bool
+    autotrade: bool
+    pairs: list[str]
+    strategy: dict = field(default_factory=dict)
+    version: int = 0
+
+def _state(row: BotControl) -> ControlState:
+    return ControlState(running=bool(row.running), autotrade=bool(row.autotrade), pairs=json.loads(row.pairs or "[]"),
+                        strategy=json.loads(row.strategy or "{}"), version=row.version)
+
+def _row(s) -> BotControl:
+    row = s.get(BotControl, 1)
+    if row is None:
+        # pierwsze uruchomienie: wartości startowe z .env
+        s.add(BotControl(id=1, running=False, autotrade=settings.AUTO_TRADE, pairs=json.dumps(settings.DEFAULT_PAIRS),
+                         strategy="{}", version=1, updated_at=datetime.utcnow()))
+        try:
+            s.commit()
+        except IntegrityError:
+            s.rollback()
+        row = s.get(BotControl, 1)
+    return row
+
+def load_control() -> ControlState:
+    s = get_session()
+    try:
+        return _state(_row(s))
+    finally:
+        s.close()
+
+def update_control(running: bool | None = None, autotrade: bool | None = None,
+                   pairs: list[str] | None = None, strategy: dict | None = None) -> ControlState:
+    s = get_session()
+    try:
+        row = _row(s)
+        s.refresh(row, with_for_update=True)
+        if running is not None: row.running = bool(running)
+        if autotrade is not None: row.autotrade = bool(autotrade)
+        if pairs is not None: row.pairs = json.dumps(pairs)
+        if strategy:
+            cur = json.loads(row.strategy or "{}")
+            cur.update({k: STRATEGY_FIELDS[k][1](v) for k, v in strategy.items() if k in STRATEGY_FIELDS and v is not None})
+            row.strategy = json.dumps(cur)
+        row.version += 1
+        row.updated_at = datetime.utcnow()
+        s.commit()
+        response_cache.invalidate("control")
+        return _state(row)
+    finally:
+        s.close()
+
+def apply_control(ctrl: ControlState):
+    # nadpisania z bot_control -> settings bieżącego procesu (API: odczyt /config; worker: strategia i pary)
+    settings.DEFAULT_PAIRS = list(ctrl.pairs)
+    for k, v in ctrl.strategy.items():
+        if k in STRATEGY_FIELDS:
+            setattr(settings, STRATEGY_FIELDS[k][0], v)
+
+def heartbeat(worker_id: str, stats: dict):
+    # wiersz per worker (worker_heartbeats); wpisy nieodzywających się od doby kasowane
+    now = datetime.utcnow()
+    values = dict(seen_at=now, running=bool(stats.get("running")), stats=json.dumps(stats, default=str))
+    s = get_session()
+    try:
+        if not s.execute(update(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == worker_id).values(**values)).rowcount:
+            s.execute(insert(WorkerHeartbeat).values(worker_id=worker_id, **values))
+            s.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.seen_at < now - timedelta(days=1)))
+        s.commit()
+    except IntegrityError:
+        s.rollback()
+    finally:
+        s.close()
+
+def load_heartbeats() -> list[dict]:
+    # najświeższe pierwsze; alive=False: brak heartbeatu dłużej niż WORKER_STALE_SEC
+    s = get_session()
+    try:
+        rows = s.scalars(select(WorkerHeartbeat).order_by(WorkerHeartbeat.seen_at.desc())).all()
+    finally:
+        s.close()
+    stale = datetime.utcnow() - timedelta(seconds=settings.WORKER_STALE_SEC)
+    return [{"id": r.worker_id, "seen_at": r.seen_at.isoformat(), "alive": r.seen_at >= stale, "running": bool(r.running),
+             "last_tick": json.loads(r.stats or "{}")} for r in rows]
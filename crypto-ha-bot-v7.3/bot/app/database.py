@@ -1,12 +1,89 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event, insert
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
+from .metrics import db_query_seconds
 
 class Base(DeclarativeBase): pass
 
 def make_db_url():
+    if settings.DB_URL:
+        return settings.DB_URL
     return f"mysql+pymysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
-engine = create_engine(make_db_url(), pool_pre_ping=True, pool_recycle=3600, pool_size=5, max_overflow=10)
+def make_engine(url: str):
+    # SQLite (benchmarki, uruchomienia lokalne): połączenia używane z wielu wątków
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+    return create_engine(url, pool_pre_ping=True, pool_recycle=3600, pool_size=5, max_overflow=10)
+
+engine = make_engine(make_db_url())
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 def get_session(): return SessionLocal()
+
+def insert_ignore(model):
+    # wielowierszowy INSERT pomijający wiersze łamiące klucz unikalny (np. market_data (pair, ts))
+    return insert(model).prefix_with("OR IGNORE" if engine.dialect.name == "sqlite" else "IGNORE")
+
+class TickQueries:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count, self.seconds = 0, 0.0
+
+class QueryStats:
+    # licznik zapytań SQL (i ich czasu) dla całego procesu; pomiar = różnica dwóch odczytów.
+    # Tick silnika liczy osobno (track()): licznik w ContextVar widzą wątki asyncio.to_thread
+    # (kopiują kontekst) i pula kolektora (wrap()), a nie API, log sink czy dzierżawy.
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.current: ContextVar[TickQueries | None] = ContextVar("tick_queries", default=None)
+
+    def snapshot(self) -> tuple[int, float]:
+        return self.count, self.seconds
+
+    @contextmanager
+    def track(self):
+        tq = TickQueries()
+        token = self.current.set(tq)
+        try:
+            yield tq
+        finally:
+            self.current.reset(token)
+
+    def wrap(self, fn):
+        # funkcja dla puli wątków: zapytania liczone do bieżącego ticku (jeśli jest)
+        tq = self.current.get()
+        if tq is None:
+            return fn
+        def run(*a, **kw):
+            token = self.current.set(tq)
+            try:
+                return fn(*a, **kw)
+            finally:
+                self.current.reset(token)
+        return run
+
+query_stats = QueryStats()
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    query_stats.local.t0 = time.perf_counter()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    dt = time.perf_counter() - getattr(query_stats.local, "t0", time.perf_counter())
+    tq = query_stats.current.get()
+    with query_stats.lock:
+        query_stats.count += 1
+        query_stats.seconds += dt
+        if tq is not None:
+            tq.count += 1
+            tq.seconds += dt
+    db_query_seconds.observe(dt)
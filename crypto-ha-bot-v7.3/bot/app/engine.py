@@ -0,0 +1,292 @@
+import asyncio
+import threading
+from datetime import datetime
+from .config import settings
+from .database import get_session, insert_ignore, query_stats
+from .models import MarketData
+from .collector import fetch_and_store_pairs, fetch_fx, fetch_equities
+from .strategies import SimpleStrategy, StrategyParams
+from .logger import log, add_alert
+from .pnl import update_peaks
+from .snapshot import load_snapshots, PairSnapshot
+from .positions import position_book
+from .checks import is_quote_allowed
+from .binance_client import get_client
+from .stream import MarketState, MarketStream
+from .lookback import lookback_cache
+from .indicators import indicator_engine
+from .retention import run_retention
+from .control import load_control, apply_control, heartbeat
+from .cache import response_cache
+from .metrics import tick_timer, profiler
+from .sharding import shard, WORKER_ID
+from .portfolio import portfolio_tracker
+
+# Silnik handlu: własna pętla asyncio w osobnym wątku (WORKER_MODE=thread) albo w osobnym
+# procesie (python -m app.worker). Synchroniczne wywołania SQLAlchemy/Binance blokują tylko
+# tę pętlę, a nie pętlę uvicorn obsługującą API. Sterowanie przez bot_control (control.py).
+# SHARD_ENABLED: kilka takich procesów dzieli pary przez dzierżawy w bazie (sharding.py).
+
+last_alert = {}
+last_fx_fetch = None
+last_eq_fetch = None
+last_retention = None
+market_state = MarketState()
+market_stream: MarketStream | None = None
+last_pairs: set[str] = set()  # pary poprzedniego ticku (sharding: wykrycie przejętych par)
+tick_stats = {}  # liczba zapytań SQL w ostatnim ticku (snapshot powinien być stały: 4)
+
+def active_pairs() -> list[str]:
+    # pary tego workera: wszystkie albo (sharding) tylko te z ważną dzierżawą
+    return shard.mine(settings.DEFAULT_PAIRS) if shard is not None else list(settings.DEFAULT_PAIRS)
+
+def owns(pair: str) -> bool:
+    # sprawdzane tuż przed zleceniem: dzierżawa mogła wygasnąć w trakcie ticku
+    return shard is None or shard.owns(pair)
+
+def build_strategy() -> SimpleStrategy:
+    params = StrategyParams(
+        min_profit_pct=settings.STRAT_MIN_PROFIT_PCT,
+        hysteresis_pct=settings.STRAT_HYSTERESIS_PCT,
+        buy_drawdown_pct=settings.STRAT_BUY_DRAWDOWN_PCT,
+        min_trades_per_hour=settings.STRAT_MIN_TRADES_PER_HOUR,
+        base_package_usd=settings.STRAT_BASE_PACKAGE_USD,
+        downtrend_multiplier=settings.STRAT_DOWNTREND_MULTIPLIER,
+        buy_lookback=settings.STRAT_BUY_LOOKBACK,
+    )
+    return SimpleStrategy(params)
+
+def evaluate_pair(snap: PairSnapshot, strat: SimpleStrategy, client):
+    pair = snap.pair
+    if not is_quote_allowed(pair):
+        return
+
+    # pair-specific config
+    risk_level = snap.risk_level
+    if not snap.allowed:
+        log(pair, "Para wyłączona w konfiguracji", "DEBUG")
+        return
+
+    # bieżące dane (ze streamu, jeśli świeży; inaczej ze snapshotu z bazy)
+    st = market_state.fresh(pair) if market_stream is not None else None
+    price_now = st.last_price if st else snap.price
+    tph = st.trades_per_hour if st and st.trades_per_hour is not None else snap.tph
+
+    # EMA i downtrend
+    ema_fast = st.ema_fast if st and st.ema_fast is not None else snap.ema_fast
+    is_downtrend = (ema_fast is not None) and price_now is not None and price_now < ema_fast
+
+    # low wg lookback
+    with tick_timer.phase("ref_low"):
+        ref_low = 0.0
+        try:
+            if settings.STRAT_BUY_LOOKBACK == "day":
+                if st and st.low_24h is not None:
+                    ref_low = st.low_24h
+                else:
+                    t24 = client.ticker_24hr(symbol=pair)
+                    ref_low = float(t24.get("lowPrice", 0) or 0)
+            else:
+                # week = 7d, month = 30d; okno 1h trzymane w pamięci i dociągane przyrostowo
+                ref_low = lookback_cache.ref_low(client, pair, settings.STRAT_BUY_LOOKBACK)
+        except Exception:
+            ref_low = 0.0
+
+    # SELL: pakiety spełniające warunek zamykane jednym zleceniem zbiorczym
+    with tick_timer.phase("sell"):
+        to_sell = []
+        for p in position_book.open_packages(pair):
+            pk = p.peak or price_now or p.entry_price
+            sell, reason = strat.should_sell(price_now or p.entry_price, p.entry_price, pk)
+            if sell:
+                to_sell.append((p, reason))
+        if to_sell and not owns(pair):
+            log(pair, "Pominięto sprzedaż: utracona dzierżawa pary", "WARN", strategy=strat.name)
+        elif to_sell:
+            from .orders import market_sell_package, market_sell_packages
+            try:
+                if len(to_sell) == 1:
+                    market_sell_package(to_sell[0][0].id, pair, price_now)
+                else:
+                    market_sell_packages(pair, [p.id for p, _ in to_sell], price_now)
+                for p, reason in to_sell:
+                    log(pair, f"AUTOSPRZEDAŻ: {reason}", "INFO", strategy=strat.name)
+            except Exception as e:
+                log(pair, f"Błąd sprzedaży: {e}", "ERROR", strategy=strat.name)
+
+    # BUY wg strategii
+    with tick_timer.phase("buy"):
+        will_buy, why, mult = strat.should_buy(price_now or 0.0, ref_low, tph, is_downtrend)
+        if will_buy and price_now and owns(pair):
+            risk_scale = max(0.2, min(2.0, (risk_level+1)/5.0))  # 0..10 -> 0.2..2.2 aprox
+            quote_amt = settings.STRAT_BASE_PACKAGE_USD * mult * risk_scale
+            from .orders import market_buy_package
+            try:
+                market_buy_package(pair, quote_amt)
+                log(pair, f"AUTOKUPNO: {why} (qtyUSD={quote_amt:.2f}, risk={risk_level})", "INFO", strategy=strat.name)
+            except Exception as e:
+                log(pair, f"Błąd kupna: {e}", "ERROR", strategy=strat.name)
+
+    # alerty PnL (na poziomie całej pozycji; sumy z księgi pozycji, O(1))
+    with tick_timer.phase("alerts"):
+        total_qty = snap.total_qty
+        if total_qty > 0 and price_now:
+            entry_avg = snap.entry_avg
+            pnl_usd = (price_now - entry_avg) * total_qty
+            pnl_pct = (price_now - entry_avg) / entry_avg * 100.0 if entry_avg>0 else 0.0
+            log(pair, f"PNL {pnl_usd:.2f} USD ({pnl_pct:.2f}%)", "INFO", pnl_usd=pnl_usd, pnl_percent=pnl_pct, strategy=strat.name)
+            now2 = datetime.utcnow()
+            last = last_alert.get(pair, {})
+            if pnl_pct >= settings.ALERT_PNL_POSITIVE:
+                if 'pos' not in last or (now2 - last['pos']).total_seconds() >= settings.BOT_INTERVAL_SEC:
+                    add_alert(pair, pnl_usd, pnl_pct, "positive")
+                    last['pos'] = now2
+            if pnl_pct <= settings.ALERT_PNL_NEGATIVE:
+                if 'neg' not in last or (now2 - last['neg']).total_seconds() >= settings.BOT_INTERVAL_SEC:
+                    add_alert(pair, pnl_usd, pnl_pct, "negative")
+                    last['neg'] = now2
+            last_alert[pair] = last
+
+def store_closed_candles(pairs):
+    rows = market_state.closed_rows(pairs)
+    if rows:
+        s = get_session()
+        s.execute(insert_ignore(MarketData), rows)
+        s.commit(); s.close()
+        response_cache.invalidate("market")
+        prices = {r["pair"]: r["price"] for r in rows}
+        update_peaks(prices)
+        position_book.observe_prices(prices)
+        portfolio_tracker.observe_prices(prices)
+        indicator_engine.save(list(prices))
+
+async def run_tick(closed_pairs: set[str] | None, autotrade: bool):
+    # closed_pairs=None -> tick zegarowy (REST); inaczej tylko pary z zamkniętą świecą ze streamu
+    with query_stats.track() as tq:  # tylko zapytania tego ticku, nie API ani innych wątków
+        await _run_tick(closed_pairs, autotrade, tq)
+
+async def _run_tick(closed_pairs: set[str] | None, autotrade: bool, tq):
+    global last_fx_fetch, last_eq_fetch, last_retention, last_pairs
+    tick_timer.start()
+    if profiler is not None:
+        profiler.start()
+    try:
+        with tick_timer.phase("collect"):
+            if closed_pairs is None:
+                # kolektor krypto 5m (w wątku, żeby nie blokować pętli zdarzeń);
+                # w trybie stream tylko dla par bez świeżych danych
+                mine = active_pairs()
+                rest_pairs = [p for p in mine if market_stream is None or market_state.fresh(p) is None]
+                await asyncio.to_thread(fetch_and_store_pairs, rest_pairs)
+                if market_stream is not None:
+                    # świece zamknięte przez stream, a nieodebrane z kolejki (np. rozłączenie tuż po nich)
+                    await asyncio.to_thread(store_closed_candles, [p for p in mine if p not in rest_pairs])
+                pairs = mine
+            else:
+                pairs = [p for p in active_pairs() if p in closed_pairs]
+                await asyncio.to_thread(store_closed_candles, pairs)
+
+        # kolektory zewnętrzne wg interwału (przy shardingu tylko lider)
+        now = datetime.utcnow()
+        leader = shard is None or shard.is_leader()
+        with tick_timer.phase("fx_equities"):
+            if leader and (last_fx_fetch is None or (now - last_fx_fetch).total_seconds() >= 3600):
+                fetch_fx(); last_fx_fetch = now
+            if leader and (last_eq_fetch is None or (now - last_eq_fetch).total_seconds() >= 3600):
+                fetch_equities(); last_eq_fetch = now
+        if leader:
+            # wycena portfela po zbieraniu: przyrostowo, jeden wiersz portfolio_history na tick
+            with tick_timer.phase("portfolio"):
+                try:
+                    await asyncio.to_thread(portfolio_tracker.snapshot, build_strategy().name)
+                except Exception as e:
+                    log("SYSTEM", f"Błąd wyceny portfela: {e}", "ERROR")
+        if leader and (last_retention is None or (now - last_retention).total_seconds() >= settings.RETENTION_INTERVAL_SEC):
+            with tick_timer.phase("retention"):
+                await asyncio.to_thread(run_retention); last_retention = now
+
+        # autotrade
+        if autotrade:
+            strat = build_strategy()
+            client = get_client()
+            q0 = tq.count
+            with tick_timer.phase("snapshot"):
+                if shard is not None and position_book.loaded:
+                    # pary przejęte od innego workera: szczyty cen (peak_price) aktualizował tamten
+                    position_book.reload([p for p in pairs if p not in last_pairs])
+                last_pairs = set(pairs)
+                snaps = load_snapshots(pairs)
+            tick_stats["snapshot_queries"] = tq.count - q0
+            for pair in pairs:
+                evaluate_pair(snaps[pair], strat, client)
+        tick_stats["pairs"] = len(pairs)
+        if shard is not None:
+            tick_stats["shard"] = shard.stats()
+    finally:
+        res = tick_timer.finish(tq.count, tq.seconds)
+        if profiler is not None:
+            profiler.stop(res["duration_sec"])
+        tick_stats["queries"] = res["db_queries"]
+        tick_stats["phases"] = res["phases"]
+
+async def next_tick() -> set[str] | None:
+    # Bez streamu: zwykły sen BOT_INTERVAL_SEC. Ze streamem: czekamy na zamknięte świece,
+    # a gdy stream milczy dłużej niż BOT_INTERVAL_SEC, wracamy do ścieżki REST.
+    if market_stream is None or not market_stream.connected:
+        await asyncio.sleep(settings.BOT_INTERVAL_SEC)
+        return None
+    try:
+        pair = await asyncio.wait_for(market_stream.closed.get(), timeout=settings.BOT_INTERVAL_SEC)
+    except asyncio.TimeoutError:
+        return None
+    await asyncio.sleep(1)  # świece wszystkich par zamykają się w tej samej chwili
+    closed = {pair}
+    while not market_stream.closed.empty():
+        closed.add(market_stream.closed.get_nowait())
+    return closed
+
+async def loop_task():
+    global market_stream
+    if settings.STREAM_ENABLED:
+        market_stream = MarketStream(market_state)
+        asyncio.create_task(market_stream.run(active_pairs))
+    closed_pairs = None
+    while True:
+        try:
+            ctrl = await asyncio.to_thread(load_control)
+            apply_control(ctrl)
+            if shard is not None and shard.thread is None:
+                await asyncio.to_thread(shard.start, lambda: settings.DEFAULT_PAIRS)
+        except Exception as e:
+            log("SYSTEM", f"Błąd odczytu bot_control: {e}", "ERROR")
+            await asyncio.sleep(settings.CONTROL_POLL_SEC)
+            continue
+        if not ctrl.running:
+            closed_pairs = None
+            await asyncio.to_thread(heartbeat, WORKER_ID, {"running": False, **tick_stats})
+            await asyncio.sleep(settings.CONTROL_POLL_SEC)
+            continue
+        t0 = datetime.utcnow()
+        try:
+            await run_tick(closed_pairs, ctrl.autotrade)
+        except Exception as e:
+            log("SYSTEM", f"Błąd ticku: {e}", "ERROR")
+        tick_stats["started_at"] = t0.isoformat()
+        tick_stats["duration_sec"] = round((datetime.utcnow() - t0).total_seconds(), 3)
+        tick_stats["overrun"] = tick_stats["duration_sec"] > settings.BOT_INTERVAL_SEC
+        try:
+            await asyncio.to_thread(heartbeat, WORKER_ID, {"running": True, **tick_stats})
+        except Exception:
+            pass
+        closed_pairs = await next_tick()
+
+
+_thread: threading.Thread | None = None
+
+def start_thread():
+    # WORKER_MODE=thread: silnik we własnym wątku z osobną pętlą zdarzeń
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _thread = threading.Thread(target=lambda: asyncio.run(loop_task()), name="trading-engine", daemon=True)
+    _thread.start()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from collections import deque
+from sqlalchemy import select, func
+from .config import settings
+from .database import get_session
+from .models import MarketData, TradeLog, Alert, Package
+from .positions import SoldCursor
+
+# Strumień zdarzeń dla karty HA (SSE /events). Jeden tailer na proces API czyta nowe wiersze
+# (id > ostatnie widziane) co EVENTS_POLL_SEC - niezależnie od liczby otwartych dashboardów -
+# i dokłada je do bufora pierścieniowego; klient po ponownym połączeniu podaje Last-Event-ID
+# i dostaje brakujące zdarzenia z bufora (albo "reset", gdy wypadły już z bufora).
+
+def _iso(ts):
+    return ts.isoformat() if ts else None
+
+class EventBus:
+    def __init__(self, size: int):
+        self.buffer: deque[tuple[int, str, dict]] = deque(maxlen=size)
+        self.seq = 0
+        self.cond: asyncio.Condition | None = None
+        self.subscribers = 0
+        self.last = {"market": 0, "log": 0, "alert": 0, "package": 0}
+        self.sold = SoldCursor()
+
+    def publish(self, kind: str, data: dict):
+        self.seq += 1
+        self.buffer.append((self.seq, kind, data))
+
+    def since(self, last_id: int) -> list[tuple[int, str, dict]] | None:
+        # None = luka (zdarzenia wypadły z bufora), klient musi przeładować stan
+        if last_id > self.seq:
+            return None  # id z poprzedniego uruchomienia procesu
+        if not self.buffer or last_id == self.seq:
+            return []
+        if last_id < self.buffer[0][0] - 1:
+            return None
+        return [e for e in self.buffer if e[0] > last_id]
+
+    def _init_cursors(self):
+        s = get_session()
+        try:
+            for key, model in (("market", MarketData), ("log", TradeLog), ("alert", Alert), ("package", Package)):
+                self.last[key] = s.execute(select(func.max(model.id))).scalar() or 0
+            self.sold.start(s)
+        finally:
+            s.close()
+
+    def _poll(self) -> list[tuple[str, dict]]:
+        n = settings.EVENTS_BATCH
+        out = []
+        s = get_session()
+        try:
+            for r in s.scalars(select(MarketData).where(MarketData.id > self.last["market"]).order_by(MarketData.id).limit(n)):
+                self.last["market"] = r.id
+                out.append(("market", {"pair": r.pair, "ts": _iso(r.ts), "price": r.price, "ema_fast": r.ema_fast, "ema_slow": r.ema_slow}))
+            for r in s.scalars(select(TradeLog).where(TradeLog.id > self.last["log"]).order_by(TradeLog.id).limit(n)):
+                self.last["log"] = r.id
+                out.append(("log", {"ts": _iso(r.ts), "pair": r.pair, "level": r.level, "message": r.message,
+                                    "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent, "strategy": r.strategy}))
+            for r in s.scalars(select(Alert).where(Alert.id > self.last["alert"]).order_by(Alert.id).limit(n)):
+                self.last["alert"] = r.id
+                out.append(("alert", {"ts": _iso(r.ts), "pair": r.pair, "type": r.type, "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent}))
+            # pakiety: nowe (kupno) i świeżo sprzedane (SoldCursor: zakładka po sold_at, powtórki po id)
+            cols = (Package.pair, Package.quantity, Package.entry_price, Package.exit_price, Package.realized_pnl_usd, Package.created_at)
+            pk = s.execute(select(Package.id, Package.sold_at, *cols).where(Package.id > self.last["package"]).order_by(Package.id).limit(n)).all()
+            sold = self.sold.fetch(s, *cols, limit=n)
+            sold_ids = {r.id for r in sold}
+            for r in pk:
+                self.last["package"] = r.id
+            self.sold.mark(pk)  # kupiony i sprzedany między odczytami: jedno zdarzenie "sold"
+            for r in [r for r in pk if r.id not in sold_ids] + sold:
+                out.append(("package", {"id": r.id, "pair": r.pair, "state": "sold" if r.sold_at else "open",
+                                        "quantity": r.quantity, "entry_price": r.entry_price, "exit_price": r.exit_price,
+                                        "realized_pnl_usd": r.realized_pnl_usd, "created_at": _iso(r.created_at), "sold_at": _iso(r.sold_at)}))
+        finally:
+            s.close()
+        return out
+
+    async def run(self):
+        self.cond = asyncio.Condition()
+        while True:
+            try:
+                await asyncio.to_thread(self._init_cursors)
+                break
+            except Exception:
+                await asyncio.sleep(5)
+        while True:
+            await asyncio.sleep(settings.EVENTS_POLL_SEC)
+            if not self.subscribers:
+                continue  # nikt nie słucha: kursory przesuwamy dopiero przy pierwszym kliencie
+            try:
+                events = await asyncio.to_thread(self._poll)
+            except Exception:
+                continue
+            if events:
+                async with self.cond:
+                    for kind, data in events:
+                        self.publish(kind, data)
+                    self.cond.notify_all()
+
+    async def stream(self, last_id: int | None):
+        # generator SSE dla jednego klienta
+        if self.subscribers == 0:
+            # po przerwie bez klientów kursory zaczynają od "teraz"; reset w buforze każe
+            # klientom wracającym z Last-Event-ID przeładować stan (/dashboard)
+            await asyncio.to_thread(self._init_cursors)
+            self.publish("reset", {})
+        self.subscribers += 1
+        try:
+            yield "retry: 3000\n\n"
+            cursor = self.seq if last_id is None else last_id
+            while True:
+                events = self.since(cursor)
+                if events is None:
+                    yield f"id: {self.seq}\nevent: reset\ndata: {{}}\n\n"
+                    cursor = self.seq
+                    continue
+                for seq, kind, data in events:
+                    yield f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+                    cursor = seq
+                try:
+                    async with self.cond:
+                        if self.seq == cursor:
+                            await asyncio.wait_for(self.cond.wait(), timeout=settings.EVENTS_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.subscribers -= 1
+
+event_bus = EventBus(settings.EVENTS_BUFFER)
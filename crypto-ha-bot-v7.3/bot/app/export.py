@@ -0,0 +1,230 @@
+import argparse
+import fcntl
+import glob
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from .config import settings
+from .database import engine
+from .models import MarketData, Package
+from .positions import SoldCursor
+
+# Przyrostowy eksport market_data i sprzedanych pakietów do plików kolumnowych:
+#   EXPORT_DIR/<tabela>/<para>/<RRRR-MM>/part-<pierwsze id>-<ostatnie id>.arrow
+# Pliki Arrow IPC bez kompresji: loader mapuje je do pamięci (pa.memory_map), a kolumny
+# bez null-i (NaN zamiast NULL) są widokami NumPy na te same strony - bez kopiowania
+# i bez obiektów Pythona per wiersz. Każdy przebieg dopisuje tylko wiersze od ostatniego
+# znacznika (export_state.json): market_data po id, pakiety po sold_at (SoldCursor z positions.py, jak
+# księga pozycji). Nazwy części wynikają z zakresu id, więc powtórka po awarii nadpisuje
+# te same pliki; miesiąc z więcej niż EXPORT_MAX_PARTS częściami jest scalany w jeden plik.
+# --format parquet zapisuje zamiast tego .parquet (zstd) dla zewnętrznych narzędzi.
+
+STATE_FILE = "export_state.json"
+
+MARKET_SCHEMA = pa.schema([("id", pa.int64()), ("ts", pa.timestamp("s")), ("price", pa.float64()), ("volume", pa.float64()),
+                           ("trades_per_hour", pa.int32()), ("ema_fast", pa.float64()), ("ema_slow", pa.float64())])
+PACKAGE_SCHEMA = pa.schema([("id", pa.int64()), ("created_at", pa.timestamp("s")), ("sold_at", pa.timestamp("s")),
+                            ("quantity", pa.float64()), ("entry_price", pa.float64()), ("exit_price", pa.float64()),
+                            ("peak_price", pa.float64()), ("realized_pnl_usd", pa.float64()), ("realized_pnl_pln", pa.float64())])
+
+def _f64(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def _ts(values) -> np.ndarray:
+    return np.array(values, dtype="datetime64[s]")
+
+class Exporter:
+    def __init__(self, root: str, fmt: str = "arrow", batch: int = 200_000, max_parts: int = 8):
+        self.root = root
+        self.fmt = fmt
+        self.batch = batch
+        self.max_parts = max_parts
+        self.state = self._load_state()
+        self.touched: set[str] = set()
+
+    # --- stan ---
+
+    def _load_state(self) -> dict:
+        try:
+            with open(os.path.join(self.root, STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"market_data": {"last_id": 0}, "packages": {"last": None, "recent": {}}}
+
+    def _save_state(self):
+        path = os.path.join(self.root, STATE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.state, f)
+        os.replace(path + ".tmp", path)
+
+    # --- zapis części ---
+
+    def _write(self, table_name: str, pair: str, month: str, table: pa.Table):
+        d = os.path.join(self.root, table_name, pair, month)
+        os.makedirs(d, exist_ok=True)
+        ids = table.column("id")
+        path = os.path.join(d, f"part-{ids[0].as_py():012d}-{ids[-1].as_py():012d}.{self.fmt}")
+        _write_file(path, table, self.fmt)
+        self.touched.add(d)
+
+    def _partition(self, table_name: str, pairs: np.ndarray, ts: np.ndarray, table: pa.Table):
+        # (para, miesiąc) -> osobna część posortowana po czasie
+        keys = np.char.add(np.char.add(pairs.astype(str), "/"), ts.astype("datetime64[M]").astype(str))
+        uniq, inv = np.unique(keys, return_inverse=True)
+        order = np.lexsort((ts, inv))
+        bounds = np.flatnonzero(np.diff(inv[order])) + 1
+        for idx in np.split(order, bounds):
+            pair, month = uniq[inv[idx[0]]].split("/")
+            self._write(table_name, pair, month, table.take(pa.array(idx)))
+
+    def market_data(self) -> int:
+        st = self.state["market_data"]
+        q = select(MarketData.id, MarketData.pair, MarketData.ts, MarketData.price, MarketData.volume,
+                   MarketData.trades_per_hour, MarketData.ema_fast, MarketData.ema_slow).where(MarketData.id > st["last_id"])
+        done = 0
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(q.order_by(MarketData.id))
+            for chunk in result.partitions(self.batch):
+                ids, pr, ts, price, vol, tph, ef, es = zip(*chunk)
+                ts_a = _ts(ts)
+                table = pa.table({"id": np.array(ids, dtype=np.int64), "ts": ts_a, "price": np.array(price, dtype=np.float64),
+                                  "volume": _f64(vol), "trades_per_hour": np.array([t or 0 for t in tph], dtype=np.int32),
+                                  "ema_fast": _f64(ef), "ema_slow": _f64(es)}, schema=MARKET_SCHEMA)
+                self._partition("market_data", np.array(pr), ts_a, table)
+                st["last_id"] = int(ids[-1])
+                self._save_state()  # po każdej partii: przerwany eksport wznawia się od następnej
+                done += len(ids)
+        return done
+
+    def packages(self) -> int:
+        # tylko sprzedane (niezmienne); partycja wg miesiąca sprzedaży
+        cursor = SoldCursor.from_state(self.state["packages"])
+        with engine.connect() as conn:
+            rows = cursor.fetch(conn, Package.pair, Package.created_at, Package.quantity, Package.entry_price,
+                                Package.exit_price, Package.peak_price, Package.realized_pnl_usd, Package.realized_pnl_pln)
+        if not rows:
+            return 0
+        for i in range(0, len(rows), self.batch):
+            ids, sold, pr, created, qty, entry, exit_, peak, pnl, pnl_pln = zip(*rows[i:i + self.batch])
+            sold_a = _ts(sold)
+            table = pa.table({"id": np.array(ids, dtype=np.int64), "created_at": _ts(created), "sold_at": sold_a,
+                              "quantity": _f64(qty), "entry_price": _f64(entry), "exit_price": _f64(exit_),
+                              "peak_price": _f64(peak), "realized_pnl_usd": _f64(pnl), "realized_pnl_pln": _f64(pnl_pln)},
+                             schema=PACKAGE_SCHEMA)
+            self._partition("packages", np.array(pr), sold_a, table)
+        self.state["packages"] = cursor.state()
+        self._save_state()
+        return len(rows)
+
+    def compact(self) -> int:
+        # scala części miesiąca w jeden plik (mniej plików do zmapowania przy odczycie)
+        merged = 0
+        for d in sorted(self.touched):
+            parts = sorted(glob.glob(os.path.join(d, f"part-*.{self.fmt}")))
+            if len(parts) <= self.max_parts:
+                continue
+            table = pa.concat_tables([_read_file(p) for p in parts])
+            time_col = "ts" if "ts" in table.column_names else "sold_at"
+            table = table.take(pa.array(np.argsort(table.column(time_col).to_numpy(), kind="stable")))
+            first, last = os.path.basename(parts[0]).split("-")[1], os.path.basename(parts[-1]).split("-")[2].split(".")[0]
+            keep = os.path.join(d, f"part-{first}-{last}.{self.fmt}")
+            _write_file(keep, table, self.fmt)
+            for p in parts:
+                if p != keep:
+                    os.remove(p)
+            merged += len(parts)
+        return merged
+
+    def run(self) -> dict:
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # jeden eksport naraz (retencja lidera i ręczny przebieg)
+            self.state = self._load_state()
+            out = {"market_data": self.market_data(), "packages": self.packages()}
+            out["parts_merged"] = self.compact()
+        return out
+
+def _write_file(path: str, table: pa.Table, fmt: str):
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        pq.write_table(table, tmp, compression="zstd")
+    else:
+        with pa.OSFile(tmp, "wb") as sink, ipc.new_file(sink, table.schema) as w:
+            w.write_table(table)
+    os.replace(tmp, path)
+
+def _read_file(path: str) -> pa.Table:
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    return ipc.open_file(pa.memory_map(path, "r")).read_all()  # bufory wskazują na zmapowany plik
+
+# --- odczyt ---
+
+def partitions(root: str, table_name: str, pair: str, since: datetime | None = None, until: datetime | None = None) -> list[str]:
+    out = []
+    for d in sorted(glob.glob(os.path.join(root, table_name, pair, "????-??"))):
+        month = datetime.strptime(os.path.basename(d), "%Y-%m")
+        nxt = (month + timedelta(days=32)).replace(day=1)
+        if (since is not None and nxt <= since) or (until is not None and month >= until):
+            continue  # miesiąc poza zakresem: pliku nawet nie otwieramy
+        out.extend(sorted(glob.glob(os.path.join(d, "part-*.arrow")) + glob.glob(os.path.join(d, "part-*.parquet"))))
+    return out
+
+def open_pair(root: str, pair: str, table_name: str = "market_data", since: datetime | None = None,
+              until: datetime | None = None) -> list[pa.Table]:
+    # tabele per część, zmapowane z plików (zero kopii dla .arrow)
+    return [_read_file(p) for p in partitions(root, table_name, pair, since, until)]
+
+def columns(tables: list[pa.Table], names: list[str], key: str = "ts") -> dict[str, np.ndarray]:
+    # kolumny jako NumPy: jedna część -> widoki na mmap; więcej -> jedna konkatenacja
+    if not tables:
+        return {n: np.empty(0) for n in names}
+    chunks = {n: [t.column(n).to_numpy() for t in tables] for n in set(names) | {key}}
+    out = {n: c[0] if len(c) == 1 else np.concatenate(c) for n, c in chunks.items()}
+    k = out[key].view(np.int64)
+    if len(k) > 1 and not (np.diff(k) > 0).all():
+        # części nachodzą na siebie (backfill starszej historii, powtórka po awarii): sortuj i usuń powtórzony klucz
+        _, idx = np.unique(k, return_index=True)
+        out = {n: a[idx] for n, a in out.items()}
+    return out
+
+def load_series(root: str, pairs: list[str] | None = None, since: datetime | None = None, until: datetime | None = None) -> dict:
+    # jak backtest.load_market_data, ale z plików eksportu
+    from .backtest import Series
+    pairs = pairs or sorted(os.path.basename(p) for p in glob.glob(os.path.join(root, "market_data", "*")))
+    out = {}
+    for pair in pairs:
+        c = columns(open_pair(root, pair, "market_data", since, until), ["ts", "price", "trades_per_hour", "ema_fast"])
+        ts = c["ts"].view(np.int64)
+        keep = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            keep &= ts >= int(np.datetime64(since, "s").astype(np.int64))
+        if until is not None:
+            keep &= ts < int(np.datetime64(until, "s").astype(np.int64))
+        if not keep.all():
+            c = {n: a[keep] for n, a in c.items()}
+            ts = c["ts"].view(np.int64)
+        if len(ts):
+            out[pair] = Series(pair, ts, c["price"], c["trades_per_hour"].astype(np.float64), c["ema_fast"])
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Przyrostowy eksport market_data i pakietów do Arrow/Parquet (para/miesiąc)")
+    ap.add_argument("--dir", default=settings.EXPORT_DIR or "export")
+    ap.add_argument("--format", choices=["arrow", "parquet"], default="arrow", help="arrow = mapowalne do pamięci")
+    ap.add_argument("--batch", type=int, default=settings.EXPORT_BATCH)
+    ap.add_argument("--max-parts", type=int, default=settings.EXPORT_MAX_PARTS)
+    args = ap.parse_args()
+    t = time.perf_counter()
+    out = Exporter(args.dir, args.format, args.batch, args.max_parts).run()
+    out["sec"] = round(time.perf_counter() - t, 2)
+    print(json.dumps(out))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+import zlib
+from collections import Counter
+from .binance_client import INTERVAL_MS
+
+# Deterministyczna atrapa binance.spot.Spot dla benchmarków (app.bench): te same pary i ten sam
+# czas dają te same świece, ceny i wykonania. Opóźnienie każdego wywołania = latency_ms,
+# co pozwala mierzyć zachowanie puli kolektora bez testnetu.
+
+class FakeSpot:
+    def __init__(self, pairs: list[str] | None = None, latency_ms: float = 0.0, seed: int = 0, quote: str = "USDC"):
+        self.pairs = list(pairs or [])
+        self.latency = latency_ms / 1000
+        self.seed = seed
+        self.quote = quote
+        self.calls: Counter[str] = Counter()
+        self.order_id = 0
+        self.lock = threading.Lock()
+
+    def _call(self, name: str):
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _base(self, pair: str) -> float:
+        # cena bazowa pary 0.1 .. ~100k, stała dla danego seeda
+        h = zlib.crc32(f"{self.seed}:{pair}".encode())
+        return 10 ** ((h % 6000) / 1000 - 1)
+
+    def price(self, pair: str, t_ms: int) -> float:
+        # dwie sinusoidy (doba, ~3 h) + szum deterministyczny z (pary, minuty)
+        h = zlib.crc32(f"{self.seed}:{pair}".encode())
+        phase = (h % 1000) / 1000 * 2 * math.pi
+        t = t_ms / 1000
+        noise = (zlib.crc32(f"{pair}:{t_ms // 60_000}".encode()) % 1000 - 500) / 500_000
+        return self._base(pair) * (1 + 0.04 * math.sin(t / 13751 + phase) + 0.01 * math.sin(t / 1719 + 2 * phase) + noise)
+
+    def _kline(self, pair: str, open_time: int, step: int) -> list:
+        o = self.price(pair, open_time)
+        c = self.price(pair, open_time + step)
+        mid = self.price(pair, open_time + step // 2)
+        hi, lo = max(o, c, mid) * 1.001, min(o, c, mid) * 0.999
+        trades = 20 + zlib.crc32(f"{pair}:{open_time}".encode()) % 200
+        vol = trades * 0.37
+        return [open_time, f"{o:.8f}", f"{hi:.8f}", f"{lo:.8f}", f"{c:.8f}", f"{vol:.8f}",
+                open_time + step - 1, f"{vol * c:.8f}", trades, f"{vol / 2:.8f}", f"{vol * c / 2:.8f}", "0"]
+
+    # --- API zgodne z binance.spot.Spot (tylko używane przez bota) ---
+
+    def ping(self):
+        self._call("ping")
+        return {}
+
+    def klines(self, symbol: str, interval: str, startTime: int | None = None, endTime: int | None = None, limit: int = 500, **kw):
+        self._call("klines")
+        step = INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        last = (min(endTime or now, now) // step) * step  # bieżąca (niezamknięta) świeca
+        limit = max(1, min(int(limit), 1000))
+        first = (startTime + step - 1) // step * step if startTime is not None else last - (limit - 1) * step
+        return [self._kline(symbol, t, step) for t in range(first, min(last, first + (limit - 1) * step) + 1, step)]
+
+    def ticker_24hr(self, symbol: str | None = None, **kw):
+        self._call("ticker_24hr")
+        now = int(time.time() * 1000)
+        hour = (now // 3_600_000) * 3_600_000
+        prices = [self.price(symbol, hour - i * 3_600_000) for i in range(24)] + [self.price(symbol, now)]
+        return {"symbol": symbol, "lastPrice": f"{prices[-1]:.8f}", "lowPrice": f"{min(prices):.8f}",
+                "highPrice": f"{max(prices):.8f}", "count": 24 * 12 * 120}
+
+    def exchange_info(self, **kw):
+        self._call("exchange_info")
+        symbols = []
+        for pair in self.pairs:
+            p = self._base(pair)
+            tick = 10 ** math.floor(math.log10(p) - 4)
+            step = 10 ** min(0, math.floor(-math.log10(p)) - 3)
+            symbols.append({
+                "symbol": pair, "status": "TRADING", "baseAsset": pair[: -len(self.quote)], "quoteAsset": self.quote,
+                "quoteAssetPrecision": 8,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": f"{tick:.10f}"},
+                    {"filterType": "LOT_SIZE", "stepSize": f"{step:.10f}", "minQty": f"{step:.10f}", "maxQty": "9000000"},
+                    {"filterType": "NOTIONAL", "minNotional": "5"},
+                ],
+            })
+        return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": symbols}
+
+    def new_order(self, symbol: str, side: str, type: str, quantity=None, quoteOrderQty=None, **kw):
+        self._call("new_order")
+        px = self.price(symbol, int(time.time() * 1000))
+        qty = float(quantity) if quantity is not None else float(quoteOrderQty) / px
+        with self.lock:
+            self.order_id += 1
+            oid = self.order_id
+        # dwa wypełnienia po lekko różnych cenach (poślizg w kierunku zlecenia)
+        slip = 1.0005 if side == "BUY" else 0.9995
+        fills = [{"price": f"{px:.8f}", "qty": f"{qty / 2:.8f}", "commission": "0", "commissionAsset": self.quote},
+                 {"price": f"{px * slip:.8f}", "qty": f"{qty - qty / 2:.8f}", "commission": "0", "commissionAsset": self.quote}]
+        quote = sum(float(f["price"]) * float(f["qty"]) for f in fills)
+        return {"symbol": symbol, "orderId": oid, "status": "FILLED", "side": side, "type": type,
+                "executedQty": f"{qty:.8f}", "cummulativeQuoteQty": f"{quote:.8f}", "fills": fills}
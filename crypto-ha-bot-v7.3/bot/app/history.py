@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, and_, literal_column, Integer, cast
+from sqlalchemy.orm import aliased
+from .database import engine, get_session
+from .models import MarketData, MarketRollup
+from .retention import aggregate, bucket
+
+# Historia do wykresów o stałym rozmiarze odpowiedzi niezależnie od zakresu:
+#  - candles(): świece OHLC liczone w SQL z market_data (kubełek = epoch // sekundy),
+#    a dla okresu już zwiniętego przez retencję - z market_rollups (1h/1d);
+#  - points(): ceny z zakresu przerzedzone LTTB do max_points: surowe wiersze dla krótkiego
+#    zakresu, dla długiego zamknięcia świec z candles() (najwyżej RAW_FACTOR * max_points wierszy).
+
+RAW_FACTOR = 4  # points(): surowe wiersze, dopóki jest ich najwyżej tyle razy więcej niż punktów
+RESOLUTIONS = {"5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400, "1w": 604800}
+
+def pick_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    span = max((end - start).total_seconds(), 1)
+    for name, secs in RESOLUTIONS.items():
+        if span / secs <= max_points:
+            return name
+    return "1w"
+
+def _epoch(col):
+    # sekundy od 1970-01-01 dla naiwnego ts w UTC (bez zależności od strefy czasowej sesji)
+    if engine.dialect.name == "sqlite":
+        return cast(func.strftime("%s", col), Integer)
+    return func.timestampdiff(literal_column("SECOND"), "1970-01-01", col)
+
+def _raw_candles(s, pair: str, start: datetime, end: datetime, secs: int) -> tuple[dict, datetime | None]:
+    b = (_epoch(MarketData.ts) // secs).label("bucket")
+    agg = (select(b, func.min(MarketData.ts).label("first_ts"), func.max(MarketData.ts).label("last_ts"),
+                  func.max(MarketData.price).label("high"), func.min(MarketData.price).label("low"),
+                  func.sum(MarketData.volume).label("volume"))
+           .where(MarketData.pair == pair, MarketData.ts >= start, MarketData.ts < end)
+           .group_by(literal_column("bucket"))).subquery()
+    o, c = aliased(MarketData), aliased(MarketData)
+    rows = s.execute(select(agg.c.bucket, agg.c.first_ts, agg.c.high, agg.c.low, agg.c.volume, o.price, c.price)
+                     .join(o, and_(o.pair == pair, o.ts == agg.c.first_ts))
+                     .join(c, and_(c.pair == pair, c.ts == agg.c.last_ts))
+                     .order_by(agg.c.bucket)).all()
+    out = {}
+    for b, first_ts, high, low, vol, open_, close in rows:
+        ts = datetime(1970, 1, 1) + timedelta(seconds=int(b) * secs)
+        out.setdefault(ts, dict(open=open_, high=high, low=low, close=close, volume=vol or 0.0))
+    return out, (rows[0][1] if rows else None)
+
+def _rollup_candles(s, pair: str, start: datetime, end: datetime, secs: int) -> dict:
+    # 1h starsze niż RETENTION_1H_DAYS są już zwinięte do 1d - bierzemy obie rozdzielczości
+    rows = s.execute(select(MarketRollup.pair, MarketRollup.ts, MarketRollup.open, MarketRollup.high, MarketRollup.low,
+                            MarketRollup.close, MarketRollup.volume, MarketRollup.trades_per_hour, MarketRollup.samples)
+                     .where(MarketRollup.resolution.in_(("1h", "1d")), MarketRollup.pair == pair,
+                            MarketRollup.ts >= bucket(start, secs), MarketRollup.ts < end)
+                     .order_by(MarketRollup.ts)).all()
+    return {ts: a for (_, ts), a in aggregate(rows, max(secs, 3600)).items()}
+
+def candles(pair: str, start: datetime, end: datetime, resolution: str) -> list[dict]:
+    secs = RESOLUTIONS[resolution]
+    start = bucket(start, secs)
+    s = get_session()
+    try:
+        raw, first_raw = _raw_candles(s, pair, start, end, secs)
+        # retencja zwija stare 5m -> rollupy; dociągamy je tylko dla okresu przed pierwszym surowym wierszem
+        first_raw = first_raw or end
+        old = _rollup_candles(s, pair, start, first_raw, secs) if first_raw > start else {}
+    finally:
+        s.close()
+    merged = old
+    for ts, a in raw.items():
+        o = merged.get(ts)
+        if o is None:
+            merged[ts] = a
+        else:  # kubełek na granicy rollup/surowe
+            merged[ts] = dict(open=o["open"], high=max(o["high"], a["high"]), low=min(o["low"], a["low"]),
+                              close=a["close"], volume=o["volume"] + a["volume"])
+    return [{"ts": ts.isoformat(), "open": float(a["open"]), "high": float(a["high"]), "low": float(a["low"]),
+             "close": float(a["close"]), "volume": float(a["volume"])} for ts, a in sorted(merged.items())]
+
+def lttb(points: list[tuple[float, float]], threshold: int) -> list[int]:
+    # Largest-Triangle-Three-Buckets: indeksy punktów zachowujących kształt wykresu
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    keep = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        cnt = nhi - nlo
+        avg_x = sum(p[0] for p in points[nlo:nhi]) / cnt if cnt else points[-1][0]
+        avg_y = sum(p[1] for p in points[nlo:nhi]) / cnt if cnt else points[-1][1]
+        ax, ay = points[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+def points(pair: str, start: datetime, end: datetime, max_points: int) -> list[dict]:
+    if (end - start).total_seconds() / RESOLUTIONS["5m"] > RAW_FACTOR * max_points:
+        # długi zakres: kubełki liczone w bazie (i rollupy 1h/1d), odpowiedź i pamięć ograniczone
+        res = pick_resolution(start, end, RAW_FACTOR * max_points)
+        series = [(datetime.fromisoformat(c["ts"]), c["close"]) for c in candles(pair, start, end, res)]
+        return _thin(series, max_points)
+    s = get_session()
+    try:
+        rows = s.execute(select(MarketData.ts, MarketData.price)
+                         .where(MarketData.pair == pair, MarketData.ts >= start, MarketData.ts < end)
+                         .order_by(MarketData.ts)).all()
+        first_raw = rows[0][0] if rows else end
+        old = []
+        if first_raw > start:
+            old = s.execute(select(MarketRollup.ts, MarketRollup.close)
+                            .where(MarketRollup.pair == pair, MarketRollup.resolution.in_(("1h", "1d")),
+                                   MarketRollup.ts >= start, MarketRollup.ts < first_raw)
+                            .order_by(MarketRollup.ts)).all()
+    finally:
+        s.close()
+    return _thin([(ts, float(px)) for ts, px in [*old, *rows]], max_points)
+
+def _thin(series: list[tuple[datetime, float]], max_points: int) -> list[dict]:
+    xy = [((ts - datetime(1970, 1, 1)).total_seconds(), px) for ts, px in series]
+    return [{"ts": series[i][0].isoformat(), "price": series[i][1]} for i in lttb(xy, max_points)]
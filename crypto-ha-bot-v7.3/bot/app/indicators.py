@@ -0,0 +1,204 @@
+import json
+from abc import ABC, abstractmethod
+import threading
+from datetime import datetime
+from typing import Callable, NamedTuple
+from sqlalchemy import select, delete, insert
+from .database import get_session
+from .models import IndicatorState
+
+class Bar(NamedTuple):
+    open_time: int  # ms
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+class Indicator(ABC):
+    # wskaźnik przyrostowy: update() O(1) na zamkniętą świecę, stan serializowalny do JSON
+    @abstractmethod
+    def update(self, bar: Bar) -> float | None: ...
+    @property
+    @abstractmethod
+    def value(self) -> float | None: ...
+    def state(self) -> dict: return dict(self.__dict__)
+    def load(self, st: dict): self.__dict__.update(st)
+
+class EMA(Indicator):
+    # pierwsza wartość = SMA z `period` świec, potem klasyczna rekurencja
+    def __init__(self, period: int):
+        self.period = period
+        self.n = 0
+        self.acc = 0.0
+        self.ema: float | None = None
+
+    def update(self, bar: Bar):
+        if self.ema is None:
+            self.n += 1
+            self.acc += bar.close
+            if self.n >= self.period:
+                self.ema = self.acc / self.n
+        else:
+            k = 2 / (self.period + 1)
+            self.ema = bar.close * k + self.ema * (1 - k)
+        return self.ema
+
+    @property
+    def value(self):
+        return self.ema
+
+class RSI(Indicator):
+    # RSI Wildera
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev: float | None = None
+        self.n = 0
+        self.gain = 0.0
+        self.loss = 0.0
+        self.rsi: float | None = None
+
+    def update(self, bar: Bar):
+        if self.prev is not None:
+            ch = bar.close - self.prev
+            g, l = max(ch, 0.0), max(-ch, 0.0)
+            if self.n < self.period:
+                self.n += 1
+                self.gain += g / self.period
+                self.loss += l / self.period
+            else:
+                self.gain = (self.gain * (self.period - 1) + g) / self.period
+                self.loss = (self.loss * (self.period - 1) + l) / self.period
+            if self.n >= self.period:
+                self.rsi = 100.0 if self.loss == 0 else 100.0 - 100.0 / (1 + self.gain / self.loss)
+        self.prev = bar.close
+        return self.rsi
+
+    @property
+    def value(self):
+        return self.rsi
+
+class ATR(Indicator):
+    # ATR Wildera
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev: float | None = None
+        self.n = 0
+        self.atr: float | None = None
+
+    def update(self, bar: Bar):
+        tr = bar.high - bar.low if self.prev is None else max(bar.high - bar.low, abs(bar.high - self.prev), abs(bar.low - self.prev))
+        self.prev = bar.close
+        if self.n < self.period:
+            self.n += 1
+            self.atr = ((self.atr or 0.0) * (self.n - 1) + tr) / self.n
+            return self.atr if self.n >= self.period else None
+        self.atr = (self.atr * (self.period - 1) + tr) / self.period
+        return self.atr
+
+    @property
+    def value(self):
+        return self.atr if self.n >= self.period else None
+
+class VWAP(Indicator):
+    # VWAP narastająco od początku doby UTC
+    def __init__(self):
+        self.day = -1
+        self.pv = 0.0
+        self.vol = 0.0
+
+    def update(self, bar: Bar):
+        day = bar.open_time // 86_400_000
+        if day != self.day:
+            self.day, self.pv, self.vol = day, 0.0, 0.0
+        typical = (bar.high + bar.low + bar.close) / 3
+        self.pv += typical * bar.volume
+        self.vol += bar.volume
+        return self.value
+
+    @property
+    def value(self):
+        return self.pv / self.vol if self.vol > 0 else None
+
+# nazwa -> fabryka; nowe wskaźniki dla tego samego strumienia świec: register("rsi", lambda: RSI(14))
+REGISTRY: dict[str, Callable[[], Indicator]] = {
+    "ema_fast": lambda: EMA(12),
+    "ema_slow": lambda: EMA(26),
+}
+
+def register(name: str, factory: Callable[[], Indicator]):
+    REGISTRY[name] = factory
+
+class IndicatorSet:
+    def __init__(self):
+        self.last_open_time: int | None = None
+        self.items: dict[str, Indicator] = {name: f() for name, f in REGISTRY.items()}
+
+    def update(self, bar: Bar) -> bool:
+        if self.last_open_time is not None and bar.open_time <= self.last_open_time:
+            return False  # świeca już policzona
+        for ind in self.items.values():
+            ind.update(bar)
+        self.last_open_time = bar.open_time
+        return True
+
+    def values(self) -> dict[str, float | None]:
+        return {name: ind.value for name, ind in self.items.items()}
+
+class IndicatorEngine:
+    # stan wskaźników per para; ładowany z indicator_state i zapisywany po każdej partii świec,
+    # więc restart kontynuuje bez ponownego pobierania okna rozgrzewkowego
+    def __init__(self):
+        self.pairs: dict[str, IndicatorSet] = {}
+        self.loaded: set[str] = set()
+        self.lock = threading.Lock()
+
+    def get(self, pair: str) -> IndicatorSet:
+        ind = self.pairs.get(pair)
+        if ind is None:
+            ind = self.pairs.setdefault(pair, IndicatorSet())
+        return ind
+
+    def reset(self, pair: str) -> IndicatorSet:
+        ind = self.pairs[pair] = IndicatorSet()
+        return ind
+
+    def update(self, pair: str, bars) -> dict[str, float | None]:
+        ind = self.get(pair)
+        for bar in bars:
+            ind.update(bar)
+        return ind.values()
+
+    def ensure_loaded(self, pairs):
+        with self.lock:
+            missing = [p for p in pairs if p not in self.loaded]
+            if not missing:
+                return
+            s = get_session()
+            rows = s.execute(select(IndicatorState.pair, IndicatorState.name, IndicatorState.state, IndicatorState.last_open_time)
+                             .where(IndicatorState.pair.in_(missing))).all()
+            s.close()
+            for pair, name, st, last_open in rows:
+                ind = self.get(pair)
+                if name in ind.items:
+                    ind.items[name].load(json.loads(st))
+                    ind.last_open_time = last_open
+            self.loaded.update(missing)
+
+    def save(self, pairs):
+        rows = []
+        now = datetime.utcnow()
+        for pair in pairs:
+            ind = self.pairs.get(pair)
+            if ind is None or ind.last_open_time is None:
+                continue
+            for name, item in ind.items.items():
+                rows.append(dict(pair=pair, name=name, state=json.dumps(item.state()), last_open_time=ind.last_open_time, updated_at=now))
+        if not rows:
+            return
+        s = get_session()
+        s.execute(delete(IndicatorState).where(IndicatorState.pair.in_({r["pair"] for r in rows})))
+        s.execute(insert(IndicatorState), rows)
+        s.commit(); s.close()
+
+indicator_engine = IndicatorEngine()
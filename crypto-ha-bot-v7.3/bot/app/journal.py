@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func
+from .config import settings
+from .database import get_session
+from .models import TradeLog, Alert
+
+# Odczyt trade_logs/alerts stronami po kluczu (id malejąco, kursor before_id) z filtrami.
+# Zakres czasu zamieniany jest na zakres id (dwa odczyty indeksu ts), więc każdy filtr
+# to skan zakresu indeksu złożonego (kolumna, id) - koszt zależy od rozmiaru strony,
+# nie od rozmiaru tabeli. Wiersze trafiają do bazy partiami z kilkusekundowym opóźnieniem,
+# więc ts nie jest ściśle rosnące z id: granice id liczone z zapasem TS_SLACK,
+# a dokładny warunek na ts zostaje w zapytaniu.
+
+TS_SLACK = timedelta(seconds=60)
+
+def _row_log(r) -> dict:
+    return {"id": r.id, "ts": r.ts.isoformat(), "pair": r.pair, "level": r.level, "message": r.message,
+            "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent, "strategy": r.strategy}
+
+def _row_alert(r) -> dict:
+    return {"id": r.id, "ts": r.ts.isoformat(), "pair": r.pair, "type": r.type, "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent}
+
+def _id_range(s, model, start: datetime | None, end: datetime | None) -> tuple[int | None, int | None]:
+    # jeden wiersz z brzegu zakresu indeksu ts (MIN(id) WHERE ts >= .. skanowałby cały zakres)
+    lo = hi = None
+    if start is not None:
+        lo = s.execute(select(model.id).where(model.ts >= start - TS_SLACK).order_by(model.ts).limit(1)).scalar()
+        if lo is None:
+            return 0, -1  # nic nie jest tak nowe
+    if end is not None:
+        hi = s.execute(select(model.id).where(model.ts < end + TS_SLACK).order_by(model.ts.desc()).limit(1)).scalar()
+        if hi is None:
+            return 0, -1
+    return lo, hi
+
+def _page(model, filters: dict, limit: int, before_id: int | None, start: datetime | None, end: datetime | None):
+    s = get_session()
+    try:
+        q = select(model).order_by(model.id.desc()).limit(limit)
+        for col, v in filters.items():
+            if v:
+                q = q.where(getattr(model, col) == v)
+        lo, hi = _id_range(s, model, start, end)
+        if before_id is not None:
+            hi = before_id - 1 if hi is None else min(hi, before_id - 1)
+        if lo is not None:
+            q = q.where(model.id >= lo)
+        if hi is not None:
+            q = q.where(model.id <= hi)
+        if start is not None:
+            q = q.where(model.ts >= start)
+        if end is not None:
+            q = q.where(model.ts < end)
+        return list(s.scalars(q))
+    finally:
+        s.close()
+
+def page_logs(limit: int, before_id: int | None = None, pair: str | None = None, level: str | None = None,
+              strategy: str | None = None, start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+    # następna strona: before_id = id ostatniego wiersza (mniej niż limit wierszy = koniec)
+    rows = _page(TradeLog, {"pair": pair, "level": level, "strategy": strategy}, limit, before_id, start, end)
+    return [_row_log(r) for r in rows]
+
+def page_alerts(limit: int, before_id: int | None = None, pair: str | None = None, type: str | None = None,
+                start: datetime | None = None, end: datetime | None = None) -> list[dict]:
+    rows = _page(Alert, {"pair": pair, "type": type}, limit, before_id, start, end)
+    return [_row_alert(r) for r in rows]
+
+def _delete_chunks(model, where, order, batch: int, archive=None) -> int:
+    # partiami: krótkie transakcje, bez blokowania zapisu logów na czas całego kasowania
+    done = 0
+    while True:
+        s = get_session()
+        try:
+            rows = list(s.scalars(select(model).where(*where).order_by(*order).limit(batch)))
+            if not rows:
+                return done
+            if archive is not None:
+                archive(rows)  # przed DELETE: po awarii partia może trafić do archiwum dwa razy, ale nie zginie
+            s.execute(delete(model).where(model.id.in_([r.id for r in rows])))
+            s.commit()
+            done += len(rows)
+        finally:
+            s.close()
+
+def clear_alerts(pair: str | None = None, before: datetime | None = None) -> int:
+    # górna granica id z chwili wywołania: alerty dopisane w trakcie zostają
+    s = get_session()
+    try:
+        top = s.execute(select(func.max(Alert.id))).scalar()
+    finally:
+        s.close()
+    if top is None:
+        return 0
+    where = [Alert.id <= top]
+    if pair:
+        where.append(Alert.pair == pair)
+    if before is not None:
+        where.append(Alert.ts < before)
+    return _delete_chunks(Alert, where, (Alert.id,), settings.RETENTION_BATCH)
+
+def _archiver(directory: str, name: str, row):
+    # JSONL.gz per dzień (wg ts); dopisywanie tworzy kolejny człon gzip - zcat/gzip.open czytają całość
+    os.makedirs(directory, exist_ok=True)
+    def write(rows):
+        by_day: dict = {}
+        for r in rows:
+            by_day.setdefault(r.ts.strftime("%Y-%m-%d"), []).append(row(r))
+        for day, items in by_day.items():
+            with gzip.open(os.path.join(directory, f"{name}-{day}.jsonl.gz"), "at", encoding="utf-8") as f:
+                f.writelines(json.dumps(i, ensure_ascii=False) + "\n" for i in items)
+    return write
+
+def prune_logs() -> dict:
+    # retencja: trade_logs starsze niż LOG_RETENTION_DAYS (i alerty starsze niż ALERT_RETENTION_DAYS),
+    # opcjonalnie archiwizowane do LOG_ARCHIVE_DIR przed skasowaniem
+    out = {}
+    now = datetime.utcnow()
+    for key, model, days, row in (("logs_pruned", TradeLog, settings.LOG_RETENTION_DAYS, _row_log),
+                                  ("alerts_pruned", Alert, settings.ALERT_RETENTION_DAYS, _row_alert)):
+        if days <= 0:
+            continue
+        archive = _archiver(settings.LOG_ARCHIVE_DIR, model.__tablename__, row) if settings.LOG_ARCHIVE_DIR else None
+        out[key] = _delete_chunks(model, [model.ts < now - timedelta(days=days)], (model.ts, model.id), settings.RETENTION_BATCH, archive)
+    return out
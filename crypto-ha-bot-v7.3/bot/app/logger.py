@@ -1,12 +1,144 @@
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from .config import settings
 from .database import get_session
 from .models import TradeLog, Alert
+from .cache import response_cache
+from .metrics import Gauge
 
-def log(pair: str, message: str, level: str="INFO", pnl_usd: float|None=None, pnl_percent: float|None=None, strategy: str|None=None):
+class LogSink:
+    # Kolejka wierszy TradeLog/Alert zapisywanych w tle wielowierszowymi INSERT-ami
+    # (partia LOG_BATCH_SIZE lub co LOG_FLUSH_SEC). Pełna kolejka: polityka drop/block dla INFO;
+    # WARN/ERROR i alerty czekają block_sec, a potem idą zapisem synchronicznym, nigdy do kosza.
+    def __init__(self, maxsize: int, batch_size: int, flush_sec: float, policy: str, block_sec: float):
+        self.q: queue.Queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.flush_sec = flush_sec
+        self.policy = policy
+        self.block_sec = block_sec
+        self.dropped = 0
+        self.failed = 0
+        self.written = 0
+        self.thread: threading.Thread | None = None
+        self.stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive() and not self.stopping.is_set()
+
+    def start(self):
+        if self.running:
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        # dopisuje wszystko, co zostało w kolejce
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def put(self, model, row: dict, important: bool = False) -> bool:
+        # False = wiersz nie trafił do kolejki i wołający zapisuje go sam
+        if not self.running:
+            return False
+        try:
+            if self.policy == "block" or important:
+                self.q.put((model, row), timeout=self.block_sec)
+            else:
+                self.q.put_nowait((model, row))
+        except queue.Full:
+            if important:
+                return False
+            self.dropped += 1
+        return True
+
+    def stats(self) -> dict:
+        return {"queued": self.q.qsize(), "written": self.written, "dropped": self.dropped, "failed": self.failed}
+
+    def _run(self):
+        while not (self.stopping.is_set() and self.q.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_sec
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.q.get(timeout=min(timeout, 0.5)))
+                except queue.Empty:
+                    if self.stopping.is_set():
+                        break
+            if batch:
+                self._flush(batch)
+
+    def _insert(self, batch):
+        by_model: dict = {}
+        for model, row in batch:
+            by_model.setdefault(model, []).append(row)
+        s = get_session()
+        try:
+            for model, rows in by_model.items():
+                s.execute(insert(model), rows)
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+        self.written += len(batch)
+        response_cache.invalidate(*("alerts" if model is Alert else "logs" for model in by_model))
+
+    def _flush(self, batch):
+        # Błąd partii: jedna ponowna próba (zerwane połączenie, deadlock), potem wiersz po wierszu,
+        # żeby jeden zły wiersz nie zabrał reszty. Liczba utraconych trafia do logu.
+        try:
+            return self._insert(batch)
+        except Exception:
+            time.sleep(min(self.flush_sec, 1.0))
+        try:
+            return self._insert(batch)
+        except Exception as e:
+            err = e
+        lost = 0
+        for item in batch:
+            try:
+                self._insert([item])
+            except Exception as e:
+                err, lost = e, lost + 1
+        if lost:
+            self.failed += lost
+            msg = f"Utracono {lost} z {len(batch)} wierszy logów/alertów: {err}"
+            try:
+                self._insert([(TradeLog, dict(ts=datetime.utcnow(), pair="SYSTEM", level="ERROR", message=msg))])
+            except Exception:
+                print(msg, file=sys.stderr, flush=True)
+
+log_sink = LogSink(settings.LOG_QUEUE_MAX, settings.LOG_BATCH_SIZE, settings.LOG_FLUSH_SEC,
+                   settings.LOG_QUEUE_POLICY, settings.LOG_QUEUE_BLOCK_SEC)
+Gauge("bot_log_queue_depth", "Wiersze logów/alertów czekające na zapis", fn=lambda: log_sink.q.qsize())
+Gauge("bot_log_dropped", "Wiersze odrzucone przy pełnej kolejce", fn=lambda: log_sink.dropped)
+Gauge("bot_log_failed", "Wiersze, których zapis się nie udał", fn=lambda: log_sink.failed)
+
+def _write(model, row: dict, important: bool):
+    row["ts"] = datetime.utcnow()
+    if log_sink.put(model, row, important):
+        return
+    # sink nie działa (np. skrypty CLI) albo ważny wiersz nie zmieścił się w kolejce -> zapis synchroniczny
     s = get_session()
-    row = TradeLog(pair=pair, message=message, level=level, pnl_usd=pnl_usd, pnl_percent=pnl_percent, strategy=strategy)
-    s.add(row); s.commit(); s.close()
+    s.execute(insert(model), [row]); s.commit(); s.close()
+
+def log(pair: str, message: str, level: str="INFO", pnl_usd: float|None=None, pnl_percent: float|None=None, strategy: str|None=None):
+    row = dict(pair=pair, message=message, level=level, pnl_usd=pnl_usd, pnl_percent=pnl_percent, strategy=strategy)
+    _write(TradeLog, row, level in ("WARN", "ERROR"))
 
 def add_alert(pair: str, pnl_usd: float, pnl_percent: float, alert_type: str):
-    s = get_session()
-    row = Alert(pair=pair, pnl_usd=pnl_usd, pnl_percent=pnl_percent, type=alert_type)
-    s.add(row); s.commit(); s.close()
+    row = dict(pair=pair, pnl_usd=pnl_usd, pnl_percent=pnl_percent, type=alert_type)
+    _write(Alert, row, True)
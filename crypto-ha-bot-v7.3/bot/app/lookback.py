@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import select, delete, insert
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .database import get_session
+from .models import LookbackCandle
+
+HOUR_MS = 3_600_000
+LOOKBACK_DAYS = {"week": 7, "month": 30}
+
+class RollingWindow:
+    # min/max z ostatnich `size` świec 1h: zamknięte świece w kolejkach monotonicznych
+    # (amortyzowane O(1) na świecę) + bieżąca, niezamknięta świeca trzymana osobno
+    def __init__(self, size: int):
+        self.size = size
+        self.last_open: int | None = None
+        self.mins: deque[tuple[int, float]] = deque()  # low rosnąco
+        self.maxs: deque[tuple[int, float]] = deque()  # high malejąco
+        self.current: tuple[float, float] | None = None  # (low, high) świecy w toku
+
+    def reset(self):
+        self.last_open = None
+        self.mins.clear(); self.maxs.clear()
+        self.current = None
+
+    def push(self, open_time: int, low: float, high: float):
+        if self.last_open is not None and open_time <= self.last_open:
+            return
+        while self.mins and self.mins[-1][1] >= low:
+            self.mins.pop()
+        self.mins.append((open_time, low))
+        while self.maxs and self.maxs[-1][1] <= high:
+            self.maxs.pop()
+        self.maxs.append((open_time, high))
+        self.last_open = open_time
+        # okno = size-1 zamkniętych świec + świeca w toku (jak klines limit=size)
+        cutoff = open_time - (self.size - 2) * HOUR_MS
+        while self.mins[0][0] < cutoff:
+            self.mins.popleft()
+        while self.maxs[0][0] < cutoff:
+            self.maxs.popleft()
+
+    @property
+    def low(self) -> float | None:
+        vals = [self.mins[0][1]] if self.mins else []
+        if self.current: vals.append(self.current[0])
+        return min(vals) if vals else None
+
+    @property
+    def high(self) -> float | None:
+        vals = [self.maxs[0][1]] if self.maxs else []
+        if self.current: vals.append(self.current[1])
+        return max(vals) if vals else None
+
+class LookbackCache:
+    # Okna week/month ładowane raz (z bazy lub REST), potem dociągane o nowe świece 1h
+    def __init__(self):
+        self.windows: dict[tuple[str, int], RollingWindow] = {}
+        self.lock = threading.Lock()
+
+    def ref_low(self, client, pair: str, lookback: str) -> float:
+        size = 24 * LOOKBACK_DAYS.get(lookback, 30)
+        with self.lock:
+            w = self.windows.get((pair, size))
+            if w is None:
+                w = self.windows[(pair, size)] = RollingWindow(size)
+                self._load_persisted(pair, w)
+        self._extend(client, pair, w)
+        return w.low or 0.0
+
+    def _load_persisted(self, pair: str, w: RollingWindow):
+        if not settings.LOOKBACK_PERSIST:
+            return
+        since = int(time.time() * 1000) - w.size * HOUR_MS
+        s = get_session()
+        rows = s.execute(select(LookbackCandle.open_time, LookbackCandle.low, LookbackCandle.high)
+                         .where(LookbackCandle.pair == pair, LookbackCandle.open_time >= since)
+                         .order_by(LookbackCandle.open_time)).all()
+        s.close()
+        if not rows or rows[0][0] > since + HOUR_MS:
+            return  # kopia w bazie nie pokrywa całego okna -> pełne pobranie z REST
+        for open_time, low, high in rows:
+            w.push(open_time, low, high)
+
+    def _extend(self, client, pair: str, w: RollingWindow):
+        now_ms = int(time.time() * 1000)
+        missing = (now_ms - w.last_open) // HOUR_MS + 1 if w.last_open is not None else w.size
+        if missing >= w.size:
+            w.reset()  # za duża luka -> pełne okno od nowa
+            kw = {"limit": w.size}
+        else:
+            kw = {"startTime": w.last_open + HOUR_MS, "limit": int(missing)}
+        kl = client.klines(pair, '1h', **kw)
+        closed = []
+        w.current = None
+        for k in kl:
+            open_time, low, high = int(k[0]), float(k[3]), float(k[2])
+            if int(k[6]) < now_ms:
+                closed.append((open_time, low, high))
+            else:
+                w.current = (low, high)
+        for c in closed:
+            w.push(*c)
+        if closed and settings.LOOKBACK_PERSIST:
+            self._persist(pair, closed, now_ms - 31 * 24 * HOUR_MS)
+
+    def _persist(self, pair: str, closed, prune_before: int):
+        s = get_session()
+        have = set(s.execute(select(LookbackCandle.open_time).where(
+            LookbackCandle.pair == pair, LookbackCandle.open_time >= closed[0][0], LookbackCandle.open_time <= closed[-1][0])).scalars())
+        rows = [dict(pair=pair, open_time=o, low=l, high=h) for o, l, h in closed if o not in have]
+        try:
+            if rows:
+                s.execute(insert(LookbackCandle), rows)
+            s.commit()
+        except IntegrityError:
+            s.rollback()  # inny proces zapisał te świece w międzyczasie
+        s.execute(delete(LookbackCandle).where(LookbackCandle.pair == pair, LookbackCandle.open_time < prune_before))
+        s.commit(); s.close()
+
+lookback_cache = LookbackCache()
@@ -1,17 +1,27 @@
 import asyncio
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from .config import settings
 from .database import engine, Base, get_session
-from .models import MarketData, Package, TradeLog, Alert, PairConfig
-from .collector import fetch_and_store_pairs, fetch_fx, fetch_equities
-from .strategies import SimpleStrategy, StrategyParams
-from .logger import log, add_alert
-from .pnl import latest_price, last_points, peak_since, last_tph
+from .migrations import run_migrations
+from .models import PairConfig
+from .logger import log_sink
+from .pnl import last_points, latest_prices
+from .positions import position_book
 from .checks import is_quote_allowed
-from .binance_client import get_client
+from .binance_client import client_stats
+from .control import load_control, update_control, apply_control, load_heartbeats
+from .cache import response_cache
+from . import history
+from . import portfolio
+from . import journal
+from .events import event_bus
+from . import metrics
+from . import engine as trading_engine
+from .sharding import shard, list_workers
 
 app = FastAPI(title="Crypto HA Bot v7.3", version="7.3")
 
@@ -21,15 +31,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 Base.metadata.create_all(bind=engine)
-
-running = False
-autotrade = settings.AUTO_TRADE
-last_alert = {}
-last_fx_fetch = None
-last_eq_fetch = None
+run_migrations()
 
 class StartBody(BaseModel):
     pairs: list[str] | None = None
@@ -59,30 +65,53 @@ class PairCfgBody(BaseModel):
 
 @app.get("/health")
 def health():
-    return {"status":"ok","running":running, "autotrade": autotrade, "pairs": settings.DEFAULT_PAIRS}
+    ctrl = load_control()
+    beats = load_heartbeats()
+    last = beats[0] if beats else {}
+    return {"status":"ok","running":ctrl.running, "autotrade": ctrl.autotrade, "pairs": ctrl.pairs,
+            "worker": {"mode": settings.WORKER_MODE, "id": last.get("id"), "seen_at": last.get("seen_at"),
+                       "alive": sum(b["alive"] for b in beats), "dead": [b["id"] for b in beats if not b["alive"]]},
+            "last_tick": last.get("last_tick", {}), "heartbeats": beats, "log_queue": log_sink.stats(),
+            "workers": list_workers() if settings.SHARD_ENABLED else None}
+
+@app.get("/stats/binance")
+def binance_stats():
+    return client_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # w WORKER_MODE=external metryki ticku wystawia worker na METRICS_PORT
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/cache")
+def cache_stats():
+    return response_cache.stats()
+
+def cached(request: Request, key: str, deps, build) -> Response:
+    # odpowiedź z cache (przebudowa tylko po zmianie wersji danych) + rewalidacja ETag/Last-Modified
+    entry = response_cache.get(key, deps, build)
+    headers = response_cache.headers(entry)
+    if response_cache.is_fresh(entry, request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
 
 @app.post("/start")
 def start_bot(body: StartBody | None=None):
-    global running, autotrade
-    running = True
-    if body:
-        if body.pairs:
-            settings.DEFAULT_PAIRS = [p.upper() for p in body.pairs if is_quote_allowed(p.upper())]
-        if body.autotrade is not None:
-            autotrade = body.autotrade
-    return {"running": running, "autotrade": autotrade, "pairs": settings.DEFAULT_PAIRS}
+    pairs = None
+    if body and body.pairs:
+        pairs = [p.upper() for p in body.pairs if is_quote_allowed(p.upper())]
+    ctrl = update_control(running=True, pairs=pairs, autotrade=body.autotrade if body else None)
+    return {"running": ctrl.running, "autotrade": ctrl.autotrade, "pairs": ctrl.pairs}
 
 @app.post("/stop")
 def stop_bot():
-    global running
-    running = False
-    return {"running": running}
+    ctrl = update_control(running=False)
+    return {"running": ctrl.running}
 
 @app.post("/autotrade")
 def set_autotrade(flag: bool):
-    global autotrade
-    autotrade = bool(flag)
-    return {"autotrade": autotrade}
+    ctrl = update_control(autotrade=bool(flag))
+    return {"autotrade": ctrl.autotrade}
 
 @app.post("/order/buy")
 def buy_package(body: BuyBody):
@@ -95,54 +124,156 @@ def buy_package(body: BuyBody):
 
 @app.post("/order/sell")
 def sell_packages(body: SellBody):
-    from .orders import market_sell_package
-    s = get_session()
+    from .orders import market_sell_package, market_sell_packages
+    pair = body.pair.upper()
     try:
         if body.package_id is not None:
-            pkg = s.query(Package).filter(Package.id==body.package_id, Package.pair==body.pair.upper(), Package.sold_at.is_(None)).first()
+            position_book.sync()  # sprzedaże workera od ostatniego odczytu
+            pos = position_book.get(pair)
+            pkg = pos.packages.get(body.package_id) if pos else None
             if not pkg:
                 raise HTTPException(status_code=404, detail="Package not found or already sold")
-            return market_sell_package(pkg.id, pkg.pair, pkg.quantity)
+            return market_sell_package(pkg.id, pair)
         else:
-            pkgs = s.query(Package).filter(Package.pair==body.pair.upper(), Package.sold_at.is_(None)).all()
-            res = []
-            for p in pkgs:
-                res.append(market_sell_package(p.id, p.pair, p.quantity))
-            return {"sold_count": len(res), "orders": res}
+            return market_sell_packages(pair)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        s.close()
+
+@app.get("/positions")
+def get_positions(pair: str | None = None, packages: bool = False):
+    # otwarte pozycje z księgi w pamięci (sumy bieżące) + ostatnie ceny jednym zapytaniem
+    position_book.sync()
+    pairs = [pair.upper()] if pair else position_book.pairs()
+    prices = latest_prices(pairs)
+    rows = [r for r in position_book.snapshot(prices.get, packages) if r["pair"] in pairs]
+    return {"positions": rows, "packages": sum(r["packages_count"] for r in rows),
+            "value_usd": sum(r.get("value_usd", 0.0) for r in rows),
+            "unrealized_pnl_usd": sum(r.get("unrealized_pnl_usd", 0.0) for r in rows)}
+
+def logs_data(limit: int):
+    return journal.page_logs(limit)
+
+def alerts_data(limit: int):
+    return journal.page_alerts(limit)
+
+def _range(from_: str | None, to: str | None) -> tuple[datetime | None, datetime | None]:
+    try:
+        return (parse_ts(from_) if from_ else None), (parse_ts(to) if to else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Niepoprawny from/to: {e}")
 
 @app.get("/logs")
-def get_logs(limit: int = 100):
-    s = get_session()
-    rows = s.query(TradeLog).order_by(TradeLog.ts.desc()).limit(limit).all()
-    s.close()
-    return [{"ts": r.ts.isoformat(), "pair": r.pair, "level": r.level, "message": r.message, "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent, "strategy": r.strategy} for r in rows]
+def get_logs(request: Request, limit: int = 100, before_id: int | None = None, pair: str | None = None, level: str | None = None,
+             strategy: str | None = None, from_: str | None = Query(None, alias="from"), to: str | None = None):
+    # od najnowszych; kolejna strona: before_id = id ostatniego wiersza
+    start, end = _range(from_, to)
+    limit = max(1, min(limit, settings.LOGS_PAGE_MAX))
+    pair, level = pair.upper() if pair else None, level.upper() if level else None
+    return cached(request, f"logs:{limit}:{before_id}:{pair}:{level}:{strategy}:{from_}:{to}", ("logs",),
+                  lambda: journal.page_logs(limit, before_id, pair, level, strategy, start, end))
 
 @app.get("/alerts")
-def get_alerts(limit: int = 100):
-    s = get_session()
-    rows = s.query(Alert).order_by(Alert.ts.desc()).limit(limit).all()
-    s.close()
-    return [{"ts": r.ts.isoformat(), "pair": r.pair, "type": r.type, "pnl_usd": r.pnl_usd, "pnl_percent": r.pnl_percent} for r in rows]
+def get_alerts(request: Request, limit: int = 100, before_id: int | None = None, pair: str | None = None, type: str | None = None,
+               from_: str | None = Query(None, alias="from"), to: str | None = None):
+    start, end = _range(from_, to)
+    limit = max(1, min(limit, settings.LOGS_PAGE_MAX))
+    pair = pair.upper() if pair else None
+    return cached(request, f"alerts:{limit}:{before_id}:{pair}:{type}:{from_}:{to}", ("alerts",),
+                  lambda: journal.page_alerts(limit, before_id, pair, type, start, end))
 
 @app.delete("/alerts")
-def clear_alerts():
-    s = get_session()
-    s.query(Alert).delete()
-    s.commit(); s.close()
-    return {"cleared": True}
+def clear_alerts(pair: str | None = None, before: str | None = None):
+    # partiami (RETENTION_BATCH); opcjonalnie tylko para i/lub alerty starsze niż before
+    _, end = _range(None, before)
+    n = journal.clear_alerts(pair.upper() if pair else None, end)
+    response_cache.invalidate("alerts")
+    return {"cleared": True, "deleted": n}
+
+def parse_ts(v: str) -> datetime:
+    # epoch (s lub ms) albo ISO 8601; wynik jako naiwny UTC, jak kolumny ts
+    if v.replace(".", "", 1).isdigit():
+        x = float(v)
+        return datetime.utcfromtimestamp(x / 1000 if x > 1e11 else x)
+    d = datetime.fromisoformat(v.replace("Z", "+00:00"))
+    return d.astimezone(timezone.utc).replace(tzinfo=None) if d.tzinfo else d
 
 @app.get("/market/history")
-def market_history(pair: str, limit: int = 100):
-    return {"pair": pair.upper(), "points": last_points(pair.upper(), limit=limit)}
+def market_history(request: Request, pair: str, limit: int = 100, from_: str | None = Query(None, alias="from"),
+                   to: str | None = None, resolution: str | None = None, max_points: int | None = None):
+    # bez from/to/resolution/max_points: ostatnie `limit` punktów 5m (jak dotąd);
+    # z resolution: świece OHLC (auto = dobór do max_points); samo from/to/max_points: punkty po LTTB
+    pair = pair.upper()
+    if from_ is None and to is None and resolution is None and max_points is None:
+        return cached(request, f"history:{pair}:{limit}", ("market",),
+                      lambda: {"pair": pair, "points": last_points(pair, limit=limit)})
+    try:
+        end = parse_ts(to) if to else datetime.utcnow()
+        start = parse_ts(from_) if from_ else end - timedelta(days=1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Niepoprawny from/to: {e}")
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from musi być wcześniejsze niż to")
+    n = max(3, min(max_points or settings.HISTORY_MAX_POINTS, settings.HISTORY_MAX_POINTS_LIMIT))
+    if resolution is not None and resolution != "auto" and resolution not in history.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution: auto albo {', '.join(history.RESOLUTIONS)}")
+
+    def build():
+        body = {"pair": pair, "from": start.isoformat(), "to": end.isoformat()}
+        if resolution is None:
+            return {**body, "max_points": n, "points": history.points(pair, start, end, n)}
+        res = resolution
+        if res == "auto" or (end - start).total_seconds() / history.RESOLUTIONS[res] > n:
+            res = history.pick_resolution(start, end, n)  # zbyt drobna rozdzielczość dla zakresu -> zgrubniej
+        return {**body, "resolution": res, "candles": history.candles(pair, start, end, res)}
+    return cached(request, f"history:{pair}:{from_}:{to}:{resolution}:{n}", ("market",), build)
+
+@app.get("/portfolio/history")
+def portfolio_history(request: Request, from_: str | None = Query(None, alias="from"), to: str | None = None,
+                      max_points: int | None = None):
+    # wiersze portfolio_history (jeden na tick) z zakresu, domyślnie ostatnie 7 dni, przerzedzone LTTB
+    try:
+        end = parse_ts(to) if to else datetime.utcnow()
+        start = parse_ts(from_) if from_ else end - timedelta(days=7)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Niepoprawny from/to: {e}")
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from musi być wcześniejsze niż to")
+    n = max(3, min(max_points or settings.HISTORY_MAX_POINTS, settings.HISTORY_MAX_POINTS_LIMIT))
+    return cached(request, f"portfolio:{from_}:{to}:{n}", ("portfolio",),
+                  lambda: {"from": start.isoformat(), "to": end.isoformat(), "max_points": n,
+                           "points": portfolio.history(start, end, n)})
+
+@app.get("/dashboard")
+def dashboard(request: Request, pairs: str | None = None, points: int = 100, logs: int = 50, alerts: int = 50):
+    # wszystko, czego potrzebuje karta HA, w jednym zapytaniu (zamiast /health, /config, /logs, /alerts i historii per para)
+    def build():
+        ctrl = load_control()
+        plist = [p.strip().upper() for p in pairs.split(",") if p.strip()] if pairs else ctrl.pairs
+        return {
+            "health": {"running": ctrl.running, "autotrade": ctrl.autotrade, "pairs": ctrl.pairs},
+            "config": config_data(ctrl),
+            "logs": logs_data(logs),
+            "alerts": alerts_data(alerts),
+            "history": {p: last_points(p, limit=points) for p in plist},
+        }
+    return cached(request, f"dashboard:{pairs}:{points}:{logs}:{alerts}", ("market", "logs", "alerts", "control"), build)
+
+@app.get("/events")
+async def events(request: Request, last_event_id: int | None = None):
+    # SSE: market / log / alert / package (+ reset = przeładuj /dashboard); EventSource sam wysyła Last-Event-ID
+    hdr = request.headers.get("last-event-id")
+    lid = int(hdr) if hdr and hdr.isdigit() else last_event_id
+    return StreamingResponse(event_bus.stream(lid), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/config")
-def get_config():
+def get_config(request: Request):
+    return cached(request, "config", ("control",), lambda: config_data(load_control()))
+
+def config_data(ctrl) -> dict:
+    apply_control(ctrl)
     return {
         "min_profit_pct": settings.STRAT_MIN_PROFIT_PCT,
         "hysteresis_pct": settings.STRAT_HYSTERESIS_PCT,
@@ -156,14 +287,8 @@ def get_config():
 
 @app.put("/config")
 def update_config(body: ConfigBody):
-    if body.min_profit_pct is not None: settings.STRAT_MIN_PROFIT_PCT = float(body.min_profit_pct)
-    if body.hysteresis_pct is not None: settings.STRAT_HYSTERESIS_PCT = float(body.hysteresis_pct)
-    if body.buy_drawdown_pct is not None: settings.STRAT_BUY_DRAWDOWN_PCT = float(body.buy_drawdown_pct)
-    if body.min_trades_per_hour is not None: settings.STRAT_MIN_TRADES_PER_HOUR = int(body.min_trades_per_hour)
-    if body.base_package_usd is not None: settings.STRAT_BASE_PACKAGE_USD = float(body.base_package_usd)
-    if body.downtrend_multiplier is not None: settings.STRAT_DOWNTREND_MULTIPLIER = float(body.downtrend_multiplier)
-    if body.buy_lookback is not None: settings.STRAT_BUY_LOOKBACK = body.buy_lookback.lower()
-    return get_config()
+    ctrl = update_control(strategy=body.model_dump(exclude_none=True))
+    return config_data(ctrl)
 
 @app.get("/pair-config")
 def get_pair_config():
@@ -184,123 +309,19 @@ def put_pair_config(body: PairCfgBody):
     s.commit(); s.close()
     return {"pair": c.pair, "allowed": c.allowed, "risk_level": c.risk_level}
 
-async def loop_task():
-    global last_fx_fetch, last_eq_fetch
-    while True:
-        if running:
-            # kolektor krypto 5m
-            fetch_and_store_pairs(settings.DEFAULT_PAIRS)
-
-            # kolektory zewnętrzne wg interwału
-            now = datetime.utcnow()
-            if last_fx_fetch is None or (now - last_fx_fetch).total_seconds() >= 3600:
-                fetch_fx(); last_fx_fetch = now
-            if last_eq_fetch is None or (now - last_eq_fetch).total_seconds() >= 3600:
-                fetch_equities(); last_eq_fetch = now
-
-            # autotrade
-            if autotrade:
-                params = StrategyParams(
-                    min_profit_pct=settings.STRAT_MIN_PROFIT_PCT,
-                    hysteresis_pct=settings.STRAT_HYSTERESIS_PCT,
-                    buy_drawdown_pct=settings.STRAT_BUY_DRAWDOWN_PCT,
-                    min_trades_per_hour=settings.STRAT_MIN_TRADES_PER_HOUR,
-                    base_package_usd=settings.STRAT_BASE_PACKAGE_USD,
-                    downtrend_multiplier=settings.STRAT_DOWNTREND_MULTIPLIER,
-                    buy_lookback=settings.STRAT_BUY_LOOKBACK,
-                )
-                strat = SimpleStrategy(params)
-
-                client = get_client()
-
-                for pair in settings.DEFAULT_PAIRS:
-                    if not is_quote_allowed(pair):
-                        continue
-
-                    # pair-specific config
-                    s = get_session()
-                    pc = s.query(PairConfig).filter(PairConfig.pair==pair).first()
-                    s.close()
-                    allowed = pc.allowed if pc else True
-                    risk_level = pc.risk_level if pc else 5
-                    if not allowed:
-                        log(pair, "Para wyłączona w konfiguracji", "DEBUG")
-                        continue
-
-                    # bieżące dane
-                    price_now = latest_price(pair)
-                    tph = last_tph(pair)
-
-                    # EMA i downtrend
-                    s = get_session()
-                    last_md = s.query(MarketData).filter(MarketData.pair==pair).order_by(MarketData.ts.desc()).first()
-                    s.close()
-                    ema_fast = last_md.ema_fast if last_md else None
-                    is_downtrend = (ema_fast is not None) and price_now is not None and price_now < ema_fast
-
-                    # low wg lookback
-                    ref_low = 0.0
-                    try:
-                        if settings.STRAT_BUY_LOOKBACK == "day":
-                            t24 = client.ticker_24hr(symbol=pair)
-                            ref_low = float(t24.get("lowPrice", 0) or 0)
-                        else:
-                            # week = 7d, month = 30d
-                            days = 7 if settings.STRAT_BUY_LOOKBACK=="week" else 30
-                            kl = client.klines(pair, '1h', limit=24*days)
-                            lows = [float(k[3]) for k in kl]
-                            ref_low = min(lows) if lows else 0.0
-                    except Exception:
-                        ref_low = 0.0
-
-                    # SELL dla każdego pakietu
-                    s = get_session()
-                    open_pkgs = s.query(Package).filter(Package.pair==pair, Package.sold_at.is_(None)).all()
-                    s.close()
-                    for p in open_pkgs:
-                        pk = peak_since(pair, p.created_at) or price_now or p.entry_price
-                        sell, reason = strat.should_sell(price_now or p.entry_price, p.entry_price, pk)
-                        if sell:
-                            from .orders import market_sell_package
-                            market_sell_package(p.id, pair, p.quantity)
-                            log(pair, f"AUTOSPRZEDAŻ: {reason}", "INFO", strategy=strat.name)
-
-                    # BUY wg strategii
-                    will_buy, why, mult = strat.should_buy(price_now or 0.0, ref_low, tph, is_downtrend)
-                    if will_buy and price_now:
-                        risk_scale = max(0.2, min(2.0, (risk_level+1)/5.0))  # 0..10 -> 0.2..2.2 aprox
-                        quote_amt = settings.STRAT_BASE_PACKAGE_USD * mult * risk_scale
-                        from .orders import market_buy_package
-                        try:
-                            market_buy_package(pair, quote_amt)
-                            log(pair, f"AUTOKUPNO: {why} (qtyUSD={quote_amt:.2f}, risk={risk_level})", "INFO", strategy=strat.name)
-                        except Exception as e:
-                            log(pair, f"Błąd kupna: {e}", "ERROR", strategy=strat.name)
-
-                    # alerty PnL (na poziomie całej pozycji)
-                    s = get_session()
-                    open_pkgs = s.query(Package).filter(Package.pair==pair, Package.sold_at.is_(None)).all()
-                    s.close()
-                    total_qty = sum(p.quantity for p in open_pkgs) if open_pkgs else 0.0
-                    if total_qty > 0 and price_now:
-                        entry_avg = sum(p.entry_price*p.quantity for p in open_pkgs)/total_qty
-                        pnl_usd = (price_now - entry_avg) * total_qty
-                        pnl_pct = (price_now - entry_avg) / entry_avg * 100.0 if entry_avg>0 else 0.0
-                        log(pair, f"PNL {pnl_usd:.2f} USD ({pnl_pct:.2f}%)", "INFO", pnl_usd=pnl_usd, pnl_percent=pnl_pct, strategy=strat.name)
-                        now2 = datetime.utcnow()
-                        last = last_alert.get(pair, {})
-                        if pnl_pct >= settings.ALERT_PNL_POSITIVE:
-                            if 'pos' not in last or (now2 - last['pos']).total_seconds() >= settings.BOT_INTERVAL_SEC:
-                                add_alert(pair, pnl_usd, pnl_pct, "positive")
-                                last['pos'] = now2
-                        if pnl_pct <= settings.ALERT_PNL_NEGATIVE:
-                            if 'neg' not in last or (now2 - last['neg']).total_seconds() >= settings.BOT_INTERVAL_SEC:
-                                add_alert(pair, pnl_usd, pnl_pct, "negative")
-                                last['neg'] = now2
-                        last_alert[pair] = last
-
-        await asyncio.sleep(settings.BOT_INTERVAL_SEC)
-
 @app.on_event("startup")
 async def on_start():
-    asyncio.create_task(loop_task())
+    log_sink.start()
+    try:
+        await asyncio.to_thread(position_book.load)
+    except Exception:
+        pass  # baza niedostępna: księga wczyta się przy pierwszym sync()
+    asyncio.create_task(event_bus.run())
+    if settings.WORKER_MODE == "thread":
+        trading_engine.start_thread()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if settings.WORKER_MODE == "thread" and shard is not None:
+        await asyncio.to_thread(shard.stop)
+    await asyncio.to_thread(log_sink.stop)
@@ -0,0 +1,244 @@
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .config import settings
+
+# Metryki w formacie tekstowym Prometheusa (bez zależności od prometheus_client).
+# API wystawia je pod /metrics; worker uruchomiony osobno (python -m app.worker) - na METRICS_PORT.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TICK_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REGISTRY: list["Metric"] = []
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+class Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, kw) -> tuple:
+        return tuple(kw.get(n, "") for n in self.labels)
+
+    @abstractmethod
+    def samples(self) -> list[tuple]: ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, v in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(names, values)} {float(v)!r}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = defaultdict(float)
+
+    def inc(self, value: float = 1, **labels):
+        with self.lock:
+            self.values[self._key(labels)] += value
+
+    def samples(self):
+        with self.lock:
+            return [("", self.labels, k, v) for k, v in self.values.items()]
+
+class Gauge(Metric):
+    # fn: odczyt przy renderowaniu -> liczba albo lista (wartości etykiet, liczba)
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                v = self.fn()
+            except Exception:
+                return []
+            return [("", self.labels, k, x) for k, x in v] if isinstance(v, list) else [("", (), (), v)]
+        with self.lock:
+            return [("", self.labels, k, v) for k, v in self.values.items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, (counts, total, n) in self.values.items():
+                for b, c in zip(self.buckets, counts):
+                    out.append(("_bucket", self.labels + ("le",), key + (f"{b:g}",), c))
+                out.append(("_bucket", self.labels + ("le",), key + ("+Inf",), n))
+                out.append(("_sum", self.labels, key, total))
+                out.append(("_count", self.labels, key, n))
+        return out
+
+def render() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+# --- metryki wspólne ---
+tick_seconds = Histogram("bot_tick_duration_seconds", "Czas całego ticku pętli handlu", buckets=TICK_BUCKETS)
+tick_phase_seconds = Histogram("bot_tick_phase_seconds", "Czas fazy ticku (suma po parach)", ("phase",), buckets=TICK_BUCKETS)
+tick_overruns = Counter("bot_tick_overruns_total", "Ticki dłuższe niż BOT_INTERVAL_SEC")
+tick_db_queries = Histogram("bot_tick_db_queries", "Zapytania SQL w jednym ticku", buckets=(1, 3, 5, 10, 25, 50, 100, 250, 500))
+tick_db_seconds = Histogram("bot_tick_db_seconds", "Łączny czas zapytań SQL w jednym ticku", buckets=TICK_BUCKETS)
+tick_last = Gauge("bot_tick_last_phase_seconds", "Fazy ostatniego ticku", ("phase",))
+db_query_seconds = Histogram("bot_db_query_seconds", "Czas pojedynczego zapytania SQL")
+binance_request_seconds = Histogram("bot_binance_request_seconds", "Czas zapytania REST do Binance", ("endpoint",))
+binance_weight = Counter("bot_binance_weight_total", "Szacowana waga zapytań REST Binance", ("endpoint",))
+binance_errors = Counter("bot_binance_errors_total", "Zapytania Binance zakończone błędem lub HTTP >= 400", ("endpoint",))
+
+class TickTimer:
+    # fazy ticku liczone w wątku silnika; phase() sumuje czasy, finish() zapisuje histogramy
+    def __init__(self):
+        self.phases: dict[str, float] = defaultdict(float)
+        self.t0 = 0.0
+
+    def start(self):
+        self.phases = defaultdict(float)
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - t
+
+    def finish(self, q: int, sec: float) -> dict:
+        # q, sec: zapytania SQL i ich czas przypisane do ticku (database.QueryStats.track)
+        total = time.perf_counter() - self.t0
+        tick_seconds.observe(total)
+        for name, secs in self.phases.items():
+            tick_phase_seconds.observe(secs, phase=name)
+        with tick_last.lock:
+            tick_last.values = {(name,): secs for name, secs in self.phases.items()}
+        if total > settings.BOT_INTERVAL_SEC:
+            tick_overruns.inc()
+        tick_db_queries.observe(q)
+        tick_db_seconds.observe(sec)
+        return {"duration_sec": round(total, 3), "db_queries": q, "db_sec": round(sec, 3),
+                "phases": {k: round(v, 4) for k, v in self.phases.items()}}
+
+tick_timer = TickTimer()
+
+class SamplingProfiler:
+    # Opt-in (PROFILE_TICKS=true): wątek próbkujący co PROFILE_INTERVAL_MS stosy wątku silnika
+    # i wątków roboczych (asyncio.to_thread, kolektor). Najwolniejszy tick zapisywany jako
+    # "collapsed stacks" (flamegraph.pl / speedscope) w PROFILE_DIR/slowest_tick.folded.
+    IDLE = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+    def __init__(self, interval_ms: float, out_dir: str):
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.slowest = 0.0
+        self.stacks: dict[str, int] = {}
+        self.stop_ev = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.target = 0
+
+    def _wanted(self, ident: int, names: dict[int, str]) -> bool:
+        n = names.get(ident, "")
+        return ident == self.target or n.startswith("asyncio_") or n.startswith("collector")
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self.stop_ev.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or not self._wanted(ident, names):
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in self.IDLE:
+                    continue
+                parts = []
+                f = frame
+                while f is not None:
+                    parts.append(f"{f.f_code.co_name} ({os.path.basename(f.f_code.co_filename)}:{f.f_lineno})")
+                    f = f.f_back
+                key = ";".join(reversed(parts))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def start(self):
+        self.stacks = {}
+        self.target = threading.get_ident()
+        self.stop_ev.clear()
+        self.thread = threading.Thread(target=self._run, name="tick-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self, duration: float):
+        self.stop_ev.set()
+        if self.thread is not None:
+            self.thread.join()
+        if duration <= self.slowest or not self.stacks:
+            return
+        self.slowest = duration
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, "slowest_tick.folded")
+        with open(path + ".tmp", "w") as f:
+            f.write(f"# tick {duration:.3f}s, {sum(self.stacks.values())} próbek co {self.interval * 1000:g} ms\n")
+            for key, n in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+                f.write(f"{key} {n}\n")
+        os.replace(path + ".tmp", path)
+
+profiler = SamplingProfiler(settings.PROFILE_INTERVAL_MS, settings.PROFILE_DIR) if settings.PROFILE_TICKS else None
+profile_slowest = Gauge("bot_profile_slowest_tick_seconds", "Czas najwolniejszego profilowanego ticku",
+                        fn=lambda: profiler.slowest if profiler else 0.0)
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404); self.end_headers(); return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int):
+    # /metrics dla procesu workera
+    srv = ThreadingHTTPServer(("0.0.0.0", port), _Handler)
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
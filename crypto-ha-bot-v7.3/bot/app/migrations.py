@@ -0,0 +1,72 @@
+from sqlalchemy import inspect, text
+from .config import settings
+from .database import engine
+from .models import MarketData, Package, TradeLog, Alert
+
+# Base.metadata.create_all tworzy tylko brakujące tabele; zmiany w istniejących
+# tabelach dokładamy tutaj, idempotentnie, przy starcie aplikacji.
+
+def _add_column(conn, table: str, column: str, ddl: str) -> bool:
+    if column in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return False
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+def _drop_not_null(conn, table: str, column: str, ddl: str) -> bool:
+    # SQLite nie zmienia definicji kolumny; tam NULL-e przyjmują tylko bazy utworzone od nowa (create_all)
+    col = next(c for c in inspect(conn).get_columns(table) if c["name"] == column)
+    if col["nullable"] or conn.dialect.name == "sqlite":
+        return False
+    conn.execute(text(f"ALTER TABLE {table} MODIFY {column} {ddl}"))
+    return True
+
+def _create_index(conn, table, name: str) -> bool:
+    if name in {i["name"] for i in inspect(conn).get_indexes(table.name)}:
+        return False
+    next(i for i in table.indexes if i.name == name).create(conn)
+    return True
+
+def backfill_package_peaks(conn):
+    # jednorazowo: szczyt od wejścia dla otwartych pakietów bez peak_price
+    conn.execute(text(
+        "UPDATE packages SET peak_price = (SELECT MAX(m.price) FROM market_data m "
+        "WHERE m.pair = packages.pair AND m.ts >= packages.created_at) "
+        "WHERE sold_at IS NULL AND peak_price IS NULL"))
+    conn.execute(text("UPDATE packages SET peak_price = entry_price WHERE sold_at IS NULL AND peak_price IS NULL"))
+
+def unique_market_data(conn):
+    # uq_market_data_pair_ts na istniejącej tabeli. Duplikaty (pair, ts) nie są kasowane po cichu:
+    # bez MIGRATE_DEDUPE_MARKET_DATA=true start kończy się błędem z liczbą duplikatów per para,
+    # z nim zostaje najstarszy wiersz, a liczba usuniętych per para trafia do logu kontenera
+    if "uq_market_data_pair_ts" in {i["name"] for i in inspect(conn).get_indexes("market_data")}:
+        return
+    dups = conn.execute(text("SELECT pair, ts, MIN(id), COUNT(*) FROM market_data GROUP BY pair, ts HAVING COUNT(*) > 1")).all()
+    per_pair = {}
+    for pair, _, _, n in dups:
+        per_pair[pair] = per_pair.get(pair, 0) + n - 1
+    summary = ", ".join(f"{p}={n}" for p, n in sorted(per_pair.items()))
+    if dups and not settings.MIGRATE_DEDUPE_MARKET_DATA:
+        raise RuntimeError(f"market_data: {sum(per_pair.values())} zdublowanych wierszy (pair, ts): {summary}. "
+                           "Usuń je ręcznie albo uruchom raz z MIGRATE_DEDUPE_MARKET_DATA=true (zostaje najstarszy wiersz).")
+    for pair, ts, keep, _ in dups:
+        conn.execute(text("DELETE FROM market_data WHERE pair = :p AND ts = :t AND id <> :k"), {"p": pair, "t": ts, "k": keep})
+    if dups:
+        print(f"migracja market_data: usunięto duplikaty (pair, ts): {summary}")
+    _create_index(conn, MarketData.__table__, "uq_market_data_pair_ts")
+
+def run_migrations():
+    with engine.begin() as conn:
+        if _add_column(conn, "packages", "peak_price", "FLOAT NULL"):
+            backfill_package_peaks(conn)
+        unique_market_data(conn)
+        _add_column(conn, "packages", "sell_claim", "VARCHAR(32) NULL")
+        _add_column(conn, "packages", "unsold_qty", "FLOAT NULL")
+        _create_index(conn, Package.__table__, "ix_packages_sold_at")
+        for col in ("total_value_eur", "realized_pnl_eur", "unrealized_pnl_eur"):
+            _add_column(conn, "portfolio_history", col, "FLOAT NULL")
+        _add_column(conn, "portfolio_history", "open_packages", "INTEGER NULL")
+        for col in ("total_value_pln", "realized_pnl_pln", "unrealized_pnl_pln"):
+            _drop_not_null(conn, "portfolio_history", col, "FLOAT NULL")
+        for name in ("ix_trade_logs_pair_id", "ix_trade_logs_level_id", "ix_trade_logs_strategy_id"):
+            _create_index(conn, TradeLog.__table__, name)
+        _create_index(conn, Alert.__table__, "ix_alerts_type_id")
@@ -1,10 +1,12 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import DateTime, Integer, String, Text, Boolean, Float
+from sqlalchemy import DateTime, Integer, BigInteger, String, Text, Boolean, Float, Index, UniqueConstraint
 from datetime import datetime
 from .database import Base
 
 class MarketData(Base):
     __tablename__ = "market_data"
+    # unikalne (pair, ts): backfill i świece ze streamu (ts = zamknięcie świecy) pomijają duplikaty
+    __table_args__ = (Index("uq_market_data_pair_ts", "pair", "ts", unique=True),)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     pair: Mapped[str] = mapped_column(String(16), index=True)
@@ -16,6 +18,7 @@ class MarketData(Base):
 
 class Package(Base):
     __tablename__ = "packages"
+    __table_args__ = (Index("ix_packages_sold_at", "sold_at"),)  # przyrostowa wycena portfela (sprzedane od ostatniego ticku)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     pair: Mapped[str] = mapped_column(String(16), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -25,9 +28,15 @@ class Package(Base):
     sold_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     realized_pnl_usd: Mapped[float | None] = mapped_column(Float, nullable=True)
     realized_pnl_pln: Mapped[float | None] = mapped_column(Float, nullable=True)
+    peak_price: Mapped[float | None] = mapped_column(Float, nullable=True)  # najwyższa cena od zakupu
+    sell_claim: Mapped[str | None] = mapped_column(String(32), nullable=True)  # token sprzedaży w toku (orders._claim)
+    unsold_qty: Mapped[float | None] = mapped_column(Float, nullable=True)  # pył poniżej kroku LOT_SIZE, którego nie sprzedano
 
 class TradeLog(Base):
     __tablename__ = "trade_logs"
+    # filtry /logs ze stronicowaniem po id (kursor before_id)
+    __table_args__ = (Index("ix_trade_logs_pair_id", "pair", "id"), Index("ix_trade_logs_level_id", "level", "id"),
+                      Index("ix_trade_logs_strategy_id", "strategy", "id"))
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     level: Mapped[str] = mapped_column(String(16), default="INFO")
@@ -41,12 +50,16 @@ class PortfolioHistory(Base):
     __tablename__ = "portfolio_history"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
-    total_value_pln: Mapped[float] = mapped_column(Float)
+    total_value_pln: Mapped[float | None] = mapped_column(Float, nullable=True)  # NULL: brak kursu, uzupełniany później
     total_value_usd: Mapped[float] = mapped_column(Float)
-    realized_pnl_pln: Mapped[float] = mapped_column(Float)
-    unrealized_pnl_pln: Mapped[float] = mapped_column(Float)
+    realized_pnl_pln: Mapped[float | None] = mapped_column(Float, nullable=True)
+    unrealized_pnl_pln: Mapped[float | None] = mapped_column(Float, nullable=True)
     realized_pnl_usd: Mapped[float] = mapped_column(Float)
     unrealized_pnl_usd: Mapped[float] = mapped_column(Float)
+    total_value_eur: Mapped[float | None] = mapped_column(Float, nullable=True)
+    realized_pnl_eur: Mapped[float | None] = mapped_column(Float, nullable=True)
+    unrealized_pnl_eur: Mapped[float | None] = mapped_column(Float, nullable=True)
+    open_packages: Mapped[int | None] = mapped_column(Integer, nullable=True)
     strategy_name: Mapped[str | None] = mapped_column(String(64))
     risk_level: Mapped[int | None] = mapped_column(Integer)
     market: Mapped[str | None] = mapped_column(String(16))
@@ -54,6 +67,8 @@ class PortfolioHistory(Base):
 
 class Alert(Base):
     __tablename__ = "alerts"
+    # ix_alerts_pair (jak każdy indeks wtórny) kończy się kluczem głównym, więc obsługuje też pair + id
+    __table_args__ = (Index("ix_alerts_type_id", "type", "id"),)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     pair: Mapped[str] = mapped_column(String(16), index=True)
@@ -81,3 +96,97 @@ class EquityPrice(Base):
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     symbol: Mapped[str] = mapped_column(String(16), index=True)
     price: Mapped[float] = mapped_column(Float)
+
+class LookbackCandle(Base):
+    __tablename__ = "lookback_candles"
+    pair: Mapped[str] = mapped_column(String(16), primary_key=True)
+    open_time: Mapped[int] = mapped_column(BigInteger, primary_key=True)  # ms, świeca 1h
+    low: Mapped[float] = mapped_column(Float)
+    high: Mapped[float] = mapped_column(Float)
+
+class MarketRollup(Base):
+    # świece OHLCV zagregowane ze starych wierszy market_data (1h) i starych świec 1h (1d)
+    __tablename__ = "market_rollups"
+    __table_args__ = (UniqueConstraint("resolution", "pair", "ts", name="uq_market_rollups_res_pair_ts"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    resolution: Mapped[str] = mapped_column(String(4))  # 1h / 1d
+    pair: Mapped[str] = mapped_column(String(16))
+    ts: Mapped[datetime] = mapped_column(DateTime)  # początek świecy
+    open: Mapped[float] = mapped_column(Float)
+    high: Mapped[float] = mapped_column(Float)
+    low: Mapped[float] = mapped_column(Float)
+    close: Mapped[float] = mapped_column(Float)
+    volume: Mapped[float] = mapped_column(Float)
+    trades_per_hour: Mapped[int] = mapped_column(Integer, default=0)  # średnia
+    samples: Mapped[int] = mapped_column(Integer, default=1)
+
+class SweepResult(Base):
+    __tablename__ = "sweep_results"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    run_id: Mapped[str] = mapped_column(String(32), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    rank: Mapped[int] = mapped_column(Integer)
+    params: Mapped[str] = mapped_column(Text)  # JSON StrategyParams
+    score: Mapped[float] = mapped_column(Float)
+    realized_pnl_usd: Mapped[float] = mapped_column(Float)
+    unrealized_pnl_usd: Mapped[float] = mapped_column(Float)
+    max_drawdown_usd: Mapped[float] = mapped_column(Float)
+    buys: Mapped[int] = mapped_column(Integer)
+    sells: Mapped[int] = mapped_column(Integer)
+
+class BackfillCheckpoint(Base):
+    # postęp app.backfill per para/interwał/początek zakresu; zapisywany w tej samej transakcji co świece
+    __tablename__ = "backfill_checkpoints"
+    pair: Mapped[str] = mapped_column(String(16), primary_key=True)
+    interval: Mapped[str] = mapped_column(String(8), primary_key=True)
+    start_ms: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    end_ms: Mapped[int] = mapped_column(BigInteger)
+    next_ms: Mapped[int] = mapped_column(BigInteger)  # pierwsza świeca jeszcze niezapisana
+    rows: Mapped[int] = mapped_column(Integer, default=0)
+    indicators: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON stanu EMA do wznowienia
+    done: Mapped[bool] = mapped_column(Boolean, default=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class IndicatorState(Base):
+    __tablename__ = "indicator_state"
+    pair: Mapped[str] = mapped_column(String(16), primary_key=True)
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    state: Mapped[str] = mapped_column(Text)  # JSON
+    last_open_time: Mapped[int] = mapped_column(BigInteger)  # ms, ostatnia policzona świeca 5m
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class BotControl(Base):
+    # jeden wiersz (id=1): stan sterowany z API, czytany przez worker na początku każdej iteracji
+    __tablename__ = "bot_control"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    running: Mapped[bool] = mapped_column(Boolean, default=False)
+    autotrade: Mapped[bool] = mapped_column(Boolean, default=False)
+    pairs: Mapped[str] = mapped_column(Text)  # JSON lista par
+    strategy: Mapped[str] = mapped_column(Text, default="{}")  # JSON nadpisania parametrów strategii
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class WorkerHeartbeat(Base):
+    # heartbeat każdej instancji silnika osobno: martwy worker nie jest zasłaniany przez żywy
+    __tablename__ = "worker_heartbeats"
+    worker_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    seen_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    running: Mapped[bool] = mapped_column(Boolean, default=False)
+    stats: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON statystyk ostatniego ticku
+
+class WorkerLease(Base):
+    # żywe instancje silnika (SHARD_ENABLED): heartbeat co SHARD_RENEW_SEC, martwe po expires_at
+    __tablename__ = "worker_leases"
+    worker_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    pairs: Mapped[int] = mapped_column(Integer, default=0)  # liczba posiadanych par
+
+class Lease(Base):
+    # dzierżawy: "pair:<PARA>" (właściciel pary) i "leader" (zadania jednej instancji);
+    # token rośnie przy każdej zmianie właściciela
+    __tablename__ = "leases"
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    owner: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+    token: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -1,12 +1,29 @@
+import uuid
 from .binance_client import get_client
 from .database import get_session
 from .models import Package
 from .logger import log
 from datetime import datetime
+from sqlalchemy import select, update
+from .symbols import symbol_index
+from .portfolio import fx_cache
+from .positions import position_book
+
+def fill_price(order: dict) -> tuple[float, float | None]:
+    # (wykonana ilość, średnia cena) z odpowiedzi zlecenia MARKET
+    if order.get('fills'):
+        total = sum(float(f['price']) * float(f['qty']) for f in order['fills'])
+        q = sum(float(f['qty']) for f in order['fills'])
+        return q, (total/q if q>0 else None)
+    q = float(order.get('executedQty', 0) or 0)
+    if q > 0 and float(order.get('cummulativeQuoteQty', 0) or 0) > 0:
+        return q, float(order['cummulativeQuoteQty'])/q
+    return q, (float(order['price']) if float(order.get('price', 0) or 0) > 0 else None)
 
 def market_buy_package(pair: str, quote_amount_usd: float):
+    quote = symbol_index.market_quote(pair, quote_amount_usd)
     client = get_client()
-    order = client.new_order(symbol=pair, side='BUY', type='MARKET', quoteOrderQty=str(quote_amount_usd))
+    order = client.new_order(symbol=pair, side='BUY', type='MARKET', quoteOrderQty=format(quote, 'f'))
     qty = float(order.get('executedQty', 0))
     avg_price = None
     if 'cummulativeQuoteQty' in order and qty>0:
@@ -17,32 +34,106 @@ def market_buy_package(pair: str, quote_amount_usd: float):
         avg_price = total/qty if qty>0 else 0.0
 
     s = get_session()
-    pkg = Package(pair=pair, quantity=qty, entry_price=avg_price or 0.0, created_at=datetime.utcnow())
+    pkg = Package(pair=pair, quantity=qty, entry_price=avg_price or 0.0, peak_price=avg_price or 0.0, created_at=datetime.utcnow())
     s.add(pkg); s.commit()
     pid = pkg.id
     s.close()
+    position_book.opened(pair, pid, qty, avg_price or 0.0, pkg.created_at)
     log(pair, f"KUPNO pakietu: id={pid} qty={qty:.8f}, entry={avg_price:.6f}", "INFO", strategy="AUTOTRADE/HA")
-    return {"package_id": pid, "order": order}
+    return {"package_id": pid, "quantity": qty, "entry_price": avg_price or 0.0, "order": order}
 
-def market_sell_package(package_id: int, pair: str, qty: float):
-    client = get_client()
-    order = client.new_order(symbol=pair, side='SELL', type='MARKET', quantity=str(qty))
-    # Ustal cenę egzekucji
-    price = None
-    if order.get('fills'):
-        total = sum(float(f['price']) * float(f['qty']) for f in order['fills'])
-        q = sum(float(f['qty']) for f in order['fills'])
-        price = total/q if q>0 else None
-    elif 'price' in order:
-        price = float(order['price'])
+def market_sell_package(package_id: int, pair: str, price_hint: float | None = None):
+    # price_hint: bieżąca cena do lokalnej kontroli MIN_NOTIONAL (bez niej sprawdza tylko Binance)
+    return market_sell_packages(pair, [package_id], price_hint)
 
+def _claim(pair: str, package_ids: list[int] | None) -> tuple[str, list[Package]]:
+    # krótka transakcja przed zleceniem: pakiety dostają token sprzedaży, więc równoległa
+    # sprzedaż (API i worker) ich nie weźmie, a blokady wierszy nie czekają na odpowiedź giełdy
+    token = uuid.uuid4().hex
     s = get_session()
-    pkg = s.query(Package).filter(Package.id==package_id).first()
-    if pkg and not pkg.sold_at:
-        pkg.exit_price = price or pkg.entry_price
-        pkg.sold_at = datetime.utcnow()
-        pkg.realized_pnl_usd = (pkg.exit_price - pkg.entry_price) * pkg.quantity
+    try:
+        q = update(Package).where(Package.pair==pair, Package.sold_at.is_(None), Package.sell_claim.is_(None))
+        if package_ids is not None:
+            q = q.where(Package.id.in_(package_ids))
+        s.execute(q.values(sell_claim=token).execution_options(synchronize_session=False))
         s.commit()
-        log(pair, f"SPRZEDAŻ pakietu: id={pkg.id} qty={pkg.quantity:.8f}, exit={pkg.exit_price:.6f}, pnl={pkg.realized_pnl_usd:.2f} USD", "INFO", pnl_usd=pkg.realized_pnl_usd)
-    s.close()
-    return {"order": order}
+        return token, s.scalars(select(Package).where(Package.sell_claim==token).order_by(Package.id)).all()
+    finally:
+        s.close()
+
+def _release(token: str):
+    s = get_session()
+    try:
+        s.execute(update(Package).where(Package.sell_claim==token, Package.sold_at.is_(None))
+                  .values(sell_claim=None).execution_options(synchronize_session=False))
+        s.commit()
+    finally:
+        s.close()
+
+def market_sell_packages(pair: str, package_ids: list[int] | None = None, price_hint: float | None = None):
+    # Zamyka pakiety jednej pary jednym zleceniem MARKET: suma ilości zaokrąglona w dół
+    # do kroku LOT_SIZE, wykonanie rozdzielane proporcjonalnie do ilości pakietów.
+    # Kolejność: zajęcie pakietów (commit) -> zlecenie -> rozliczenie w jednej transakcji.
+    # Nieudane albo niewykonane zlecenie zwalnia pakiety; po wykonanym zostają zajęte aż do rozliczenia.
+    # Niesprzedana reszta: poniżej kroku LOT_SIZE (pył) zapisana w unsold_qty sprzedanych pakietów,
+    # większa (częściowe wykonanie) zostaje otwarta jako nowy pakiet.
+    token, pkgs = _claim(pair, package_ids)
+    if not pkgs:
+        return {"sold_count": 0, "package_ids": [], "order": None}
+    total = sum(p.quantity for p in pkgs)
+    try:
+        qty = symbol_index.market_quantity(pair, total, price_hint)
+        order = get_client().new_order(symbol=pair, side='SELL', type='MARKET', quantity=format(qty, 'f'))
+    except Exception:
+        _release(token)
+        raise
+    executed, price = fill_price(order)
+    if executed <= 0:
+        _release(token)
+        raise RuntimeError(f"{pair}: zlecenie {order.get('orderId')} bez wykonania (status {order.get('status')}), pakiety zwolnione")
+    ratio = min(executed / total, 1.0)
+    left = total - executed
+    dust = left < float(symbol_index.require(pair).step_size)
+    now = datetime.utcnow()
+    total_pnl = rest_cost = 0.0
+    rest = None
+    s = get_session()
+    try:
+        pkgs = s.scalars(select(Package).where(Package.sell_claim==token).order_by(Package.id)).all()
+        for pkg in pkgs:
+            sold_qty = pkg.quantity * ratio
+            if left > 0 and dust:
+                pkg.unsold_qty = pkg.quantity - sold_qty
+            elif left > 0:
+                rest_cost += (pkg.quantity - sold_qty) * pkg.entry_price
+                pkg.quantity = sold_qty  # reszta przechodzi do nowego pakietu
+            pkg.exit_price = price or pkg.entry_price
+            pkg.sold_at = now
+            pkg.sell_claim = None
+            pkg.realized_pnl_usd = (pkg.exit_price - pkg.entry_price) * sold_qty
+            pkg.realized_pnl_pln = fx_cache.convert(pkg.realized_pnl_usd, "PLN")
+            total_pnl += pkg.realized_pnl_usd
+        if left > 0 and not dust:
+            # ta sama cena wejścia (średnia ważona reszt), najstarsze created_at i najwyższy szczyt
+            rest = Package(pair=pair, quantity=left, entry_price=rest_cost / left, created_at=min(p.created_at for p in pkgs),
+                           peak_price=max((p.peak_price or p.entry_price) for p in pkgs))
+            s.add(rest)
+        s.commit()
+    except Exception as e:
+        s.rollback()
+        log(pair, f"Zlecenie {order.get('orderId')} wykonane, ale rozliczenie pakietów {[p.id for p in pkgs]} nie powiodło się: {e}", "ERROR")
+        raise
+    finally:
+        s.close()
+    position_book.closed(pair, [p.id for p in pkgs])
+    if rest is not None:
+        position_book.opened(pair, rest.id, rest.quantity, rest.entry_price, rest.created_at)
+    for pkg in pkgs:
+        log(pair, f"SPRZEDAŻ pakietu: id={pkg.id} qty={pkg.quantity - (pkg.unsold_qty or 0):.8f}, exit={pkg.exit_price:.6f}, pnl={pkg.realized_pnl_usd:.2f} USD", "INFO", pnl_usd=pkg.realized_pnl_usd)
+    if rest is not None:
+        log(pair, f"Częściowe wykonanie: qty={executed:.8f} z {total:.8f}, reszta otwarta jako pakiet id={rest.id}", "WARN")
+    elif left > 0:
+        log(pair, f"Niesprzedana reszta {left:.8f} z {total:.8f} (poniżej kroku LOT_SIZE), zapisana w unsold_qty pakietów {[p.id for p in pkgs]}", "WARN")
+    return {"sold_count": len(pkgs), "package_ids": [p.id for p in pkgs], "quantity": executed, "unsold_qty": max(left, 0.0),
+            "remainder_package_id": rest.id if rest is not None else None,
+            "exit_price": price, "realized_pnl_usd": total_pnl, "order": order}
@@ -1,12 +1,18 @@
-from .database import get_session
-from .models import MarketData
-from sqlalchemy import select, func
+from .database import get_session, engine
+from .models import MarketData, Package
+from sqlalchemy import select, func, update, bindparam, or_
 
-def latest_price(pair: str) -> float | None:
+def latest_prices(pairs) -> dict[str, float]:
+    # ostatnia cena wielu par jednym zapytaniem
+    if not pairs:
+        return {}
+    last = select(MarketData.pair, func.max(MarketData.ts).label("ts")).where(MarketData.pair.in_(pairs)).group_by(MarketData.pair).subquery()
     s = get_session()
-    q = s.execute(select(MarketData.price).where(MarketData.pair==pair).order_by(MarketData.ts.desc()).limit(1)).scalar()
-    s.close()
-    return float(q) if q is not None else None
+    try:
+        return {pair: float(px) for pair, px in s.execute(
+            select(MarketData.pair, MarketData.price).join(last, (MarketData.pair == last.c.pair) & (MarketData.ts == last.c.ts)))}
+    finally:
+        s.close()
 
 def last_points(pair: str, limit: int = 100):
     s = get_session()
@@ -15,14 +21,14 @@ def last_points(pair: str, limit: int = 100):
     rows = list(reversed(rows))
     return [{"ts": r[0].isoformat(), "price": float(r[1])} for r in rows]
 
-def peak_since(pair: str, since_ts):
-    s = get_session()
-    m = s.execute(select(func.max(MarketData.price)).where(MarketData.pair==pair, MarketData.ts >= since_ts)).scalar()
-    s.close()
-    return float(m) if m is not None else None
-
-def last_tph(pair: str) -> int:
-    s = get_session()
-    v = s.execute(select(MarketData.trades_per_hour).where(MarketData.pair==pair).order_by(MarketData.ts.desc()).limit(1)).scalar()
-    s.close()
-    return int(v or 0)
+def update_peaks(prices: dict[str, float]):
+    # przyrostowy high-water mark otwartych pakietów: jedno UPDATE (executemany) na partię cen
+    if not prices:
+        return
+    t = Package.__table__
+    stmt = (update(t)
+            .where(t.c.pair == bindparam("b_pair"), t.c.sold_at.is_(None),
+                   or_(t.c.peak_price.is_(None), t.c.peak_price < bindparam("b_price")))
+            .values(peak_price=bindparam("b_price")))
+    with engine.begin() as conn:
+        conn.execute(stmt, [{"b_pair": p, "b_price": px} for p, px in prices.items()])
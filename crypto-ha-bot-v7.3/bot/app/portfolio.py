@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import select, func, update, bindparam, insert, or_
+from .config import settings
+from .database import get_session, engine
+from .models import Package, FxRate, PortfolioHistory
+from .positions import position_book, SoldCursor
+from .pnl import latest_prices
+from .history import lttb
+from .cache import response_cache
+
+# Wycena portfela po każdym zbieraniu danych: jeden wiersz portfolio_history na tick.
+# Otwarte pakiety (ilość, koszt per para) bierze z księgi pozycji (positions.py), zrealizowany
+# PnL trzyma jako sumę bieżącą; tick doczytuje tylko świeżo sprzedane wg sold_at, więc koszt
+# nie rośnie z liczbą pakietów w tabeli.
+
+class FxCache:
+    # najnowsze kursy USD->X z fx_rates; fetch_fx podaje nowe kursy od razu, inne procesy doczytują co FX_CACHE_SEC.
+    # Bez wiersza w fx_rates kursu nie ma (None): do bazy trafia NULL, uzupełniany później (_backfill_pln)
+    def __init__(self, ttl_sec: float):
+        self.ttl = ttl_sec
+        self.rates: dict[str, float] = {}
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+
+    def _load(self):
+        latest = select(func.max(FxRate.id)).where(FxRate.base == "USD").group_by(FxRate.quote)
+        s = get_session()
+        try:
+            rows = s.execute(select(FxRate.quote, FxRate.rate).where(FxRate.id.in_(latest))).all()
+        finally:
+            s.close()
+        with self.lock:
+            self.rates = {q.upper(): float(r) for q, r in rows}
+            self.loaded_at = time.monotonic()
+
+    def set(self, rates: dict[str, float]):
+        with self.lock:
+            self.rates.update({q.upper(): float(r) for q, r in rates.items()})
+            self.loaded_at = time.monotonic()
+
+    def rate(self, quote: str) -> float | None:
+        quote = quote.upper()
+        if quote == "USD":
+            return 1.0
+        if time.monotonic() - self.loaded_at >= self.ttl:
+            try:
+                self._load()
+            except Exception:
+                self.loaded_at = time.monotonic()  # baza niedostępna: spróbuj po TTL, do tego czasu stare kursy
+        return self.rates.get(quote)
+
+    def convert(self, usd: float | None, quote: str) -> float | None:
+        r = self.rate(quote)
+        return usd * r if usd is not None and r is not None else None
+
+class PortfolioTracker:
+    def __init__(self):
+        self.realized_usd = 0.0
+        self.realized_pln = 0.0
+        self.pln_missing = 0  # sprzedane pakiety bez realized_pnl_pln (realized w PLN niepełne -> NULL)
+        self.backfill_due = False  # zapisano NULL w PLN: uzupełnić, gdy pojawi się kurs
+        self.sold = SoldCursor()
+        self.prices: dict[str, tuple[float, float]] = {}  # para -> (cena, monotonic)
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def observe_prices(self, prices: dict[str, float]):
+        # ceny z kolektora/streamu tego procesu; brakujące wycena dociąga z market_data
+        now = time.monotonic()
+        with self.lock:
+            for pair, px in prices.items():
+                self.prices[pair] = (float(px), now)
+
+    def _backfill_pln(self, s):
+        # kwoty PLN zapisane jako NULL (brak kursu w chwili zapisu): kurs z fx_rates z chwili sprzedaży/wyceny,
+        # a dla wcześniejszych - pierwszy późniejszy; bez żadnego wiersza fx_rates zostaje NULL
+        def rate_at(ts):
+            q = select(FxRate.rate).where(FxRate.base == "USD", FxRate.quote == "PLN")
+            return func.coalesce(q.where(FxRate.ts <= ts).order_by(FxRate.ts.desc()).limit(1).scalar_subquery(),
+                                 q.where(FxRate.ts > ts).order_by(FxRate.ts).limit(1).scalar_subquery())
+        s.execute(update(Package).where(Package.sold_at.is_not(None), Package.realized_pnl_usd.is_not(None),
+                                        Package.realized_pnl_pln.is_(None))
+                  .values(realized_pnl_pln=Package.realized_pnl_usd * rate_at(Package.sold_at)))
+        h = PortfolioHistory
+        r = rate_at(h.ts)
+        s.execute(update(h).where(or_(h.total_value_pln.is_(None), h.unrealized_pnl_pln.is_(None), h.realized_pnl_pln.is_(None)))
+                  .values(total_value_pln=func.coalesce(h.total_value_pln, h.total_value_usd * r),
+                          unrealized_pnl_pln=func.coalesce(h.unrealized_pnl_pln, h.unrealized_pnl_usd * r),
+                          realized_pnl_pln=func.coalesce(h.realized_pnl_pln, h.realized_pnl_usd * r)))
+
+    def _load_realized(self, s):
+        usd, pln, missing = s.execute(select(func.sum(Package.realized_pnl_usd), func.sum(Package.realized_pnl_pln),
+                                             func.count(Package.id).filter(Package.realized_pnl_pln.is_(None)))
+                                      .where(Package.sold_at.is_not(None), Package.realized_pnl_usd.is_not(None))).one()
+        self.realized_usd, self.realized_pln, self.pln_missing = float(usd or 0), float(pln or 0), int(missing or 0)
+
+    def _load(self, s):
+        # jednorazowo przy starcie: agregaty zamiast wczytywania wszystkich pakietów
+        self._backfill_pln(s)
+        s.commit()
+        self._load_realized(s)
+        self.backfill_due = fx_cache.rate("PLN") is None
+        self.sold.start(s)
+        self.loaded = True
+
+    def _sold(self, s, rows):
+        pln_missing = []
+        for r in rows:
+            self.realized_usd += r.realized_pnl_usd or 0.0
+            pln = r.realized_pnl_pln
+            if pln is None and r.realized_pnl_usd is not None:
+                pln = fx_cache.convert(r.realized_pnl_usd, "PLN")
+                if pln is None:
+                    self.pln_missing += 1
+                    self.backfill_due = True
+                else:
+                    pln_missing.append({"b_id": r.id, "b_pln": pln})
+            self.realized_pln += pln or 0.0
+        if pln_missing:
+            t = Package.__table__
+            s.execute(update(t).where(t.c.id == bindparam("b_id"), t.c.realized_pnl_pln.is_(None))
+                      .values(realized_pnl_pln=bindparam("b_pln")), pln_missing)
+
+    def _apply_deltas(self, s):
+        self._sold(s, self.sold.fetch(s, Package.realized_pnl_usd, Package.realized_pnl_pln))
+
+    def _prices(self, s, pairs: list[str]) -> dict[str, float]:
+        fresh = time.monotonic() - 2 * settings.BOT_INTERVAL_SEC
+        out = {p: px for p, (px, at) in self.prices.items() if at >= fresh}
+        missing = [p for p in pairs if p not in out]
+        if missing:
+            # pary bez świeżej ceny w tym procesie (np. innego workera przy shardingu): jedno zapytanie
+            out.update(latest_prices(missing))
+        return out
+
+    def snapshot(self, strategy_name: str | None = None) -> dict:
+        s = get_session()
+        try:
+            with self.lock:
+                if not self.loaded:
+                    self._load(s)
+                else:
+                    self._apply_deltas(s)
+                if self.backfill_due and fx_cache.rate("PLN") is not None:
+                    self._backfill_pln(s)
+                    self._load_realized(s)
+                    self.backfill_due = False
+                position_book.sync()  # pakiety kupione/sprzedane przez inne procesy
+                totals = position_book.totals()
+                prices = self._prices(s, sorted(totals))
+                value = cost = 0.0
+                count = 0
+                for pair, (qty, c, n) in totals.items():
+                    px = prices.get(pair)
+                    value += qty * px if px is not None else c  # brak ceny: wycena po koszcie
+                    cost += c
+                    count += n
+                row = self._row(value, cost, count, strategy_name)
+            s.execute(insert(PortfolioHistory).values(**row))
+            s.commit()
+            response_cache.invalidate("portfolio")
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+        return row
+
+    def _row(self, value: float, cost: float, count: int, strategy_name: str | None) -> dict:
+        unrealized = value - cost
+        pln, eur = fx_cache.rate("PLN"), fx_cache.rate("EUR")
+        conv = lambda v, r: v * r if r is not None else None
+        if pln is None or self.pln_missing:
+            self.backfill_due = True
+        return dict(ts=datetime.utcnow(), total_value_usd=value, unrealized_pnl_usd=unrealized, realized_pnl_usd=self.realized_usd,
+                    total_value_pln=conv(value, pln), unrealized_pnl_pln=conv(unrealized, pln),
+                    realized_pnl_pln=None if self.pln_missing else self.realized_pln, total_value_eur=conv(value, eur), unrealized_pnl_eur=conv(unrealized, eur),
+                    realized_pnl_eur=conv(self.realized_usd, eur), open_packages=count,
+                    strategy_name=strategy_name, market="crypto", volume_filter=settings.STRAT_MIN_TRADES_PER_HOUR)
+
+    def reset(self):
+        with self.lock:
+            self.loaded = False
+
+HISTORY_FIELDS = ("total_value_usd", "total_value_pln", "total_value_eur", "realized_pnl_usd", "unrealized_pnl_usd",
+                  "realized_pnl_pln", "unrealized_pnl_pln", "realized_pnl_eur", "unrealized_pnl_eur", "open_packages")
+
+def history(start: datetime, end: datetime, max_points: int) -> list[dict]:
+    # wiersze z zakresu (indeks po ts), przerzedzone LTTB po wartości portfela w USD
+    cols = [getattr(PortfolioHistory, f) for f in HISTORY_FIELDS]
+    with engine.connect() as conn:
+        rows = conn.execute(select(PortfolioHistory.ts, *cols)
+                            .where(PortfolioHistory.ts >= start, PortfolioHistory.ts < end)
+                            .order_by(PortfolioHistory.ts)).all()
+    xy = [((r[0] - datetime(1970, 1, 1)).total_seconds(), float(r[1] or 0)) for r in rows]
+    return [{"ts": rows[i][0].isoformat(), **dict(zip(HISTORY_FIELDS, rows[i][1:]))} for i in lttb(xy, max_points)]
+
+fx_cache = FxCache(settings.FX_CACHE_SEC)
+portfolio_tracker = PortfolioTracker()
@@ -0,0 +1,267 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, or_
+from .database import get_session
+from .models import Package
+
+# Księga pozycji: otwarte pakiety per para w pamięci z bieżącymi sumami (ilość, koszt),
+# więc pozycja i PnL pary to O(1) bez zapytania. Zlecenia tego procesu aktualizują ją od razu
+# (orders.py); zmiany z innych procesów (API <-> worker) sync() doczytuje przyrostowo:
+# nowe pakiety po created_at, sprzedane po sold_at (oba z zakładką, PackageCursor).
+
+COMMIT_OVERLAP = timedelta(seconds=60)
+
+class PackageCursor:
+    # Przyrostowy odczyt pakietów po znaczniku czasu `column`, wspólny dla księgi, portfela, SSE
+    # i eksportu. Znacznik ma sekundową dokładność i jest ustawiany przed commitem, więc każdy
+    # odczyt sięga COMMIT_OVERLAP wstecz od najnowszego widzianego, a powtórki odsiewa zbiór id
+    # (id -> znacznik) przycinany do tego okna: każdy pakiet wraca dokładnie raz.
+    column = None
+
+    def __init__(self, last: datetime | None = None, seen: dict[int, datetime] | None = None):
+        self.last = last
+        self.seen: dict[int, datetime] = dict(seen or {})
+
+    def start(self, s):
+        # od "teraz": pakiety już zapisane w bazie uznane za przeczytane
+        self.last = s.execute(select(func.max(self.column))).scalar()
+        self.seen = {}
+        if self.last is not None:
+            self.seen = dict(s.execute(select(Package.id, self.column)
+                                       .where(self.column >= self.last - COMMIT_OVERLAP)).all())
+
+    def _window(self):
+        return self.column >= self.last - COMMIT_OVERLAP if self.last is not None else self.column.is_not(None)
+
+    def fetch(self, s, *cols, limit: int | None = None) -> list:
+        # nowe wiersze (id, znacznik, *cols) w kolejności (znacznik, id); s = sesja albo połączenie
+        q = select(Package.id, self.column, *cols).where(self._window())
+        if self.seen:
+            q = q.where(Package.id.not_in(list(self.seen)))
+        q = q.order_by(self.column, Package.id)
+        rows = s.execute(q.limit(limit) if limit else q).all()
+        self.mark(rows)
+        return rows
+
+    def mark(self, rows):
+        # wiersze odczytane inną drogą (np. pakiet kupiony i sprzedany między odczytami)
+        key = self.column.key
+        for r in rows:
+            t = getattr(r, key)
+            if t is None:
+                continue
+            self.seen[r.id] = t
+            if self.last is None or t > self.last:
+                self.last = t
+        if self.last is not None:
+            cutoff = self.last - COMMIT_OVERLAP
+            self.seen = {i: t for i, t in self.seen.items() if t >= cutoff}
+
+    def state(self) -> dict:
+        return {"last": self.last.isoformat() if self.last else None,
+                "recent": {str(i): t.isoformat() for i, t in self.seen.items()}}
+
+    @classmethod
+    def from_state(cls, st: dict) -> "PackageCursor":
+        return cls(datetime.fromisoformat(st["last"]) if st.get("last") else None,
+                   {int(i): datetime.fromisoformat(t) for i, t in st.get("recent", {}).items()})
+
+class SoldCursor(PackageCursor):
+    column = Package.__table__.c.sold_at
+
+class NewCursor(PackageCursor):
+    # Nowe pakiety. Id jest nadawane przy INSERT, więc mniejsze id może zostać zatwierdzone po
+    # większym: okno po created_at łapie takie spóźnione commity, a id > last_id pakiety
+    # z wcześniejszym created_at (reszta po częściowej sprzedaży dziedziczy je po sprzedanych).
+    column = Package.__table__.c.created_at
+
+    def __init__(self, last: datetime | None = None, seen: dict[int, datetime] | None = None, last_id: int = 0):
+        super().__init__(last, seen)
+        self.last_id = last_id
+
+    def start(self, s):
+        super().start(s)
+        self.last_id = s.execute(select(func.max(Package.id))).scalar() or 0
+
+    def _window(self):
+        return or_(super()._window(), Package.id > self.last_id)
+
+    def mark(self, rows):
+        super().mark(rows)
+        self.last_id = max([self.last_id, *(r.id for r in rows)])
+
+@dataclass(slots=True)
+class OpenPackage:
+    id: int
+    quantity: float
+    entry_price: float
+    created_at: datetime
+    peak: float | None = None
+
+@dataclass(slots=True)
+class Position:
+    pair: str
+    packages: dict[int, OpenPackage] = field(default_factory=dict)
+    qty: float = 0.0
+    cost: float = 0.0  # suma quantity * entry_price
+
+    @property
+    def entry_avg(self) -> float:
+        return self.cost / self.qty if self.qty > 0 else 0.0
+
+    def add(self, p: OpenPackage):
+        if p.id in self.packages:
+            return
+        self.packages[p.id] = p
+        self.qty += p.quantity
+        self.cost += p.quantity * p.entry_price
+
+    def remove(self, package_id: int) -> OpenPackage | None:
+        p = self.packages.pop(package_id, None)
+        if p is not None:
+            self.qty -= p.quantity
+            self.cost -= p.quantity * p.entry_price
+            if not self.packages:
+                self.qty = self.cost = 0.0  # bez narastania błędu float
+        return p
+
+    def as_dict(self, price: float | None = None, packages: bool = False) -> dict:
+        d = {"pair": self.pair, "packages_count": len(self.packages), "quantity": self.qty, "cost_usd": self.cost,
+             "entry_avg": self.entry_avg, "price": price}
+        if price is not None and self.qty > 0:
+            d["value_usd"] = self.qty * price
+            d["unrealized_pnl_usd"] = self.qty * price - self.cost
+            d["unrealized_pnl_pct"] = (price - self.entry_avg) / self.entry_avg * 100.0 if self.entry_avg > 0 else 0.0
+        if packages:
+            d["packages"] = [{"id": p.id, "quantity": p.quantity, "entry_price": p.entry_price, "peak_price": p.peak,
+                              "created_at": p.created_at.isoformat() if p.created_at else None}
+                             for p in sorted(self.packages.values(), key=lambda p: p.id)]
+        return d
+
+class PositionBook:
+    def __init__(self):
+        self.positions: dict[str, Position] = {}
+        self.new = NewCursor()
+        self.sold = SoldCursor()
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    def reset(self):
+        with self.lock:
+            self.positions, self.new, self.sold, self.loaded = {}, NewCursor(), SoldCursor(), False
+
+    def position(self, pair: str) -> Position:
+        with self.lock:
+            pos = self.positions.get(pair)
+            if pos is None:
+                pos = self.positions[pair] = Position(pair)
+            return pos
+
+    def get(self, pair: str) -> Position | None:
+        return self.positions.get(pair)
+
+    def pairs(self) -> list[str]:
+        # pary z otwartymi pakietami
+        with self.lock:
+            return sorted(pair for pair, pos in self.positions.items() if pos.packages)
+
+    def totals(self) -> dict[str, tuple[float, float, int]]:
+        # para -> (ilość, koszt, liczba pakietów) dla par z otwartymi pakietami; spójny odczyt pod lockiem
+        with self.lock:
+            return {pair: (pos.qty, pos.cost, len(pos.packages)) for pair, pos in self.positions.items() if pos.packages}
+
+    def open_packages(self, pair: str) -> list[OpenPackage]:
+        pos = self.positions.get(pair)
+        return sorted(pos.packages.values(), key=lambda p: p.id) if pos else []
+
+    # --- zmiany z orders.py (ten proces) ---
+
+    def opened(self, pair: str, package_id: int, quantity: float, entry_price: float, created_at: datetime):
+        with self.lock:
+            self.position(pair).add(OpenPackage(id=package_id, quantity=quantity, entry_price=entry_price,
+                                                created_at=created_at, peak=entry_price))
+
+    def closed(self, pair: str, package_ids):
+        with self.lock:
+            pos = self.positions.get(pair)
+            if pos is not None:
+                for pid in package_ids:
+                    pos.remove(pid)
+
+    def observe_prices(self, prices: dict[str, float]):
+        # high-water mark w pamięci, równolegle do update_peaks() w bazie
+        with self.lock:
+            for pair, px in prices.items():
+                pos = self.positions.get(pair)
+                if pos is None:
+                    continue
+                for p in pos.packages.values():
+                    if p.peak is None or p.peak < px:
+                        p.peak = px
+
+    # --- synchronizacja z bazą ---
+
+    def _load(self, s, pairs=None):
+        q = (select(Package.id, Package.pair, Package.quantity, Package.entry_price, Package.created_at, Package.peak_price)
+             .where(Package.sold_at.is_(None)).order_by(Package.id))
+        if pairs is not None:
+            q = q.where(Package.pair.in_(pairs))
+        fresh = {}
+        for r in s.execute(q):
+            pos = fresh.get(r.pair)
+            if pos is None:
+                pos = fresh[r.pair] = Position(r.pair)
+            pos.add(OpenPackage(id=r.id, quantity=r.quantity, entry_price=r.entry_price, created_at=r.created_at, peak=r.peak_price))
+        return fresh
+
+    def load(self):
+        # przy starcie: wszystkie otwarte pakiety jednym zapytaniem
+        s = get_session()
+        try:
+            with self.lock:
+                self.new.start(s)
+                self.sold.start(s)
+                self.positions = self._load(s)
+                self.loaded = True
+        finally:
+            s.close()
+
+    def reload(self, pairs: list[str]):
+        # pary przejęte od innego workera (sharding): świeże peak_price z bazy
+        if not pairs:
+            return
+        s = get_session()
+        try:
+            with self.lock:
+                fresh = self._load(s, pairs)
+                for pair in pairs:
+                    self.positions[pair] = fresh.get(pair) or Position(pair)
+        finally:
+            s.close()
+
+    def sync(self):
+        if not self.loaded:
+            return self.load()
+        s = get_session()
+        try:
+            with self.lock:
+                new = self.new.fetch(s, Package.pair, Package.quantity, Package.entry_price, Package.peak_price, Package.sold_at)
+                sold = self.sold.fetch(s, Package.pair)
+                for r in new:
+                    if r.sold_at is None:
+                        self.position(r.pair).add(OpenPackage(id=r.id, quantity=r.quantity, entry_price=r.entry_price,
+                                                              created_at=r.created_at, peak=r.peak_price))
+                for r in sold:
+                    pos = self.positions.get(r.pair)
+                    if pos is not None:
+                        pos.remove(r.id)
+        finally:
+            s.close()
+
+    def snapshot(self, price_of=None, packages: bool = False) -> list[dict]:
+        with self.lock:
+            return [pos.as_dict(price_of(pair) if price_of else None, packages)
+                    for pair, pos in sorted(self.positions.items()) if pos.packages]
+
+position_book = PositionBook()
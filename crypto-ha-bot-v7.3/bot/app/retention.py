@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, insert
+from .config import settings
+from .database import get_session
+from .models import MarketData, MarketRollup
+from .journal import prune_logs
+from .cache import response_cache
+
+RES_SECONDS = {"1h": 3600, "1d": 86400}
+
+def bucket(ts: datetime, secs: int) -> datetime:
+    # początek kubełka secs-sekundowego (od epoki), wspólny dla retencji i history.py
+    epoch = int((ts - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % secs)
+
+def aggregate(rows, secs: int) -> dict:
+    # rows: (pair, ts, open, high, low, close, volume, tph, samples) posortowane po (pair, ts)
+    out = {}
+    for pair, ts, o, h, l, c, v, tph, n in rows:
+        key = (pair, bucket(ts, secs))
+        a = out.get(key)
+        if a is None:
+            out[key] = dict(open=o, high=h, low=l, close=c, volume=v, tph_sum=tph * n, samples=n)
+        else:
+            a["high"] = max(a["high"], h); a["low"] = min(a["low"], l); a["close"] = c
+            a["volume"] += v; a["tph_sum"] += tph * n; a["samples"] += n
+    return out
+
+def _store(s, resolution: str, aggs: dict):
+    # scal z już istniejącymi świecami (np. kubełek rozbity między partie), resztę wstaw hurtem
+    if not aggs:
+        return
+    pairs = {k[0] for k in aggs}
+    tss = [k[1] for k in aggs]
+    existing = {(r.pair, r.ts): r for r in s.scalars(select(MarketRollup).where(
+        MarketRollup.resolution == resolution, MarketRollup.pair.in_(pairs),
+        MarketRollup.ts >= min(tss), MarketRollup.ts <= max(tss)))}
+    new_rows = []
+    for (pair, ts), a in aggs.items():
+        r = existing.get((pair, ts))
+        if r is None:
+            new_rows.append(dict(resolution=resolution, pair=pair, ts=ts, open=a["open"], high=a["high"], low=a["low"],
+                                 close=a["close"], volume=a["volume"], samples=a["samples"],
+                                 trades_per_hour=int(a["tph_sum"] / a["samples"]) if a["samples"] else 0))
+        else:
+            tph_sum = r.trades_per_hour * r.samples + a["tph_sum"]
+            r.high = max(r.high, a["high"]); r.low = min(r.low, a["low"]); r.close = a["close"]
+            r.volume += a["volume"]; r.samples += a["samples"]
+            r.trades_per_hour = int(tph_sum / r.samples) if r.samples else 0
+    if new_rows:
+        s.execute(insert(MarketRollup), new_rows)
+
+def _complete_buckets(rows, secs: int, batch: int):
+    # pełna partia może uciąć ostatni kubełek -> zostawiamy go na następną partię
+    if len(rows) < batch:
+        return rows
+    last = (rows[-1][0], bucket(rows[-1][1], secs))
+    keep = [r for r in rows if (r[0], bucket(r[1], secs)) != last]
+    return keep or rows
+
+def rollup_raw(cutoff: datetime, batch: int) -> int:
+    # market_data starsze niż cutoff -> świece 1h, surowe wiersze kasowane partiami
+    secs = RES_SECONDS["1h"]
+    cutoff = bucket(cutoff, secs)
+    done = 0
+    while True:
+        s = get_session()
+        try:
+            rows = s.execute(select(MarketData.id, MarketData.pair, MarketData.ts, MarketData.price, MarketData.volume, MarketData.trades_per_hour)
+                             .where(MarketData.ts < cutoff).order_by(MarketData.pair, MarketData.ts).limit(batch)).all()
+            if not rows:
+                return done
+            rows = _complete_buckets([(r.pair, r.ts, r.id, r.price, r.volume, r.trades_per_hour or 0) for r in rows], secs, batch)
+            _store(s, "1h", aggregate([(p, ts, px, px, px, px, v, tph, 1) for p, ts, _, px, v, tph in rows], secs))
+            s.execute(delete(MarketData).where(MarketData.id.in_([r[2] for r in rows])))
+            s.commit()
+            done += len(rows)
+        finally:
+            s.close()
+
+def rollup_hourly(cutoff: datetime, batch: int) -> int:
+    # świece 1h starsze niż cutoff -> świece 1d
+    secs = RES_SECONDS["1d"]
+    cutoff = bucket(cutoff, secs)
+    done = 0
+    while True:
+        s = get_session()
+        try:
+            rows = s.execute(select(MarketRollup).where(MarketRollup.resolution == "1h", MarketRollup.ts < cutoff)
+                             .order_by(MarketRollup.pair, MarketRollup.ts).limit(batch)).scalars().all()
+            if not rows:
+                return done
+            rows = _complete_buckets([(r.pair, r.ts, r) for r in rows], secs, batch)
+            _store(s, "1d", aggregate([(p, ts, r.open, r.high, r.low, r.close, r.volume, r.trades_per_hour, r.samples) for p, ts, r in rows], secs))
+            s.execute(delete(MarketRollup).where(MarketRollup.id.in_([r[2].id for r in rows])))
+            s.commit()
+            done += len(rows)
+        finally:
+            s.close()
+
+def run_retention() -> dict:
+    # market_data tylko z RETENTION_ENABLED; logi i alerty niezależnie, wg LOG_/ALERT_RETENTION_DAYS (domyślnie 0 = bez kasowania)
+    out = {}
+    if settings.RETENTION_ENABLED:
+        now = datetime.utcnow()
+        if settings.EXPORT_DIR:
+            # surowe 5m trafiają do plików, zanim zwinięcie je skasuje
+            from .export import Exporter
+            out["exported"] = Exporter(settings.EXPORT_DIR, batch=settings.EXPORT_BATCH, max_parts=settings.EXPORT_MAX_PARTS).run()
+        out["raw_rolled"] = rollup_raw(now - timedelta(days=settings.RETENTION_RAW_DAYS), settings.RETENTION_BATCH)
+        out["hourly_rolled"] = rollup_hourly(now - timedelta(days=settings.RETENTION_1H_DAYS), settings.RETENTION_BATCH)
+    out.update(prune_logs())
+    if out:
+        response_cache.invalidate("market", "logs", "alerts")  # skasowane wiersze nie zmieniają MAX(id)
+    return out
+
+if __name__ == "__main__":
+    print(run_retention())
@@ -0,0 +1,190 @@
+import bisect
+import hashlib
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, insert, case, or_
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .database import get_session
+from .models import Lease, WorkerLease
+from .metrics import Gauge
+
+# Podział par między kilka instancji silnika (SHARD_ENABLED=true) współdzielących MariaDB.
+# Każdy worker co SHARD_RENEW_SEC: odnawia swój wpis w worker_leases, liczy pierścień
+# haszujący (consistent hashing) z żywych workerów i przejmuje/odnawia dzierżawy par,
+# które pierścień mu przypisuje. Dzierżawę przejmuje się warunkowym UPDATE (wolna, wygasła
+# albo już nasza), więc w danej chwili para ma co najwyżej jednego właściciela; pary, które
+# po zmianie składu należą do kogoś innego, są zwalniane od razu. Martwy worker traci pary
+# po SHARD_LEASE_SEC. Dzierżawa "leader" (kto pierwszy) wskazuje instancję od zadań
+# pojedynczych: FX/akcje i retencja. Zegary węzłów muszą być zsynchronizowane (NTP).
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEADER = "leader"
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+class HashRing:
+    # po dołączeniu/odejściu workera przenosi się tylko ~1/N par
+    def __init__(self, nodes, vnodes: int):
+        self.ring = sorted((_hash(f"{n}#{i}"), n) for n in nodes for i in range(vnodes))
+        self.keys = [h for h, _ in self.ring]
+
+    def owner(self, key: str) -> str | None:
+        if not self.ring:
+            return None
+        i = bisect.bisect(self.keys, _hash(key)) % len(self.ring)
+        return self.ring[i][1]
+
+class ShardCoordinator:
+    def __init__(self, worker_id: str, lease_sec: float, renew_sec: float, vnodes: int):
+        self.worker_id = worker_id
+        self.lease_sec = lease_sec
+        self.renew_sec = renew_sec
+        self.vnodes = vnodes
+        self.owned: set[str] = set()
+        self.tokens: dict[str, int] = {}
+        self.leader = False
+        self.valid_until = 0.0  # monotonic: do kiedy dzierżawy z ostatniej synchronizacji są pewne
+        self.workers: list[str] = []
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.stopping = threading.Event()
+
+    # --- odczyt w silniku ---
+
+    def owns(self, pair: str) -> bool:
+        return pair in self.owned and time.monotonic() < self.valid_until
+
+    def mine(self, pairs: list[str]) -> list[str]:
+        return [p for p in pairs if self.owns(p)]
+
+    def is_leader(self) -> bool:
+        return self.leader and time.monotonic() < self.valid_until
+
+    # --- synchronizacja z bazą ---
+
+    def _acquire(self, s, names: list[str], now: datetime, until: datetime):
+        if not names:
+            return
+        have = set(s.scalars(select(Lease.name).where(Lease.name.in_(names))))
+        missing = [n for n in names if n not in have]
+        if missing:
+            try:
+                s.execute(insert(Lease), [dict(name=n, owner=None, expires_at=now, token=0) for n in missing])
+                s.commit()
+            except IntegrityError:
+                s.rollback()  # inny worker wstawił równolegle; przejmiemy w następnej rundzie
+        # token przed owner: MySQL liczy przypisania SET od lewej, kolejne widzą nowe wartości
+        s.execute(update(Lease)
+                  .where(Lease.name.in_(names),
+                         or_(Lease.owner == self.worker_id, Lease.owner.is_(None), Lease.expires_at < now))
+                  .ordered_values((Lease.token, Lease.token + case((Lease.owner == self.worker_id, 0), else_=1)),
+                                  (Lease.owner, self.worker_id), (Lease.expires_at, until)))
+
+    def sync(self, pairs: list[str]):
+        t0 = time.monotonic()
+        now = datetime.utcnow()
+        until = now + timedelta(seconds=self.lease_sec)
+        s = get_session()
+        try:
+            if not s.execute(update(WorkerLease).where(WorkerLease.worker_id == self.worker_id)
+                             .values(expires_at=until, pairs=len(self.owned))).rowcount:
+                s.execute(insert(WorkerLease).values(worker_id=self.worker_id, started_at=now, expires_at=until, pairs=0))
+            s.execute(delete(WorkerLease).where(WorkerLease.expires_at < now - timedelta(hours=1)))
+            s.commit()
+            workers = sorted(s.scalars(select(WorkerLease.worker_id).where(WorkerLease.expires_at >= now)))
+            ring = HashRing(workers, self.vnodes)
+            wanted = {f"pair:{p}" for p in pairs if ring.owner(p) == self.worker_id}
+            # oddaj pary, które pierścień przypisał komuś innemu (albo usunięte z listy)
+            s.execute(update(Lease)
+                      .where(Lease.owner == self.worker_id, Lease.name.like("pair:%"), Lease.name.not_in(wanted))
+                      .values(owner=None, expires_at=now))
+            self._acquire(s, sorted(wanted) + [LEADER], now, until)
+            s.commit()
+            rows = s.execute(select(Lease.name, Lease.token)
+                             .where(Lease.owner == self.worker_id, Lease.expires_at > now)).all()
+        except Exception:
+            s.rollback()
+            raise
+        finally:
+            s.close()
+        with self.lock:
+            self.tokens = {name: token for name, token in rows}
+            self.owned = {n[5:] for n in self.tokens if n.startswith("pair:")}
+            self.leader = LEADER in self.tokens
+            self.workers = workers
+            # liczone od chwili przed zapisem: lokalnie dzierżawa wygasa nie później niż w bazie
+            self.valid_until = t0 + self.lease_sec
+        return self.owned
+
+    def release(self):
+        # przy zatrzymaniu workera: pary od razu dostępne dla pozostałych
+        s = get_session()
+        try:
+            s.execute(update(Lease).where(Lease.owner == self.worker_id).values(owner=None, expires_at=datetime.utcnow()))
+            s.execute(delete(WorkerLease).where(WorkerLease.worker_id == self.worker_id))
+            s.commit()
+        finally:
+            s.close()
+        with self.lock:
+            self.owned, self.tokens, self.leader, self.valid_until = set(), {}, False, 0.0
+
+    def start(self, pairs_fn):
+        # własny wątek: odnawianie nie czeka na długi tick w pętli silnika
+        if self.thread is not None and self.thread.is_alive():
+            return
+        try:
+            self.sync(pairs_fn())  # pierwszy tick już z własnymi parami
+        except Exception:
+            pass
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, args=(pairs_fn,), name="shard-leases", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopping.set()
+        self.thread.join(self.renew_sec + 5)
+        self.thread = None
+        try:
+            self.release()
+        except Exception:
+            pass
+
+    def _run(self, pairs_fn):
+        from .logger import log
+        while not self.stopping.is_set():
+            try:
+                before = set(self.owned)
+                owned = self.sync(pairs_fn())
+                if owned != before:
+                    log("SYSTEM", f"Shard {self.worker_id}: {len(owned)} par (+{len(owned - before)}/-{len(before - owned)}), "
+                                  f"workerów {len(self.workers)}, leader={self.leader}", "INFO")
+            except Exception as e:
+                log("SYSTEM", f"Błąd synchronizacji dzierżaw: {e}", "ERROR")
+            self.stopping.wait(self.renew_sec)
+
+    def stats(self) -> dict:
+        return {"worker_id": self.worker_id, "pairs": sorted(self.owned), "leader": self.is_leader(),
+                "workers": self.workers, "valid_for_sec": round(max(0.0, self.valid_until - time.monotonic()), 1)}
+
+def list_workers() -> list[dict]:
+    # dla /health: żywe instancje i liczba ich par
+    now = datetime.utcnow()
+    s = get_session()
+    try:
+        rows = s.execute(select(WorkerLease).where(WorkerLease.expires_at >= now).order_by(WorkerLease.worker_id)).scalars().all()
+        leader = s.execute(select(Lease.owner).where(Lease.name == LEADER, Lease.expires_at > now)).scalar()
+    finally:
+        s.close()
+    return [{"id": w.worker_id, "pairs": w.pairs, "leader": w.worker_id == leader, "started_at": w.started_at.isoformat(),
+             "expires_at": w.expires_at.isoformat()} for w in rows]
+
+shard = ShardCoordinator(WORKER_ID, settings.SHARD_LEASE_SEC, settings.SHARD_RENEW_SEC, settings.SHARD_VNODES) if settings.SHARD_ENABLED else None
+shard_pairs = Gauge("bot_shard_pairs", "Pary posiadane przez ten worker (SHARD_ENABLED)", fn=lambda: len(shard.owned) if shard else 0)
+shard_leader = Gauge("bot_shard_leader", "1 = ten worker jest liderem", fn=lambda: int(shard.is_leader()) if shard else 0)
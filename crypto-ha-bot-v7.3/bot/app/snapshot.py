@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+from sqlalchemy import select, func
+from .database import get_session
+from .models import MarketData, PairConfig
+from .positions import Position, position_book
+
+@dataclass(slots=True)
+class PairSnapshot:
+    pair: str
+    allowed: bool = True
+    risk_level: int = 5
+    price: float | None = None
+    tph: int = 0
+    ema_fast: float | None = None
+    position: Position | None = None  # z księgi pozycji (ten sam obiekt, aktualizowany przez zlecenia)
+
+    @property
+    def total_qty(self) -> float:
+        return self.position.qty
+
+    @property
+    def entry_avg(self) -> float:
+        return self.position.entry_avg
+
+def load_snapshots(pairs: list[str]) -> dict[str, PairSnapshot]:
+    # Wszystkie dane wejściowe strategii dla wszystkich par w 4 zapytaniach, niezależnie od liczby
+    # par i otwartych pakietów: konfiguracja, ostatnie ceny i 2 przyrostowe dla księgi pozycji.
+    if not pairs:
+        return {}
+    position_book.sync()
+    snaps = {p: PairSnapshot(pair=p, position=position_book.position(p)) for p in pairs}
+    s = get_session()
+    try:
+        for c in s.execute(select(PairConfig.pair, PairConfig.allowed, PairConfig.risk_level).where(PairConfig.pair.in_(pairs))):
+            snaps[c.pair].allowed = c.allowed
+            snaps[c.pair].risk_level = c.risk_level
+
+        last = select(MarketData.pair, func.max(MarketData.ts).label("ts")).where(MarketData.pair.in_(pairs)).group_by(MarketData.pair).subquery()
+        md = s.execute(select(MarketData.pair, MarketData.price, MarketData.trades_per_hour, MarketData.ema_fast)
+                       .join(last, (MarketData.pair == last.c.pair) & (MarketData.ts == last.c.ts))
+                       .order_by(MarketData.id))
+        for r in md:
+            sn = snaps[r.pair]
+            sn.price = float(r.price) if r.price is not None else None
+            sn.tph = int(r.trades_per_hour or 0)
+            sn.ema_fast = r.ema_fast
+    finally:
+        s.close()
+    return snaps
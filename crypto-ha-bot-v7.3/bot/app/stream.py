@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+import websockets
+from sqlalchemy import select, func
+from .config import settings
+from .database import get_session
+from .models import MarketData
+from .indicators import Bar, indicator_engine
+
+@dataclass
+class Candle:
+    open_time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    trades: int
+    closed: bool
+
+@dataclass
+class PairState:
+    pair: str
+    last_price: float | None = None
+    candle: Candle | None = None
+    last_closed: int | None = None  # open_time ostatniej zamkniętej świecy (powtórka po reconnect pomijana)
+    trades_per_hour: int | None = None
+    low_24h: float | None = None
+    high_24h: float | None = None
+    ema_fast: float | None = None
+    ema_slow: float | None = None
+    updated_at: float = 0.0
+
+class MarketState:
+    # Bieżący stan rynku per para, zasilany ze streamu (kline 5m + miniTicker).
+    # Zamknięte świece czekają w `pending` do zapisu przez silnik (closed_rows): kolejna,
+    # otwarta świeca nadpisuje `candle` zanim tick zdąży ją odczytać.
+    def __init__(self):
+        self.pairs: dict[str, PairState] = {}
+        self.pending: dict[str, list[dict]] = {}
+        self.lock = threading.Lock()  # on_kline w pętli streamu, closed_rows w wątku silnika
+
+    def get(self, pair: str) -> PairState:
+        st = self.pairs.get(pair)
+        if st is None:
+            st = self.pairs[pair] = PairState(pair=pair)
+        return st
+
+    def fresh(self, pair: str) -> PairState | None:
+        st = self.pairs.get(pair)
+        if st is None or st.last_price is None:
+            return None
+        if time.monotonic() - st.updated_at > settings.STREAM_STALE_SEC:
+            return None
+        return st
+
+    def seed_from_db(self, pairs: list[str]):
+        # EMA kontynuujemy z zapisanego stanu wskaźników, tph z ostatniego wiersza market_data
+        if not pairs:
+            return
+        indicator_engine.ensure_loaded(pairs)
+        s = get_session()
+        last = select(MarketData.pair, func.max(MarketData.ts).label("ts")).where(MarketData.pair.in_(pairs)).group_by(MarketData.pair).subquery()
+        rows = s.execute(select(MarketData.pair, MarketData.trades_per_hour)
+                         .join(last, (MarketData.pair == last.c.pair) & (MarketData.ts == last.c.ts))).all()
+        s.close()
+        for pair, tph in rows:
+            st = self.get(pair)
+            if st.trades_per_hour is None: st.trades_per_hour = tph
+        for pair in pairs:
+            st = self.get(pair)
+            vals = indicator_engine.get(pair).values()
+            st.ema_fast, st.ema_slow = vals["ema_fast"], vals["ema_slow"]
+
+    def on_kline(self, pair: str, k: dict) -> bool:
+        st = self.get(pair)
+        c = Candle(open_time=int(k["t"]), open=float(k["o"]), high=float(k["h"]), low=float(k["l"]),
+                   close=float(k["c"]), volume=float(k["v"]), trades=int(k["n"]), closed=bool(k["x"]))
+        st.candle = c
+        st.last_price = c.close
+        st.updated_at = time.monotonic()
+        if not c.closed or (st.last_closed is not None and c.open_time <= st.last_closed):
+            return False
+        st.last_closed = c.open_time
+        st.trades_per_hour = c.trades * 12
+        vals = indicator_engine.update(pair, [Bar(c.open_time, c.open, c.high, c.low, c.close, c.volume)])
+        st.ema_fast, st.ema_slow = vals["ema_fast"], vals["ema_slow"]
+        row = dict(ts=datetime.utcfromtimestamp(c.open_time / 1000 + 300), pair=pair, price=c.close,
+                   volume=c.volume, trades_per_hour=st.trades_per_hour, ema_fast=st.ema_fast, ema_slow=st.ema_slow)
+        with self.lock:
+            self.pending.setdefault(pair, []).append(row)
+        return True
+
+    def on_mini_ticker(self, pair: str, d: dict):
+        st = self.get(pair)
+        st.last_price = float(d["c"])
+        st.low_24h = float(d["l"])
+        st.high_24h = float(d["h"])
+        st.updated_at = time.monotonic()
+
+    def closed_rows(self, pairs) -> list[dict]:
+        # zamknięte świece od poprzedniego odczytu (każda zwracana raz), najstarsze pierwsze
+        rows = []
+        with self.lock:
+            for pair in pairs:
+                rows.extend(self.pending.pop(pair, ()))
+        return rows
+
+def stream_url(pairs: list[str]) -> str:
+    base = settings.BINANCE_WS_URL
+    if not base:
+        base = "wss://stream.testnet.binance.vision" if settings.BINANCE_TESTNET else "wss://stream.binance.com:9443"
+    streams = "/".join(f"{p.lower()}@kline_5m/{p.lower()}@miniTicker" for p in pairs)
+    return f"{base.rstrip('/')}/stream?streams={streams}"
+
+class MarketStream:
+    # Subskrypcja combined streams Binance; zamknięte świece trafiają do kolejki `closed`
+    def __init__(self, state: MarketState):
+        self.state = state
+        self.closed: asyncio.Queue[str] = asyncio.Queue()
+        self.connected = False
+
+    def handle(self, raw: str | bytes):
+        msg = json.loads(raw)
+        data = msg.get("data", msg)
+        ev = data.get("e")
+        pair = data.get("s")
+        if not pair:
+            return
+        if ev == "kline":
+            if self.state.on_kline(pair, data["k"]):
+                self.closed.put_nowait(pair)
+        elif ev == "24hrMiniTicker":
+            self.state.on_mini_ticker(pair, data)
+
+    async def run(self, pairs_fn):
+        backoff = 1
+        while True:
+            pairs = list(pairs_fn())
+            if not pairs:
+                await asyncio.sleep(5)
+                continue
+            try:
+                await asyncio.to_thread(self.state.seed_from_db, pairs)
+                async with websockets.connect(stream_url(pairs), ping_interval=20, max_size=2**20) as ws:
+                    self.connected = True
+                    backoff = 1
+                    async for raw in ws:
+                        self.handle(raw)
+                        if list(pairs_fn()) != pairs:
+                            break  # zmiana listy par -> nowa subskrypcja
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
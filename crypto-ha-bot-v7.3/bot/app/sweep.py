@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+import numpy as np
+from sqlalchemy import insert
+from .backtest import Series, add_param_args, load_series, pair_risk_levels, params_from_settings, run_backtest, LOOKBACK_SEC
+from .database import Base, engine, get_session
+from .models import SweepResult
+
+# Siatka parametrów StrategyParams liczona w puli procesów. Serie cen zapisywane raz do .npy
+# (w /dev/shm, jeśli jest) i otwierane w workerach przez np.load(mmap_mode="r") - wszystkie
+# procesy czytają te same strony pamięci zamiast własnych kopii.
+
+FIELDS = ("ts", "price", "tph", "ema_fast")
+
+_series: dict[str, Series] = {}
+_caches: dict[str, dict] = {}
+_risk: dict[str, int] = {}
+_fee_pct = 0.0
+
+def parse_range(spec: str, cast=float) -> list:
+    # "2:8:0.5" -> 2, 2.5, ..., 8 ; "1,2,5" -> lista
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        n = int(round((stop - start) / step)) + 1
+        return [cast(round(start + i * step, 10)) for i in range(max(n, 0))]
+    return [cast(x) for x in spec.split(",") if x.strip()]
+
+def dump_series(series: dict[str, Series], root: str):
+    for pair, s in series.items():
+        for f in FIELDS:
+            np.save(os.path.join(root, f"{pair}.{f}.npy"), getattr(s, f))
+
+def _init_worker(root: str, pairs: list[str], risk: dict[str, int], fee_pct: float):
+    global _risk, _fee_pct
+    for pair in pairs:
+        _series[pair] = Series(pair, *(np.load(os.path.join(root, f"{pair}.{f}.npy"), mmap_mode="r") for f in FIELDS))
+    _risk, _fee_pct = risk, fee_pct
+
+def _evaluate(params) -> dict:
+    report = run_backtest(_series, params, _risk, _fee_pct, _caches)
+    report.pop("pairs")
+    return report
+
+def score(report: dict, rank_by: str) -> float:
+    pnl = report["realized_pnl_usd"] + report["unrealized_pnl_usd"]
+    if rank_by == "pnl_dd":
+        return pnl / max(report["max_drawdown_usd"], 1.0)
+    if rank_by == "realized":
+        return report["realized_pnl_usd"]
+    return pnl
+
+def sweep(series: dict[str, Series], grid: list, risk: dict[str, int], fee_pct: float, workers: int,
+          rank_by: str = "pnl") -> tuple[list[dict], int]:
+    # (ranking malejąco po score, użyte procesy); workers=1 liczy w tym procesie, bez puli i plików
+    workers = max(1, min(workers, len(grid)))
+    if workers == 1:
+        caches: dict[str, dict] = {}
+        reports = [run_backtest(series, p, risk, fee_pct, caches) for p in grid]
+        for r in reports:
+            r.pop("pairs")
+    else:
+        root = tempfile.mkdtemp(prefix="sweep-", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+        try:
+            dump_series(series, root)
+            chunk = max(1, len(grid) // (workers * 8))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(root, list(series), risk, fee_pct)) as ex:
+                reports = list(ex.map(_evaluate, grid, chunksize=chunk))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    for r in reports:
+        r["score"] = score(r, rank_by)
+    return sorted(reports, key=lambda r: r["score"], reverse=True), workers
+
+def persist(run_id: str, ranked: list[dict]):
+    Base.metadata.create_all(bind=engine, tables=[SweepResult.__table__])
+    s = get_session()
+    s.execute(insert(SweepResult), [dict(
+        run_id=run_id, rank=i + 1, params=json.dumps(r["params"]), score=r["score"],
+        realized_pnl_usd=r["realized_pnl_usd"], unrealized_pnl_usd=r["unrealized_pnl_usd"],
+        max_drawdown_usd=r["max_drawdown_usd"], buys=r["buys"], sells=r["sells"],
+    ) for i, r in enumerate(ranked)])
+    s.commit(); s.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep parametrów SimpleStrategy (grid search) na danych historycznych")
+    add_param_args(ap)
+    d = params_from_settings()
+    ap.add_argument("--min-profit-pct", default=str(d.min_profit_pct), help="start:stop:krok albo lista a,b,c")
+    ap.add_argument("--hysteresis-pct", default=str(d.hysteresis_pct))
+    ap.add_argument("--buy-drawdown-pct", default=str(d.buy_drawdown_pct))
+    ap.add_argument("--downtrend-multiplier", default=str(d.downtrend_multiplier))
+    ap.add_argument("--buy-lookback", default=d.buy_lookback, help="np. day,week,month")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--rank-by", choices=["pnl", "realized", "pnl_dd"], default="pnl")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--out", help="zapisz pełny ranking do pliku JSON")
+    ap.add_argument("--no-db", action="store_true", help="nie zapisuj wyników w sweep_results")
+    args = ap.parse_args()
+
+    lookbacks = [x for x in args.buy_lookback.split(",") if x in LOOKBACK_SEC]
+    # kolejność pętli: histereza i lookback najwolniej zmienne -> cache w workerach trafia częściej
+    grid = [replace(d, buy_lookback=lb, hysteresis_pct=h, min_profit_pct=mp, buy_drawdown_pct=dd, downtrend_multiplier=m)
+            for lb, h, mp, dd, m in itertools.product(
+                lookbacks, parse_range(args.hysteresis_pct), parse_range(args.min_profit_pct),
+                parse_range(args.buy_drawdown_pct), parse_range(args.downtrend_multiplier))]
+
+    t0 = time.perf_counter()
+    series = load_series(args)
+    risk = {} if args.csv else pair_risk_levels(series)
+    ranked, workers = sweep(series, grid, risk, args.fee_pct, args.workers, args.rank_by)
+    run_id = uuid.uuid4().hex
+    if not args.no_db:
+        persist(run_id, ranked)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"run_id": run_id, "rank_by": args.rank_by, "results": ranked}, f, indent=2)
+    print(json.dumps({
+        "run_id": run_id, "combinations": len(grid), "workers": workers,
+        "elapsed_sec": round(time.perf_counter() - t0, 3), "top": ranked[:args.top],
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN
+from .config import settings
+from .binance_client import get_client
+
+class OrderRejected(ValueError):
+    # zlecenie odrzucone lokalnie (filtry symbolu), zanim trafi do Binance
+    pass
+
+@dataclass(frozen=True)
+class SymbolFilters:
+    symbol: str
+    status: str
+    base_asset: str
+    quote_asset: str
+    tick_size: Decimal
+    step_size: Decimal
+    min_qty: Decimal
+    max_qty: Decimal
+    min_notional: Decimal
+    quote_precision: int
+
+    @property
+    def trading(self) -> bool:
+        return self.status == "TRADING"
+
+FLOAT_NOISE = Decimal("1e-9")  # w krokach
+
+def _dec(v, default="0") -> Decimal:
+    return Decimal(str(v if v not in (None, "") else default)).normalize()
+
+def floor_step(value, step: Decimal) -> Decimal:
+    v = Decimal(str(value))
+    if step > 0:
+        n = v / step
+        # szum float tuż pod pełnym krokiem (np. 1.001 - 0.001 = 0.9999999999999999) to nie reszta do odcięcia
+        near = n.to_integral_value()
+        v = (near if abs(n - near) < FLOAT_NOISE else n.to_integral_value(rounding=ROUND_DOWN)) * step
+    return v
+
+def parse_symbol(s: dict) -> SymbolFilters:
+    f = {x.get("filterType"): x for x in s.get("filters", [])}
+    lot = f.get("LOT_SIZE", {})
+    # zlecenia MARKET: MARKET_LOT_SIZE, o ile ma niezerowy krok
+    mlot = f.get("MARKET_LOT_SIZE", {})
+    step = _dec(lot.get("stepSize"))
+    if _dec(mlot.get("stepSize")) > 0:
+        step = max(step, _dec(mlot.get("stepSize")))
+    notional = f.get("NOTIONAL") or f.get("MIN_NOTIONAL") or {}
+    if notional.get("applyMinToMarket", notional.get("applyToMarket", True)) is False:
+        min_notional = Decimal("0")
+    else:
+        min_notional = _dec(notional.get("minNotional"))
+    return SymbolFilters(
+        symbol=s["symbol"], status=s.get("status", ""), base_asset=s.get("baseAsset", ""), quote_asset=s.get("quoteAsset", ""),
+        tick_size=_dec(f.get("PRICE_FILTER", {}).get("tickSize")), step_size=step,
+        min_qty=max(_dec(lot.get("minQty")), _dec(mlot.get("minQty"))),
+        max_qty=_dec(mlot.get("maxQty") if _dec(mlot.get("maxQty")) > 0 else lot.get("maxQty")),
+        min_notional=min_notional,
+        quote_precision=int(s.get("quoteAssetPrecision", s.get("quotePrecision", 8))),
+    )
+
+class SymbolIndex:
+    # Filtry wszystkich symboli z jednego exchangeInfo (waga 20), odświeżane co SYMBOLS_REFRESH_SEC.
+    # Błąd odświeżenia nie kasuje poprzedniego indeksu; kolejna próba najwcześniej po 60 s.
+    def __init__(self, refresh_sec: float):
+        self.refresh_sec = refresh_sec
+        self.symbols: dict[str, SymbolFilters] = {}
+        self.loaded_at = 0.0
+        self.next_try = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self, client=None):
+        info = (client or get_client()).exchange_info()
+        symbols = {s["symbol"]: parse_symbol(s) for s in info.get("symbols", [])}
+        with self.lock:
+            self.symbols = symbols
+            self.loaded_at = self.next_try = time.monotonic()
+        return symbols
+
+    def ensure(self):
+        now = time.monotonic()
+        if self.symbols and now - self.loaded_at < self.refresh_sec:
+            return
+        if now < self.next_try:
+            return
+        with self.lock:
+            self.next_try = now + 60
+        try:
+            self.refresh()
+        except Exception:
+            if not self.symbols:
+                raise
+
+    def get(self, pair: str) -> SymbolFilters | None:
+        self.ensure()
+        return self.symbols.get(pair)
+
+    def require(self, pair: str) -> SymbolFilters:
+        f = self.get(pair)
+        if f is None:
+            raise OrderRejected(f"{pair}: brak symbolu w exchangeInfo")
+        if not f.trading:
+            raise OrderRejected(f"{pair}: status {f.status}, handel wyłączony")
+        return f
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = self.next_try = 0.0
+
+    def market_quantity(self, pair: str, qty: float, price: float | None = None) -> Decimal:
+        # ilość zlecenia MARKET SELL zaokrąglona w dół do kroku; None price = bez kontroli MIN_NOTIONAL
+        f = self.require(pair)
+        q = floor_step(qty, f.step_size)
+        if q <= 0 or q < f.min_qty:
+            raise OrderRejected(f"{pair}: ilość {qty} poniżej minQty {f.min_qty} (krok {f.step_size})")
+        if f.max_qty > 0 and q > f.max_qty:
+            raise OrderRejected(f"{pair}: ilość {q} powyżej maxQty {f.max_qty}")
+        if price and f.min_notional > 0 and q * Decimal(str(price)) < f.min_notional:
+            raise OrderRejected(f"{pair}: wartość {q * Decimal(str(price)):.8f} poniżej minNotional {f.min_notional}")
+        return q
+
+    def market_quote(self, pair: str, quote_amount: float) -> Decimal:
+        # kwota quoteOrderQty zaokrąglona w dół do precyzji quote i sprawdzona z minNotional
+        f = self.require(pair)
+        q = floor_step(quote_amount, Decimal(1).scaleb(-f.quote_precision))
+        if q <= 0 or q < f.min_notional:
+            raise OrderRejected(f"{pair}: kwota {quote_amount} poniżej minNotional {f.min_notional}")
+        return q
+
+    def round_price(self, pair: str, price: float) -> Decimal:
+        return floor_step(price, self.require(pair).tick_size)
+
+symbol_index = SymbolIndex(settings.SYMBOLS_REFRESH_SEC)
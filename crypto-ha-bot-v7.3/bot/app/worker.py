@@ -0,0 +1,31 @@
+import asyncio
+from .database import engine as db_engine, Base
+from .migrations import run_migrations
+from .logger import log_sink
+from .engine import loop_task
+from .sharding import shard
+from .positions import position_book
+from .config import settings
+from . import metrics
+
+# Samodzielny proces silnika handlu (WORKER_MODE=external po stronie API):
+#   python -m app.worker
+
+def main():
+    Base.metadata.create_all(bind=db_engine)
+    run_migrations()
+    log_sink.start()
+    position_book.load()
+    if settings.METRICS_PORT:
+        metrics.serve(settings.METRICS_PORT)
+    try:
+        asyncio.run(loop_task())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if shard is not None:
+            shard.stop()  # oddaj pary pozostałym workerom od razu, bez czekania na wygaśnięcie
+        log_sink.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import pytest
+
+# Testy na lokalnej bazie SQLite i FakeSpot (jak app.bench), bez testnetu i MariaDB.
+# Środowisko ustawiane przed importem app.*: config czyta je przy imporcie.
+#   cd bot && python -m pytest -q
+
+_tmp = tempfile.mkdtemp(prefix="bot-tests-")
+from app.bench import _env
+_env(f"sqlite:///{os.path.join(_tmp, 'test.sqlite')}")
+
+PAIRS = ["BTCUSDC", "ETHUSDC"]
+
+@pytest.fixture
+def fake(monkeypatch):
+    # czysta baza i stan w pamięci przed każdym testem, FakeSpot jako klient procesu
+    from app.bench import reset_state
+    from app.binance_client import set_client
+    from app.config import settings
+    from app.fake_exchange import FakeSpot
+    from app import engine as trading_engine
+    from app.stream import MarketState
+    monkeypatch.setattr(settings, "DEFAULT_PAIRS", list(PAIRS))
+    reset_state(PAIRS)
+    monkeypatch.setattr(trading_engine, "market_state", MarketState())
+    monkeypatch.setattr(trading_engine, "market_stream", None)
+    client = FakeSpot(PAIRS)
+    set_client(client)
+    yield client
+    set_client(None)
@@ -0,0 +1,69 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import select, delete, func
+from app.backfill import Backfill, PAGE, _ms
+from app.database import get_session
+from app.binance_client import INTERVAL_MS
+from app.models import MarketData, BackfillCheckpoint
+
+STEP = INTERVAL_MS["5m"]
+
+def _rows(pair: str) -> list[tuple]:
+    s = get_session()
+    try:
+        return [tuple(r) for r in s.execute(select(MarketData.ts, MarketData.price, MarketData.ema_fast, MarketData.ema_slow)
+                                            .where(MarketData.pair == pair).order_by(MarketData.ts))]
+    finally:
+        s.close()
+
+class Crash(Backfill):
+    # przerwanie (restart procesu, błąd sieci) przy zapytaniu o kolejną stronę
+    def __init__(self, client, fail_at: int):
+        super().__init__(client)
+        self.fail_at = fail_at
+
+    def _klines(self, pair, **kw):
+        if self.requests + 1 == self.fail_at:
+            raise ConnectionError("przerwane")
+        return super()._klines(pair, **kw)
+
+def test_interrupted_backfill_resumes_from_checkpoint(fake):
+    end = _ms(datetime.utcnow()) // 86_400_000 * 86_400_000 - 86_400_000
+    n = 2 * PAGE + PAGE // 2
+    start = end - n * STEP
+
+    # rozgrzewka EMA + pierwsza strona zapisane, druga strona przerwana
+    with pytest.raises(ConnectionError):
+        Crash(fake, fail_at=3).pair("BTCUSDC", start, end)
+    s = get_session()
+    cp = s.get(BackfillCheckpoint, ("BTCUSDC", "5m", start))
+    assert (cp.rows, cp.next_ms, cp.done) == (PAGE, start + PAGE * STEP, False)
+    s.close()
+    assert len(_rows("BTCUSDC")) == PAGE
+
+    # wznowienie: tylko brakujące strony, bez ponownej rozgrzewki
+    bf = Backfill(fake)
+    assert bf.pair("BTCUSDC", start, end) == {"pair": "BTCUSDC", "rows": n, "requests": 2, "done": True}
+    assert bf.requests == 2
+    resumed = _rows("BTCUSDC")
+    assert len(resumed) == n and len({r[0] for r in resumed}) == n
+    assert Backfill(fake).pair("BTCUSDC", start, end)["requests"] == 0  # zakres zakończony
+
+    # ten sam zakres bez przerwy: identyczne świece i EMA (stan EMA wznowiony z checkpointu)
+    s = get_session()
+    s.execute(delete(MarketData)); s.execute(delete(BackfillCheckpoint))
+    s.commit(); s.close()
+    Backfill(fake).pair("BTCUSDC", start, end)
+    assert _rows("BTCUSDC") == resumed
+    assert all(r[2] is not None and r[3] is not None for r in resumed)
+
+def test_backfill_skips_existing_rows(fake):
+    end = _ms(datetime.utcnow()) // 86_400_000 * 86_400_000 - 86_400_000
+    start = end - 300 * STEP
+    Backfill(fake).pair("ETHUSDC", start + 100 * STEP, end)
+    # szerszy zakres na tej samej parze: nakładające się świece pomija INSERT IGNORE
+    Backfill(fake).pair("ETHUSDC", start, end)
+    s = get_session()
+    total, distinct = s.execute(select(func.count(), func.count(func.distinct(MarketData.ts))).where(MarketData.pair == "ETHUSDC")).one()
+    s.close()
+    assert total == distinct == 300
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from app.backtest import Series, simulate, simulate_reference, rolling_min, load_klines_csv
+from app.indicators import EMA, Bar
+from app.strategies import StrategyParams
+
+def _series(seed: int, n: int) -> Series:
+    rng = np.random.default_rng(seed)
+    price = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    ema = np.full(n, np.nan)
+    e = EMA(12)
+    for i, p in enumerate(price.tolist()):
+        v = e.update(Bar(i, p, p, p, p, 0.0))
+        ema[i] = np.nan if v is None else v
+    return Series("BTCUSDC", np.arange(n, dtype=np.int64) * 300, price, rng.integers(0, 400, n).astype(np.float64), ema)
+
+PARAMS = [StrategyParams(),
+          StrategyParams(min_profit_pct=1.0, hysteresis_pct=0.3, buy_drawdown_pct=1.0, min_trades_per_hour=50),
+          StrategyParams(min_profit_pct=0.5, hysteresis_pct=0.0, buy_drawdown_pct=0.5, downtrend_multiplier=1.0, buy_lookback="week")]
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("params", PARAMS)
+def test_vectorized_simulation_matches_reference_loop(seed, params):
+    series = _series(seed, 3000)
+    fast, _ = simulate(series, params, risk_level=3)
+    ref = simulate_reference(series, params, risk_level=3)
+    assert fast.buys > 0 and fast.sells > 0
+    assert (fast.buys, fast.sells, fast.open_packages) == (ref.buys, ref.sells, ref.open_packages)
+    assert fast.realized_pnl_usd == pytest.approx(ref.realized_pnl_usd)
+    assert fast.unrealized_pnl_usd == pytest.approx(ref.unrealized_pnl_usd, abs=1e-6)
+
+def test_rolling_min_matches_naive():
+    x = np.random.default_rng(7).normal(size=257)
+    for w in (1, 2, 5, 64, 300):
+        assert np.array_equal(rolling_min(x, w), [x[max(0, i - w + 1):i + 1].min() for i in range(len(x))])
+
+def test_csv_ema_uses_bot_indicator(tmp_path):
+    path = tmp_path / "k.csv"
+    closes = [100.0 + i % 7 for i in range(40)]
+    path.write_text("open_time,open,high,low,close,volume,close_time,qv,trades\n"
+                    + "".join(f"{i * 300_000},{c},{c},{c},{c},1,0,0,10\n" for i, c in enumerate(closes)))
+    s = load_klines_csv(str(path), "BTCUSDC")
+    e = EMA(12)
+    expected = [e.update(Bar(0, c, c, c, c, 1.0)) for c in closes]
+    assert np.isnan(s.ema_fast[:11]).all() and s.ema_fast[11:].tolist() == pytest.approx(expected[11:])
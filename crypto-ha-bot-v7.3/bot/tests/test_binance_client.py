@@ -0,0 +1,53 @@
+import threading
+import pytest
+from app import binance_client
+from app.binance_client import WeightBudget
+
+class Clock:
+    # wirtualny czas dla WeightBudget: sleep() przesuwa zegar zamiast czekać
+    def __init__(self, t: float):
+        self.t = t
+        self.slept: list[float] = []
+
+    def time(self) -> float:
+        return self.t
+
+    def sleep(self, sec: float):
+        self.slept.append(sec)
+        self.t += sec
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock(60 * 16_667 + 20.0)  # 20 s po początku minuty
+    monkeypatch.setattr(binance_client, "time", c)
+    return c
+
+def test_429_blocks_acquire_until_retry_after(clock):
+    b = WeightBudget(1000)
+    b.acquire(2)
+    b.observe({"X-MBX-USED-WEIGHT-1M": "40", "Retry-After": "7"}, 429)
+    assert b.used == 40
+    b.acquire(2)  # budżet jest, ale blokada obowiązuje do Retry-After, nie do końca minuty
+    assert clock.t == pytest.approx(60 * 16_667 + 27.0)
+    assert b.throttled == 1 and b.throttled_sec == pytest.approx(7.0)
+    b.acquire(2)
+    assert clock.t == pytest.approx(60 * 16_667 + 27.0)  # po blokadzie bez czekania
+
+def test_exhausted_budget_waits_for_next_minute(clock):
+    b = WeightBudget(10)
+    for _ in range(5):
+        b.acquire(2)
+    assert clock.slept == []
+    b.acquire(2)
+    assert clock.t == pytest.approx(60 * 16_668)  # okno Binance: pełna minuta
+    assert b.used == 2 and b.throttled == 1
+
+def test_429_blocks_other_threads():
+    # prawdziwy czas: wątek czekający na budżet rusza dopiero po Retry-After
+    b = WeightBudget(1000)
+    b.observe({"Retry-After": "0.3"}, 418)
+    started = binance_client.time.monotonic()
+    done = []
+    t = threading.Thread(target=lambda: (b.acquire(1), done.append(binance_client.time.monotonic() - started)))
+    t.start(); t.join(5)
+    assert done and done[0] >= 0.28
@@ -0,0 +1,54 @@
+from datetime import datetime
+from fastapi.testclient import TestClient
+from app.cache import response_cache
+from app.collector import fetch_and_store_pairs
+from app.control import load_control
+from app.logger import log_sink
+from app.main import app
+from app.models import TradeLog, Alert
+
+def _row_log(msg: str) -> tuple:
+    return TradeLog, dict(ts=datetime.utcnow(), level="INFO", pair="BTCUSDC", message=msg, strategy="TEST")
+
+def _row_alert() -> tuple:
+    return Alert, dict(ts=datetime.utcnow(), pair="BTCUSDC", pnl_usd=1.0, pnl_percent=5.0, type="positive")
+
+def test_invalidation_is_per_topic(fake):
+    client = TestClient(app)
+    fetch_and_store_pairs(["BTCUSDC"])
+    log_sink._flush([_row_log("a"), _row_alert()])
+    load_control()  # wiersz bot_control przed pierwszym odczytem wersji
+    urls = ("/logs", "/alerts", "/market/history?pair=BTCUSDC", "/config")
+    first = {u: client.get(u) for u in urls}
+    assert all(r.status_code == 200 for r in first.values())
+
+    def served() -> dict:
+        # url -> czy z cache (trafienie) i czy ten sam ETag co w pierwszym odczycie
+        out = {}
+        for u in urls:
+            hits = response_cache.hits
+            r = client.get(u)
+            out[u] = (response_cache.hits > hits, r.headers["etag"] == first[u].headers["etag"])
+        return out
+
+    assert all(hit for hit, _ in served().values())
+
+    # DELETE /alerts: nowa treść /alerts, reszta nadal z cache
+    assert client.delete("/alerts").json()["deleted"] == 1
+    s = served()
+    assert s["/alerts"] == (False, False) and client.get("/alerts").json() == []
+    assert s["/logs"] == s["/market/history?pair=BTCUSDC"] == s["/config"] == (True, True)
+
+    # zapis logu w tym procesie: /logs od razu świeże, market i config nietknięte
+    log_sink._flush([_row_log("b")])
+    s = served()
+    assert s["/logs"] == (False, False) and client.get("/logs").json()[0]["message"] == "b"
+    assert s["/market/history?pair=BTCUSDC"] == s["/config"] == (True, True)
+
+    # kolektor: tylko market
+    hits = response_cache.hits
+    client.get("/logs")
+    fetch_and_store_pairs(["ETHUSDC"])
+    assert response_cache.hits == hits + 1
+    s = served()
+    assert s["/market/history?pair=BTCUSDC"][0] is False and s["/config"] == (True, True) and s["/logs"][0] is True
@@ -0,0 +1,27 @@
+import time
+import pytest
+from sqlalchemy import select, func
+from app.binance_client import set_client
+from app.collector import fetch_and_store_pairs
+from app.config import settings
+from app.database import get_session
+from app.fake_exchange import FakeSpot
+from app.models import MarketData
+
+LATENCY_MS = 40
+
+def test_pairs_fetched_concurrently(fake, monkeypatch):
+    pairs = [f"P{i}USDC" for i in range(16)]
+    monkeypatch.setattr(settings, "COLLECTOR_CONCURRENCY", 8)
+    client = FakeSpot(pairs, latency_ms=LATENCY_MS)
+    set_client(client)
+    t0 = time.perf_counter()
+    assert fetch_and_store_pairs(pairs) == len(pairs)
+    wall = time.perf_counter() - t0
+    serial = sum(client.calls.values()) * LATENCY_MS / 1000
+    assert client.calls["klines"] == len(pairs)
+    # 16 par / 8 wątków: ~2 opóźnienia zamiast 16; zapas na zapis do bazy i stan wskaźników
+    assert wall < serial / 2
+    s = get_session()
+    assert s.execute(select(func.count(func.distinct(MarketData.pair)))).scalar() == len(pairs)
+    s.close()
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.control import heartbeat, load_heartbeats
+from app.database import get_session
+from app.main import app
+from app.models import WorkerHeartbeat
+
+def test_dead_worker_not_masked_by_live_one(fake):
+    heartbeat("w1", {"running": True, "pairs": 1})
+    heartbeat("w2", {"running": True, "pairs": 2})
+    # w1 przestał się odzywać; w2 nadal wysyła heartbeat
+    s = get_session()
+    s.execute(update(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == "w1").values(seen_at=datetime.utcnow() - timedelta(hours=2)))
+    s.commit(); s.close()
+    heartbeat("w2", {"running": True, "pairs": 3})
+
+    beats = {b["id"]: b for b in load_heartbeats()}
+    assert beats["w1"]["alive"] is False and beats["w2"]["alive"] is True
+    assert beats["w2"]["last_tick"]["pairs"] == 3 and beats["w1"]["last_tick"]["pairs"] == 1
+
+    health = TestClient(app).get("/health").json()
+    assert health["worker"]["id"] == "w2" and health["worker"]["alive"] == 1 and health["worker"]["dead"] == ["w1"]
+    assert health["last_tick"]["pairs"] == 3
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app.database import get_session
+from app.events import EventBus
+from app.models import Package
+
+def _add(n: int, sold_at=None) -> list[int]:
+    s = get_session()
+    pkgs = [Package(pair="BTCUSDC", quantity=1.0, entry_price=10.0, sold_at=sold_at) for _ in range(n)]
+    s.add_all(pkgs); s.commit()
+    ids = [p.id for p in pkgs]
+    s.close()
+    return ids
+
+def _sell(pid: int, at: datetime):
+    s = get_session()
+    s.execute(update(Package).where(Package.id == pid).values(sold_at=at, exit_price=11.0, realized_pnl_usd=1.0))
+    s.commit(); s.close()
+
+def _sold(bus: EventBus) -> list[int]:
+    return [d["id"] for kind, d in bus._poll() if kind == "package" and d["state"] == "sold"]
+
+def test_sold_packages_published_once(fake):
+    p1, p2, p3 = _add(3)
+    bus = EventBus(100)
+    bus._init_cursors()
+    t = datetime.utcnow().replace(microsecond=0)  # sold_at z dokładnością do sekundy (MariaDB DATETIME)
+
+    _sell(p1, t)
+    assert _sold(bus) == [p1]
+    _sell(p2, t)  # ta sama sekunda, commit po odczycie
+    assert _sold(bus) == [p2]
+    assert _sold(bus) == []
+    _sell(p3, t - timedelta(seconds=10))  # sold_at ustawione przed długim commitem
+    assert _sold(bus) == [p3]
+
+    p4, = _add(1, sold_at=t)  # kupiony i sprzedany między odczytami
+    events = [(d["id"], d["state"]) for kind, d in bus._poll() if kind == "package"]
+    assert events == [(p4, "sold")]
+    assert _sold(bus) == []
@@ -0,0 +1,81 @@
+import json
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select, insert, update
+from app.database import get_session
+from app.export import Exporter, STATE_FILE, open_pair, columns, load_series, partitions
+from app.models import MarketData, Package
+
+START = datetime(2025, 1, 31, 20, 0)  # zakres przez granicę miesiąca: dwie partycje na parę
+
+def _seed(start: datetime, n: int):
+    s = get_session()
+    s.execute(insert(MarketData), [dict(pair=pair, ts=start + timedelta(minutes=5 * i), price=100.0 * (j + 1) + i, volume=1.0,
+                                        trades_per_hour=i, ema_fast=None if i % 3 else float(i))
+                                   for i in range(n) for j, pair in enumerate(("BTCUSDC", "ETHUSDC"))])
+    s.commit(); s.close()
+
+def _db(pair: str) -> tuple[np.ndarray, np.ndarray]:
+    s = get_session()
+    rows = s.execute(select(MarketData.ts, MarketData.price).where(MarketData.pair == pair).order_by(MarketData.ts)).all()
+    s.close()
+    return np.array([r[0] for r in rows], dtype="datetime64[s]").view(np.int64), np.array([r[1] for r in rows])
+
+def _assert_matches_db(root: str):
+    series = load_series(root)
+    assert sorted(series) == ["BTCUSDC", "ETHUSDC"]
+    for pair, ser in series.items():
+        ts, price = _db(pair)
+        assert np.array_equal(ser.ts, ts) and np.array_equal(ser.price, price)
+
+def test_market_data_export_is_incremental(fake, tmp_path):
+    root = str(tmp_path)
+    _seed(START, 60)
+    assert Exporter(root, batch=25, max_parts=100).run()["market_data"] == 120
+    assert len(partitions(root, "market_data", "BTCUSDC")) >= 2  # styczeń i luty
+    assert Exporter(root, batch=25, max_parts=100).run()["market_data"] == 0  # nic nowego
+    _seed(START + timedelta(minutes=5 * 60), 20)
+    assert Exporter(root, batch=25, max_parts=100).run()["market_data"] == 40  # tylko nowe id
+    _assert_matches_db(root)
+
+    # utracony znacznik (awaria przed zapisem stanu): powtórka innymi partiami daje nachodzące części,
+    # odczyt zwraca każdy wiersz raz
+    with open(os.path.join(root, STATE_FILE)) as f:
+        state = json.load(f)
+    state["market_data"]["last_id"] //= 2
+    with open(os.path.join(root, STATE_FILE), "w") as f:
+        json.dump(state, f)
+    assert Exporter(root, batch=7, max_parts=100).run()["market_data"] > 0
+    _assert_matches_db(root)
+
+    # scalanie: miesiąc z nowymi częściami (luty) w jeden plik, te same dane
+    assert Exporter(root, batch=25, max_parts=1).compact() == 0  # bez nowych części nic do scalenia
+    _seed(START + timedelta(minutes=5 * 80), 5)
+    assert Exporter(root, batch=25, max_parts=1).run()["parts_merged"] > 0
+    assert len(os.listdir(os.path.join(root, "market_data", "ETHUSDC", "2025-02"))) == 1
+    assert len(os.listdir(os.path.join(root, "market_data", "ETHUSDC", "2025-01"))) > 1  # nietknięty
+    _assert_matches_db(root)
+
+def test_sold_packages_exported_once(fake, tmp_path):
+    root = str(tmp_path)
+    t = datetime.utcnow().replace(microsecond=0)
+    s = get_session()
+    pkgs = [Package(pair="BTCUSDC", quantity=1.0, entry_price=10.0) for _ in range(4)]
+    s.add_all(pkgs); s.commit()
+    ids = [p.id for p in pkgs]
+    s.close()
+
+    def sell(pid: int, at: datetime):
+        s = get_session()
+        s.execute(update(Package).where(Package.id == pid).values(sold_at=at, exit_price=11.0, realized_pnl_usd=1.0))
+        s.commit(); s.close()
+
+    sell(ids[0], t)
+    assert Exporter(root).run()["packages"] == 1
+    sell(ids[1], t)  # ta sama sekunda, po poprzednim przebiegu
+    sell(ids[2], t - timedelta(seconds=10))  # sold_at sprzed znacznika (długi commit)
+    assert Exporter(root).run()["packages"] == 2
+    assert Exporter(root).run()["packages"] == 0
+    exported = columns(open_pair(root, "BTCUSDC", "packages"), ["id"], key="id")["id"]
+    assert sorted(exported.tolist()) == sorted(ids[:3])  # otwarty pakiet nie trafia do eksportu
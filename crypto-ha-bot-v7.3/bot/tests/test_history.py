@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app import history
+from app.database import get_session
+from app.models import MarketData
+from app.retention import rollup_raw
+
+def _seed(pair: str, start: datetime, n: int):
+    s = get_session()
+    s.execute(insert(MarketData), [dict(pair=pair, ts=start + timedelta(minutes=5 * i), price=100.0 + (i * 7) % 31,
+                                        volume=1.0, trades_per_hour=0) for i in range(n)])
+    s.commit(); s.close()
+
+def test_points_short_range_uses_raw_rows(fake):
+    start = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(hours=10)
+    _seed("BTCUSDC", start, 120)
+    pts = history.points("BTCUSDC", start, start + timedelta(hours=10), 50)
+    assert len(pts) == 50 and pts[0]["ts"] == start.isoformat()  # LTTB zachowuje pierwszy surowy punkt
+
+def test_points_long_range_reads_buckets(fake, monkeypatch):
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=60)
+    _seed("BTCUSDC", start, 60 * 288)
+    raw_reads = []
+    candles = history.candles
+    monkeypatch.setattr(history, "candles", lambda *a: raw_reads.append(a) or candles(*a))
+    pts = history.points("BTCUSDC", start, end, 100)
+    # 17280 wierszy 5m -> kubełki z bazy (nie więcej niż RAW_FACTOR * max_points), potem LTTB
+    assert len(pts) == 100
+    (_, _, _, res), = raw_reads
+    assert (end - start).total_seconds() / history.RESOLUTIONS[res] <= history.RAW_FACTOR * 100
+    secs = history.RESOLUTIONS[res]
+    assert all(int((datetime.fromisoformat(p["ts"]) - datetime(1970, 1, 1)).total_seconds()) % secs == 0 for p in pts)
+
+    # po retencji ten sam zakres z rollupów 1h
+    assert rollup_raw(end + timedelta(hours=1), 5000) == 60 * 288
+    after = history.points("BTCUSDC", start, end, 100)
+    assert len(after) == 100
@@ -0,0 +1,39 @@
+import math
+import pytest
+from app import indicators
+from app.indicators import Indicator, IndicatorEngine, IndicatorSet, Bar, RSI, ATR, VWAP
+
+def _bars(n: int, start: int = 0) -> list[Bar]:
+    out = []
+    for i in range(start, start + n):
+        c = 100.0 + 10 * math.sin(i / 7) + (i % 5) * 0.3
+        out.append(Bar(i * 300_000, c - 0.2, c + 1.0 + (i % 3) * 0.1, c - 1.0, c, 1.0 + i % 4))
+    return out
+
+def test_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        Indicator()
+    class NoValue(Indicator):
+        def update(self, bar): return None
+    with pytest.raises(TypeError):
+        NoValue()
+
+def test_resumed_state_matches_cold_recompute(fake, monkeypatch):
+    monkeypatch.setattr(indicators, "REGISTRY", {**indicators.REGISTRY, "rsi": lambda: RSI(14), "atr": lambda: ATR(14), "vwap": VWAP})
+    bars = _bars(400)
+    cold = IndicatorSet()
+    for b in bars:
+        cold.update(b)
+
+    # proces 1: część historii, zapis stanu; proces 2 (nowy silnik): odczyt i dalsze świece
+    first = IndicatorEngine()
+    first.update("BTCUSDC", bars[:250])
+    first.save(["BTCUSDC"])
+    second = IndicatorEngine()
+    second.ensure_loaded(["BTCUSDC"])
+    assert second.get("BTCUSDC").values() == first.get("BTCUSDC").values()
+    second.update("BTCUSDC", bars[240:])  # zakładka: świece już policzone są pomijane
+    resumed = second.get("BTCUSDC").values()
+    assert set(resumed) == {"ema_fast", "ema_slow", "rsi", "atr", "vwap"}
+    assert all(v is not None for v in resumed.values())
+    assert resumed == pytest.approx(cold.values(), rel=1e-12)
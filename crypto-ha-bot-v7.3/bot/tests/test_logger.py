@@ -0,0 +1,89 @@
+import threading
+import time
+from sqlalchemy import select, func
+from app import logger
+from app.database import get_session
+from app.logger import LogSink, log, add_alert
+from app.models import TradeLog, Alert
+
+def _count(model, **where) -> int:
+    s = get_session()
+    try:
+        return s.execute(select(func.count()).select_from(model).filter_by(**where)).scalar()
+    finally:
+        s.close()
+
+def _stalled(monkeypatch, policy: str, maxsize: int = 2) -> tuple[LogSink, threading.Event]:
+    # sink, którego zapis czeka na gate: wątek trzyma jeden wiersz, kolejka mieści maxsize
+    sink = LogSink(maxsize, batch_size=1, flush_sec=0.05, policy=policy, block_sec=0.2)
+    gate = threading.Event()
+    flush = sink._flush
+    monkeypatch.setattr(sink, "_flush", lambda batch: (gate.wait(10), flush(batch)))
+    monkeypatch.setattr(logger, "log_sink", sink)
+    sink.start()
+    log("BTCUSDC", "w zapisie")
+    deadline = time.monotonic() + 2
+    while sink.q.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for i in range(maxsize):
+        log("BTCUSDC", f"w kolejce {i}")
+    return sink, gate
+
+def test_drop_policy_drops_info_but_not_warn_or_alerts(fake, monkeypatch):
+    sink, gate = _stalled(monkeypatch, "drop")
+    t0 = time.monotonic()
+    log("BTCUSDC", "nadmiar")
+    assert time.monotonic() - t0 < 0.1 and sink.dropped == 1  # INFO: od razu do kosza
+    # WARN/ERROR i alert: czekają block_sec, potem zapis synchroniczny
+    log("BTCUSDC", "ostrzeżenie", "WARN")
+    log("BTCUSDC", "błąd", "ERROR")
+    add_alert("BTCUSDC", 12.0, 10.5, "PNL_POSITIVE")
+    assert sink.dropped == 1
+    assert _count(TradeLog, level="WARN") == _count(TradeLog, level="ERROR") == _count(Alert) == 1
+    gate.set()
+    sink.stop()
+    assert _count(TradeLog, level="INFO") == 3 and sink.written == 3
+
+def test_block_policy_waits_for_room(fake, monkeypatch):
+    sink, gate = _stalled(monkeypatch, "block")
+    threading.Timer(0.1, gate.set).start()  # zapis rusza w trakcie oczekiwania
+    log("BTCUSDC", "czeka na miejsce")
+    assert sink.dropped == 0
+    sink.stop()
+    assert _count(TradeLog) == 4
+
+def test_stop_flushes_queue(fake, monkeypatch):
+    sink = LogSink(1000, batch_size=1000, flush_sec=30, policy="drop", block_sec=1)
+    monkeypatch.setattr(logger, "log_sink", sink)
+    sink.start()
+    for i in range(50):
+        log("ETHUSDC", f"wiersz {i}")
+    add_alert("ETHUSDC", -6.0, -5.5, "PNL_NEGATIVE")
+    assert _count(TradeLog) == 0  # partia czeka na flush_sec
+    t0 = time.monotonic()
+    sink.stop()
+    assert time.monotonic() - t0 < 5
+    assert _count(TradeLog) == 50 and _count(Alert) == 1 and sink.stats()["queued"] == 0
+
+def test_failed_batch_is_retried_and_loss_is_logged(fake, monkeypatch):
+    sink = LogSink(100, batch_size=100, flush_sec=0.01, policy="drop", block_sec=1)
+    insert = sink._insert
+    fails = [1]
+    def flaky(batch):
+        if fails[0]:
+            fails[0] -= 1
+            raise ConnectionError("zerwane połączenie")
+        return insert(batch)
+    monkeypatch.setattr(sink, "_insert", flaky)
+    rows = [(TradeLog, dict(pair="BTCUSDC", message=f"m{i}", level="INFO")) for i in range(3)]
+    sink._flush(rows)  # jedna ponowna próba wystarcza
+    assert sink.written == 3 and sink.failed == 0
+
+    # wiersz, którego baza nie przyjmie: reszta partii zapisana, strata policzona i zalogowana
+    bad = (TradeLog, dict(pair="BTCUSDC", message=None, level="INFO"))  # message NOT NULL
+    sink._flush(rows + [bad])
+    assert sink.failed == 1 and sink.written == 3 + 3 + 1  # +1: wiersz ERROR o stracie
+    s = get_session()
+    msg = s.execute(select(TradeLog.message).where(TradeLog.level == "ERROR")).scalar()
+    s.close()
+    assert msg.startswith("Utracono 1 z 4 wierszy")
@@ -0,0 +1,45 @@
+import time
+from app.lookback import LookbackCache, HOUR_MS
+
+def _expected_low(fake, pair: str, size: int) -> float:
+    # ta sama definicja okna co bez cache: klines 1h limit=size (z bieżącą świecą)
+    return min(float(k[3]) for k in type(fake).klines(fake, pair, "1h", limit=size))
+
+def _record(fake, monkeypatch) -> list[dict]:
+    calls = []
+    klines = fake.klines
+    def recorded(symbol, interval, **kw):
+        calls.append(kw)
+        return klines(symbol, interval, **kw)
+    monkeypatch.setattr(fake, "klines", recorded)
+    return calls
+
+def test_cold_start_full_refetch_and_extend(fake, monkeypatch):
+    calls = _record(fake, monkeypatch)
+    cache = LookbackCache()
+    size = 24 * 7
+
+    # zimny start: pełne okno jednym zapytaniem
+    assert cache.ref_low(fake, "BTCUSDC", "week") == _expected_low(fake, "BTCUSDC", size)
+    assert calls == [{"limit": size}]
+
+    # kolejny tick: tylko brakujące świece od ostatniej zamkniętej
+    calls.clear()
+    assert cache.ref_low(fake, "BTCUSDC", "week") == _expected_low(fake, "BTCUSDC", size)
+    assert len(calls) == 1 and "startTime" in calls[0] and calls[0]["limit"] <= 2
+
+    # luka dłuższa niż okno: pełne pobranie od nowa, bez starych świec
+    w = cache.windows[("BTCUSDC", size)]
+    w.last_open -= size * HOUR_MS
+    calls.clear()
+    assert cache.ref_low(fake, "BTCUSDC", "week") == _expected_low(fake, "BTCUSDC", size)
+    assert calls == [{"limit": size}]
+    assert w.mins[0][0] >= int(time.time() * 1000) - size * HOUR_MS
+
+def test_restart_resumes_from_persisted_window(fake, monkeypatch):
+    calls = _record(fake, monkeypatch)
+    LookbackCache().ref_low(fake, "ETHUSDC", "week")
+    calls.clear()
+    # nowy proces: okno z lookback_candles, z REST tylko świeca w toku
+    assert LookbackCache().ref_low(fake, "ETHUSDC", "week") == _expected_low(fake, "ETHUSDC", 24 * 7)
+    assert len(calls) == 1 and "startTime" in calls[0]
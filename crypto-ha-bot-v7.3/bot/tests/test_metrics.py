@@ -0,0 +1,49 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import text
+from app import engine as trading_engine
+from app.database import get_session, query_stats
+from app.metrics import Metric, REGISTRY
+
+def _query():
+    s = get_session()
+    s.execute(text("SELECT 1"))
+    s.close()
+
+def test_tick_counts_only_its_own_queries(fake):
+    def tick() -> int:
+        asyncio.run(trading_engine.run_tick(None, True))
+        return trading_engine.tick_stats["queries"]
+
+    tick()
+    quiet = tick()
+    # równoległe zapytania innego wątku (np. API) nie są doliczane do ticku
+    stop = threading.Event()
+    def noise():
+        while not stop.is_set():
+            _query()
+    t = threading.Thread(target=noise)
+    t.start()
+    try:
+        busy = [tick() for _ in range(3)]
+    finally:
+        stop.set(); t.join()
+    assert busy == [quiet] * 3
+
+def test_pool_queries_attributed_via_wrap(fake):
+    with query_stats.track() as tq:
+        asyncio.run(asyncio.to_thread(_query))  # to_thread kopiuje kontekst
+        with ThreadPoolExecutor(max_workers=4) as ex:
+            list(ex.map(query_stats.wrap(lambda _: _query()), range(8)))
+            list(ex.map(lambda _: _query(), range(5)))  # bez wrap: poza tickiem
+    assert tq.count == 9
+
+def test_metric_requires_samples():
+    class Bare(Metric):
+        kind = "gauge"
+    n = len(REGISTRY)
+    with pytest.raises(TypeError):
+        Bare("bot_bare", "bez samples()")
+    assert len(REGISTRY) == n  # nie trafia do /metrics, render() nie wybucha przy scrapie
@@ -0,0 +1,37 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import text, inspect, insert, select, func
+from app.config import settings
+from app.database import engine, get_session
+from app.migrations import run_migrations
+from app.models import MarketData
+
+def _indexes() -> set[str]:
+    with engine.connect() as conn:
+        return {i["name"] for i in inspect(conn).get_indexes("market_data")}
+
+def test_duplicate_market_data_not_deleted_silently(fake, monkeypatch, capsys):
+    # tabela sprzed unikalnego (pair, ts) z duplikatami
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_market_data_pair_ts"))
+    t = datetime(2025, 1, 1)
+    s = get_session()
+    s.execute(insert(MarketData), [dict(pair=p, ts=t, price=1.0 + i, volume=1.0) for p, n in (("BTCUSDC", 3), ("ETHUSDC", 2)) for i in range(n)]
+              + [dict(pair="BTCUSDC", ts=datetime(2025, 1, 2), price=5.0, volume=1.0)])
+    s.commit(); s.close()
+
+    with pytest.raises(RuntimeError, match="3 zdublowanych.*BTCUSDC=2, ETHUSDC=1"):
+        run_migrations()
+    assert "uq_market_data_pair_ts" not in _indexes()
+    s = get_session()
+    assert s.execute(select(func.count()).select_from(MarketData)).scalar() == 6  # nic nie skasowane
+    s.close()
+
+    monkeypatch.setattr(settings, "MIGRATE_DEDUPE_MARKET_DATA", True)
+    run_migrations()
+    assert "BTCUSDC=2, ETHUSDC=1" in capsys.readouterr().out
+    assert "uq_market_data_pair_ts" in _indexes()
+    s = get_session()
+    rows = s.execute(select(MarketData.pair, MarketData.ts, MarketData.price).order_by(MarketData.id)).all()
+    s.close()
+    assert [tuple(r) for r in rows] == [("BTCUSDC", t, 1.0), ("ETHUSDC", t, 1.0), ("BTCUSDC", datetime(2025, 1, 2), 5.0)]
@@ -0,0 +1,127 @@
+import pytest
+from sqlalchemy import select
+from app.database import get_session
+from app.models import Package
+from app.orders import market_buy_package, market_sell_package, market_sell_packages, fill_price
+from app.positions import position_book
+
+def _packages(ids) -> dict[int, Package]:
+    s = get_session()
+    try:
+        return {p.id: p for p in s.scalars(select(Package).where(Package.id.in_(ids)))}
+    finally:
+        s.close()
+
+def test_multi_package_sell_splits_fill(fake):
+    bought = [market_buy_package("BTCUSDC", usd) for usd in (20, 35, 50)]
+    ids = [b["package_id"] for b in bought]
+    total = sum(b["quantity"] for b in bought)
+    res = market_sell_packages("BTCUSDC")
+    assert fake.calls["new_order"] == 4  # 3 kupna + jedno zbiorcze zlecenie sprzedaży
+    assert res["sold_count"] == 3 and res["package_ids"] == ids
+    executed, price = fill_price(res["order"])
+    assert res["quantity"] == executed and executed <= total and res["exit_price"] == price
+
+    pkgs = _packages(ids)
+    sold_qty = {i: pkgs[i].quantity * executed / total for i in ids}
+    assert sum(sold_qty.values()) == pytest.approx(executed)
+    for i in ids:
+        p = pkgs[i]
+        assert p.sold_at is not None and p.sell_claim is None and p.exit_price == price
+        assert p.realized_pnl_usd == pytest.approx((price - p.entry_price) * sold_qty[i])
+    assert res["realized_pnl_usd"] == pytest.approx(sum(p.realized_pnl_usd for p in pkgs.values()))
+    assert position_book.open_packages("BTCUSDC") == []
+    assert market_sell_packages("BTCUSDC")["sold_count"] == 0
+
+def test_single_sell_books_pnl_on_executed_quantity(fake):
+    s = get_session()
+    # ilość spoza kroku LOT_SIZE: zlecenie idzie z ilością zaokrągloną w dół
+    pkg = Package(pair="ETHUSDC", quantity=1.23456789123, entry_price=1.0, peak_price=1.0)
+    s.add(pkg); s.commit()
+    pid = pkg.id
+    s.close()
+    res = market_sell_package(pid, "ETHUSDC")
+    executed, price = fill_price(res["order"])
+    assert executed < 1.23456789123
+    p = _packages([pid])[pid]
+    assert p.realized_pnl_usd == pytest.approx((price - 1.0) * executed)
+    # pył poniżej kroku LOT_SIZE nie znika: zapisany przy pakiecie, bez nowego pakietu
+    assert p.unsold_qty == pytest.approx(1.23456789123 - executed) and res["unsold_qty"] == pytest.approx(p.unsold_qty)
+    assert res["remainder_package_id"] is None and position_book.open_packages("ETHUSDC") == []
+
+class _Probe:
+    # klient podglądający stan pakietów w chwili składania zlecenia
+    def __init__(self, fake, on_order):
+        self.fake, self.on_order = fake, on_order
+
+    def __getattr__(self, name):
+        return getattr(self.fake, name)
+
+    def new_order(self, **kw):
+        self.on_order()
+        return self.fake.new_order(**kw)
+
+def test_packages_claimed_before_order_and_released_on_failure(fake, monkeypatch):
+    ids = [market_buy_package("BTCUSDC", 30)["package_id"] for _ in range(2)]
+    seen = {}
+
+    def during_order():
+        # zajęcie zatwierdzone przed zleceniem: widoczne z innej sesji, bez czekania na blokady
+        seen["claims"] = {p.sell_claim for p in _packages(ids).values()}
+        seen["concurrent"] = market_sell_packages("BTCUSDC")["sold_count"]
+    monkeypatch.setattr("app.orders.get_client", lambda: _Probe(fake, during_order))
+    assert market_sell_packages("BTCUSDC")["sold_count"] == 2
+    assert len(seen["claims"]) == 1 and None not in seen["claims"]
+    assert seen["concurrent"] == 0  # druga sprzedaż tych samych pakietów nic nie dostała
+
+    pid = market_buy_package("BTCUSDC", 30)["package_id"]
+    def reject():
+        raise RuntimeError("rejected")
+    monkeypatch.setattr("app.orders.get_client", lambda: _Probe(fake, reject))
+    with pytest.raises(RuntimeError):
+        market_sell_package(pid, "BTCUSDC")
+    p = _packages([pid])[pid]
+    assert p.sold_at is None and p.sell_claim is None  # odrzucone zlecenie zwalnia pakiet
+
+class _Fill:
+    # klient wykonujący tylko część zlecenia SELL (fraction=0: zlecenie wygasło bez wykonania)
+    def __init__(self, fake, fraction: float):
+        self.fake, self.fraction = fake, fraction
+
+    def __getattr__(self, name):
+        return getattr(self.fake, name)
+
+    def new_order(self, **kw):
+        if kw["side"] == "SELL":
+            kw["quantity"] = format(float(kw["quantity"]) * self.fraction, "f")
+            if self.fraction == 0:
+                return {"symbol": kw["symbol"], "orderId": 1, "status": "EXPIRED", "executedQty": "0", "cummulativeQuoteQty": "0", "fills": []}
+        return self.fake.new_order(**kw)
+
+def test_zero_fill_releases_packages(fake, monkeypatch):
+    ids = [market_buy_package("BTCUSDC", 30)["package_id"] for _ in range(2)]
+    monkeypatch.setattr("app.orders.get_client", lambda: _Fill(fake, 0))
+    with pytest.raises(RuntimeError, match="bez wykonania"):
+        market_sell_packages("BTCUSDC")
+    for p in _packages(ids).values():
+        assert p.sold_at is None and p.sell_claim is None and p.realized_pnl_usd is None
+    assert [p.id for p in position_book.open_packages("BTCUSDC")] == ids
+
+def test_partial_fill_keeps_remainder_open(fake, monkeypatch):
+    bought = [market_buy_package("BTCUSDC", usd) for usd in (40, 60)]
+    ids = [b["package_id"] for b in bought]
+    total = sum(b["quantity"] for b in bought)
+    cost = sum(b["quantity"] * b["entry_price"] for b in bought)
+    monkeypatch.setattr("app.orders.get_client", lambda: _Fill(fake, 0.5))
+    res = market_sell_packages("BTCUSDC")
+    executed, price = fill_price(res["order"])
+    rid = res["remainder_package_id"]
+    pkgs = _packages(ids + [rid])
+    rest = pkgs[rid]
+    assert rest.sold_at is None and rest.quantity == pytest.approx(total - executed)
+    # sprzedane pakiety mają ilość faktycznie sprzedaną; koszt reszty + sprzedanych = koszt zakupu
+    assert sum(pkgs[i].quantity for i in ids) == pytest.approx(executed)
+    assert rest.quantity * rest.entry_price + sum(pkgs[i].quantity * pkgs[i].entry_price for i in ids) == pytest.approx(cost)
+    for i in ids:
+        assert pkgs[i].realized_pnl_usd == pytest.approx((price - pkgs[i].entry_price) * pkgs[i].quantity)
+    assert [p.id for p in position_book.open_packages("BTCUSDC")] == [rid]
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from app.database import get_session
+from app.models import Package, FxRate, PortfolioHistory
+from app.portfolio import fx_cache, portfolio_tracker
+
+def _pln() -> tuple[list, list]:
+    s = get_session()
+    pkgs = s.execute(select(Package.realized_pnl_pln).where(Package.sold_at.is_not(None))).scalars().all()
+    hist = s.execute(select(PortfolioHistory.total_value_pln, PortfolioHistory.realized_pnl_pln)
+                     .order_by(PortfolioHistory.id)).all()
+    s.close()
+    return pkgs, [tuple(r) for r in hist]
+
+def test_pln_persisted_only_from_real_rates(fake):
+    fx_cache.rates.clear(); fx_cache.loaded_at = 0.0
+    now = datetime.utcnow()
+    s = get_session()
+    s.add_all([Package(pair="BTCUSDC", quantity=1.0, entry_price=100.0),
+               Package(pair="ETHUSDC", quantity=1.0, entry_price=10.0, exit_price=15.0, sold_at=now - timedelta(hours=1),
+                       realized_pnl_usd=5.0)])
+    s.commit(); s.close()
+    portfolio_tracker.observe_prices({"BTCUSDC": 110.0})
+
+    # brak fx_rates: żadnych zmyślonych kursów ani 0.0, same NULL-e
+    row = portfolio_tracker.snapshot()
+    assert row["total_value_pln"] is None and row["unrealized_pnl_pln"] is None and row["realized_pnl_pln"] is None
+    assert _pln() == ([None], [(None, None)])
+
+    # kursy się pojawiły: sprzedaż po kursie z chwili sprzedaży, stary wiersz historii po kursie z chwili wyceny
+    s = get_session()
+    s.add(FxRate(ts=now - timedelta(hours=2), base="USD", quote="PLN", rate=4.0))
+    s.commit(); s.close()
+    fx_cache.set({"PLN": 3.5})
+    row = portfolio_tracker.snapshot()
+    assert row["total_value_pln"] == 110.0 * 3.5 and row["realized_pnl_pln"] == 20.0
+    assert _pln() == ([20.0], [(440.0, 20.0), (385.0, 20.0)])
@@ -0,0 +1,89 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.database import get_session
+from app.main import app
+from app.models import Package
+from app.orders import market_buy_package, market_sell_package
+from app.portfolio import portfolio_tracker
+from app.positions import position_book, SoldCursor
+
+def test_portfolio_valued_from_position_book(fake):
+    position_book.load()
+    b1, b2 = (market_buy_package("BTCUSDC", usd) for usd in (20, 30))
+    # pakiet i sprzedaż z innego procesu: tylko w bazie
+    s = get_session()
+    eth = Package(pair="ETHUSDC", quantity=2.0, entry_price=10.0)
+    s.add(eth); s.commit()
+    eth_id = eth.id
+    s.close()
+    portfolio_tracker.observe_prices({"BTCUSDC": 100.0, "ETHUSDC": 12.0})
+
+    row = portfolio_tracker.snapshot()
+    totals = position_book.totals()
+    assert row["open_packages"] == 3 == sum(n for _, _, n in totals.values())
+    btc_qty, btc_cost, _ = totals["BTCUSDC"]
+    assert btc_qty == pytest.approx(b1["quantity"] + b2["quantity"])
+    assert row["total_value_usd"] == pytest.approx(btc_qty * 100.0 + 2.0 * 12.0)
+    assert row["unrealized_pnl_usd"] == pytest.approx(row["total_value_usd"] - btc_cost - 20.0)
+
+    s = get_session()
+    s.execute(update(Package).where(Package.id == eth_id).values(sold_at=datetime.utcnow(), exit_price=12.0, realized_pnl_usd=4.0))
+    s.commit(); s.close()
+    sold = market_sell_package(b1["package_id"], "BTCUSDC")
+    row = portfolio_tracker.snapshot()
+    assert row["open_packages"] == 1 and list(position_book.totals()) == ["BTCUSDC"]
+    assert row["realized_pnl_usd"] == pytest.approx(4.0 + sold["realized_pnl_usd"])
+    assert row["total_value_usd"] == pytest.approx(b2["quantity"] * 100.0)
+
+    body = TestClient(app).get("/positions").json()
+    assert [p["pair"] for p in body["positions"]] == position_book.pairs() == ["BTCUSDC"]
+    assert body["packages"] == 1
+
+def test_sold_cursor_returns_each_sale_once(fake):
+    s = get_session()
+    pkgs = [Package(pair="BTCUSDC", quantity=1.0, entry_price=10.0) for _ in range(3)]
+    s.add_all(pkgs); s.commit()
+    ids = [p.id for p in pkgs]
+    s.close()
+    t = datetime.utcnow().replace(microsecond=0)
+
+    def sell(pid, at):
+        s = get_session()
+        s.execute(update(Package).where(Package.id == pid).values(sold_at=at))
+        s.commit(); s.close()
+
+    cur = SoldCursor()
+    s = get_session()
+    sell(ids[0], t)
+    assert [r.id for r in cur.fetch(s)] == [ids[0]]
+    sell(ids[1], t)  # ta sama sekunda
+    sell(ids[2], t - timedelta(seconds=30))  # spóźniony commit
+    # stan przeżywa zapis (eksport trzyma go w JSON)
+    cur = SoldCursor.from_state(json.loads(json.dumps(cur.state())))
+    assert [r.id for r in cur.fetch(s)] == [ids[2], ids[1]]
+    assert cur.fetch(s) == []
+    s.close()
+
+def test_sync_picks_up_out_of_order_commits(fake):
+    position_book.load()
+    now = datetime.utcnow().replace(microsecond=0)
+
+    def commit(pid, created_at, qty=1.0):
+        s = get_session()
+        s.add(Package(id=pid, pair="ETHUSDC", quantity=qty, entry_price=10.0, created_at=created_at))
+        s.commit(); s.close()
+
+    commit(10, now)
+    position_book.sync()
+    assert list(position_book.get("ETHUSDC").packages) == [10]
+    # id 5 nadane wcześniej, commit dopiero teraz (dłuższa transakcja innego procesu)
+    commit(5, now - timedelta(seconds=5))
+    # reszta po częściowej sprzedaży: nowe id, created_at po sprzedanych pakietach
+    commit(11, now - timedelta(days=3), qty=0.5)
+    position_book.sync()
+    position_book.sync()
+    pos = position_book.get("ETHUSDC")
+    assert sorted(pos.packages) == [5, 10, 11] and pos.qty == pytest.approx(2.5)
@@ -0,0 +1,107 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, event, func
+from app.database import get_session, engine
+from app.config import settings
+from app.models import MarketData, MarketRollup, TradeLog
+from app.retention import rollup_raw, rollup_hourly, run_retention
+
+def _seed(start: datetime, n: int, pairs=("BTCUSDC", "ETHUSDC")) -> list[dict]:
+    rows = []
+    for j, pair in enumerate(pairs):
+        for i in range(n):
+            # cena "piłokształtna": max/min nie wypadają na brzegach kubełka
+            rows.append(dict(pair=pair, ts=start + timedelta(minutes=5 * i), price=100.0 * (j + 1) + (i * 7) % 13,
+                             volume=1.0 + i, trades_per_hour=12 * (i % 5)))
+    s = get_session()
+    s.execute(insert(MarketData), rows)
+    s.commit(); s.close()
+    return rows
+
+def _expected(rows: list[dict], key) -> dict:
+    out = {}
+    for r in sorted(rows, key=lambda r: (r["pair"], r["ts"])):
+        k = (r["pair"], key(r["ts"]))
+        a = out.get(k)
+        if a is None:
+            out[k] = dict(open=r["price"], high=r["price"], low=r["price"], close=r["price"], volume=r["volume"], samples=1)
+        else:
+            a["high"] = max(a["high"], r["price"]); a["low"] = min(a["low"], r["price"]); a["close"] = r["price"]
+            a["volume"] += r["volume"]; a["samples"] += 1
+    return out
+
+def _rollups(resolution: str) -> dict:
+    s = get_session()
+    try:
+        return {(r.pair, r.ts): dict(open=r.open, high=r.high, low=r.low, close=r.close, volume=r.volume, samples=r.samples)
+                for r in s.scalars(select(MarketRollup).where(MarketRollup.resolution == resolution))}
+    finally:
+        s.close()
+
+def _approx(a: dict, b: dict):
+    assert a.keys() == b.keys()
+    for k in a:
+        for f in a[k]:
+            assert abs(a[k][f] - b[k][f]) < 1e-9, (k, f, a[k][f], b[k][f])
+
+def test_rollup_ohlcv_in_bounded_batches(fake):
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    old_start = now - timedelta(days=40, minutes=-5)
+    old = _seed(old_start, 12 * 30)  # 30 h starych świec 5m na parę
+    recent = _seed(now - timedelta(days=1), 24)
+    cutoff = now - timedelta(days=30)
+
+    deletes = []
+    def count_deletes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("DELETE"):
+            deletes.append(cursor.rowcount)
+    event.listen(engine, "after_cursor_execute", count_deletes)
+    try:
+        done = rollup_raw(cutoff, batch=50)
+    finally:
+        event.remove(engine, "after_cursor_execute", count_deletes)
+
+    assert done == len(old)
+    assert deletes and max(deletes) <= 50 and sum(deletes) == len(old)  # kasowanie partiami, nie jednym DELETE
+    hour = lambda ts: ts.replace(minute=0)
+    _approx(_rollups("1h"), _expected(old, hour))
+    s = get_session()
+    left = s.execute(select(func.count()).select_from(MarketData)).scalar()
+    s.close()
+    assert left == len(recent)  # nowsze niż cutoff zostają
+
+    # 1h -> 1d: te same OHLCV co zwinięcie surowych wierszy od razu do doby
+    assert rollup_hourly(now, batch=7) > 0
+    assert _rollups("1h") == {}
+    _approx(_rollups("1d"), _expected(old, lambda ts: ts.replace(hour=0, minute=0)))
+
+def test_retention_is_opt_in(fake):
+    # domyślnie wyłączona (bez RETENTION_ENABLED w środowisku), a wyłączona nie kasuje nic
+    env = {k: v for k, v in os.environ.items() if k != "RETENTION_ENABLED"}
+    out = subprocess.run([sys.executable, "-c", "from app.config import settings; print(settings.RETENTION_ENABLED)"],
+                         env=env, cwd=os.path.dirname(os.path.dirname(__file__)), capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+    old = _seed(datetime.utcnow() - timedelta(days=400), 12)
+    assert run_retention() == {}
+    s = get_session()
+    assert s.execute(select(func.count()).select_from(MarketData)).scalar() == len(old)
+    s.close()
+
+def test_log_retention_is_opt_in(fake, monkeypatch):
+    # domyślnie LOG_RETENTION_DAYS=0: logi zostają; po ustawieniu kasowane także bez RETENTION_ENABLED
+    env = {k: v for k, v in os.environ.items() if k != "LOG_RETENTION_DAYS"}
+    out = subprocess.run([sys.executable, "-c", "from app.config import settings; print(settings.LOG_RETENTION_DAYS)"],
+                         env=env, cwd=os.path.dirname(os.path.dirname(__file__)), capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "0"
+    now = datetime.utcnow()
+    s = get_session()
+    s.add_all([TradeLog(ts=now - timedelta(days=d), level="INFO", pair="BTCUSDC", message=str(d)) for d in (400, 1)])
+    s.commit(); s.close()
+    assert run_retention() == {}
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 30)
+    assert run_retention() == {"logs_pruned": 1}
+    s = get_session()
+    assert s.execute(select(TradeLog.message)).scalars().all() == ["1"]
+    s.close()
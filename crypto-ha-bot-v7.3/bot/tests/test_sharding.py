@@ -0,0 +1,44 @@
+import time
+from app.sharding import ShardCoordinator, HashRing, LEADER
+
+PAIRS = [f"P{i}USDC" for i in range(24)]
+LEASE_SEC = 0.5
+
+def _coord(worker_id: str) -> ShardCoordinator:
+    return ShardCoordinator(worker_id, lease_sec=LEASE_SEC, renew_sec=0.1, vnodes=64)
+
+def test_two_workers_split_pairs_and_take_over(fake):
+    a, b = _coord("w-a"), _coord("w-b")
+    # sam a: wszystkie pary i lider, nowa dzierżawa dostaje token 1
+    assert a.sync(PAIRS) == set(PAIRS)
+    assert a.is_leader() and set(a.tokens.values()) == {1}
+
+    # b dołącza: pary a są jeszcze ważne, więc b nic nie przejmuje, dopóki a ich nie odda
+    assert b.sync(PAIRS) == set()
+    a.sync(PAIRS)  # a widzi b w pierścieniu i zwalnia jego część
+    b.sync(PAIRS)
+    ring = HashRing(["w-a", "w-b"], 64)
+    assert a.owned == {p for p in PAIRS if ring.owner(p) == "w-a"}
+    assert b.owned == {p for p in PAIRS if ring.owner(p) == "w-b"}
+    assert a.owned and b.owned and not a.owned & b.owned and a.owned | b.owned == set(PAIRS)
+    assert all(a.tokens[f"pair:{p}"] == 1 for p in a.owned)  # odnowienie nie zmienia tokenu
+    assert all(b.tokens[f"pair:{p}"] == 2 for p in b.owned)  # przejęcie podbija
+    assert [c.is_leader() for c in (a, b)] == [True, False]
+
+    # a przestaje odnawiać: do valid_until nikt nie przejmuje, potem jeden raz b
+    before = dict(a.tokens)
+    b.sync(PAIRS)
+    assert not a.owned & b.owned and a.owns(next(iter(a.owned)))
+    time.sleep(LEASE_SEC + 0.1)
+    assert a.mine(PAIRS) == [] and not a.is_leader()
+    assert b.sync(PAIRS) == set(PAIRS)
+    assert b.workers == ["w-b"] and b.is_leader()
+    assert all(b.tokens[n] == before[n] + 1 for n in before)  # token a + 1: zapisy a są odrzucane
+    taken = dict(b.tokens)
+    b.sync(PAIRS)
+    assert b.tokens == taken  # kolejne odnowienie nie jest przejęciem
+
+    # a wraca: pary odda mu dopiero b, jeden lider przez cały czas
+    a.sync(PAIRS); b.sync(PAIRS); a.sync(PAIRS)
+    assert not a.owned & b.owned and a.owned | b.owned == set(PAIRS)
+    assert [a.is_leader(), b.is_leader()].count(True) == 1 and b.tokens[LEADER] == taken[LEADER]
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from app.database import get_session, query_stats
+from app.models import MarketData, Package, PairConfig
+from app.positions import position_book
+from app.snapshot import load_snapshots
+
+T0 = datetime(2025, 1, 1)
+N = 5
+
+def _seed(pairs: list[str], packages: int):
+    # para: konfiguracja, 3 świece i `packages` otwartych pakietów; co piąty pakiet sprzedany
+    s = get_session()
+    s.execute(insert(PairConfig), [dict(pair=p, allowed=True, risk_level=i % 10) for i, p in enumerate(pairs)])
+    s.execute(insert(MarketData), [dict(pair=p, ts=T0 + timedelta(minutes=5 * k), price=10.0 + i + k, volume=1.0, trades_per_hour=100 + k)
+                                   for i, p in enumerate(pairs) for k in range(3)])
+    s.execute(insert(Package), [dict(pair=p, quantity=1.0, entry_price=5.0) for p in pairs for _ in range(packages)])
+    s.commit()
+    s.execute(update(Package).where(Package.id % 5 == 0, Package.sold_at.is_(None)).values(sold_at=datetime.utcnow(), exit_price=6.0))
+    s.commit(); s.close()
+
+def _queries(pairs: list[str]) -> tuple[int, dict]:
+    with query_stats.track() as tq:
+        snaps = load_snapshots(pairs)
+    return tq.count, snaps
+
+def test_snapshot_queries_do_not_grow_with_pairs_or_packages(fake):
+    small = [f"S{i}USDC" for i in range(N)]
+    _seed(small, packages=4)
+    position_book.load()
+    base, snaps = _queries(small)
+    assert base == 4
+    assert snaps["S1USDC"].price == 13.0 and snaps["S1USDC"].tph == 102 and snaps["S1USDC"].risk_level == 1
+
+    # 10x par i pakietów, nowe pakiety i sprzedaże doczytuje ta sama runda zapytań
+    big = small + [f"B{i}USDC" for i in range(9 * N)]
+    _seed(big[N:], packages=40)
+    count, snaps = _queries(big)
+    assert count == base
+    assert len(snaps) == 10 * N and all(sn.price is not None for sn in snaps.values())
+    s = get_session()
+    open_pkgs = s.query(Package).filter(Package.sold_at.is_(None)).count()
+    s.close()
+    assert sum(len(sn.position.packages) for sn in snaps.values()) == open_pkgs
+    assert _queries(big)[0] == base
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+import websockets
+from sqlalchemy import select
+from app import engine as trading_engine
+from app.config import settings
+from app.database import get_session
+from app.models import MarketData
+from app.stream import MarketStream
+
+STEP = 300_000
+
+def kline(pair: str, t: int, close: float, closed: bool) -> str:
+    k = {"t": t, "o": close, "h": close, "l": close, "c": close, "v": 1.5, "n": 10, "x": closed}
+    return json.dumps({"stream": f"{pair.lower()}@kline_5m", "data": {"e": "kline", "s": pair, "k": k}})
+
+def stored(pair: str) -> dict:
+    s = get_session()
+    try:
+        return {r.ts: r.price for r in s.scalars(select(MarketData).where(MarketData.pair == pair))}
+    finally:
+        s.close()
+
+async def _scenario(monkeypatch, fake):
+    t0 = (int(time.time() * 1000) // STEP - 3) * STEP
+    t1 = t0 + STEP
+    # 1. połączenie: zamknięcie t0, zaraz po nim otwarta t1 (nadpisuje bieżącą świecę), rozłączenie
+    # 2. połączenie: powtórka zamkniętej t0, zamknięcie t1, otwarta t2
+    scripts = [[kline("BTCUSDC", t0, 100.0, False), kline("BTCUSDC", t0, 101.0, True), kline("BTCUSDC", t1, 101.5, False)],
+               [kline("BTCUSDC", t0, 101.0, True), kline("BTCUSDC", t1, 102.0, True), kline("BTCUSDC", t1 + STEP, 102.5, False)]]
+    connections = []
+    hold = asyncio.Event()
+
+    async def handler(ws, *_):
+        n = len(connections)
+        connections.append(n)
+        for msg in scripts[min(n, len(scripts) - 1)]:
+            await ws.send(msg)
+        if n > 0:
+            await hold.wait()
+
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(settings, "BINANCE_WS_URL", f"ws://127.0.0.1:{port}")
+    monkeypatch.setattr(settings, "BOT_INTERVAL_SEC", 1)
+
+    calls = []
+    klines = fake.klines
+    monkeypatch.setattr(fake, "klines", lambda symbol, *a, **kw: (calls.append(symbol), klines(symbol, *a, **kw))[1])
+    rows = []
+    closed_rows = trading_engine.market_state.closed_rows
+
+    def recorded(pairs):
+        out = closed_rows(pairs)
+        rows.extend(out)
+        return out
+    monkeypatch.setattr(trading_engine.market_state, "closed_rows", recorded)
+
+    stream = MarketStream(trading_engine.market_state)
+    monkeypatch.setattr(trading_engine, "market_stream", stream)
+    # przed połączeniem: ścieżka REST dla wszystkich par
+    await trading_engine.run_tick(None, False)
+    assert sorted(calls) == ["BTCUSDC", "ETHUSDC"]
+
+    task = asyncio.create_task(stream.run(lambda: ["BTCUSDC", "ETHUSDC"]))
+    deadline = time.monotonic() + 15
+    while len(connections) < 2 or stream.closed.qsize() or len({r["ts"] for r in rows}) < 2:
+        assert time.monotonic() < deadline, (connections, rows)
+        closed = await trading_engine.next_tick()
+        await trading_engine.run_tick(closed, False)
+
+    # stream milczy dłużej niż BOT_INTERVAL_SEC -> tick REST tylko dla par bez świeżych danych ze streamu
+    hold.set()
+    server.close()
+    await server.wait_closed()
+    calls.clear()
+    assert await trading_engine.next_tick() is None
+    await trading_engine.run_tick(None, False)
+    assert "ETHUSDC" in calls and "BTCUSDC" not in calls
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return t0, t1, connections, rows
+
+def test_closed_candles_stored_once_across_reconnect(monkeypatch, fake):
+    t0, t1, connections, rows = asyncio.run(_scenario(monkeypatch, fake))
+    assert len(connections) >= 2  # rozłączenie -> ponowne połączenie
+    ts0, ts1 = (datetime.utcfromtimestamp((t + STEP) / 1000) for t in (t0, t1))
+    # każda zamknięta świeca zapisana dokładnie raz, także ta nadpisana przez otwartą t1 i powtórzona po reconnect
+    assert [(r["ts"], r["price"]) for r in rows] == [(ts0, 101.0), (ts1, 102.0)]
+    db = stored("BTCUSDC")
+    assert db[ts0] == 101.0 and db[ts1] == 102.0
+    assert trading_engine.market_state.pending == {}
@@ -0,0 +1,46 @@
+import json
+from dataclasses import asdict, replace
+import pytest
+from sqlalchemy import select
+from app.database import get_session
+from app.models import SweepResult
+from app.strategies import StrategyParams
+from app.sweep import parse_range, score, sweep, persist
+from test_backtest import _series
+
+def test_parse_range():
+    assert parse_range("2:3:0.5") == [2.0, 2.5, 3.0]
+    assert parse_range("0.1:0.3:0.1") == [0.1, 0.2, 0.3]  # bez 0.30000000000000004 i bez zgubionego końca
+    assert parse_range("1,2, 5", int) == [1, 2, 5]
+    assert parse_range("3:2:1") == []
+
+def test_score():
+    r = {"realized_pnl_usd": 10.0, "unrealized_pnl_usd": -4.0, "max_drawdown_usd": 3.0}
+    assert (score(r, "pnl"), score(r, "realized"), score(r, "pnl_dd")) == (6.0, 10.0, 2.0)
+    assert score({**r, "max_drawdown_usd": 0.0}, "pnl_dd") == 6.0  # drawdown < 1 USD nie wysadza ilorazu
+
+def test_sweep_pool_matches_serial_and_persists(fake):
+    series = {p: replace(_series(i, 2000), pair=p) for i, p in enumerate(("BTCUSDC", "ETHUSDC"))}
+    base = StrategyParams(min_trades_per_hour=50)
+    grid = [replace(base, min_profit_pct=mp, hysteresis_pct=h) for h in (0.3, 1.0) for mp in (1.0, 3.0)]
+    risk = {"BTCUSDC": 3}
+
+    serial, n = sweep(series, grid, risk, 0.1, workers=1, rank_by="pnl_dd")
+    assert n == 1 and len(serial) == 4
+    # workery z seriami z plików .npy (mmap): te same wyniki co w jednym procesie
+    pooled, n = sweep(series, grid, risk, 0.1, workers=2, rank_by="pnl_dd")
+    assert n == 2
+    assert [r["params"] for r in pooled] == [r["params"] for r in serial]
+    for a, b in zip(pooled, serial):
+        assert a.keys() == b.keys()
+        assert {k: v for k, v in a.items() if k != "params"} == pytest.approx({k: v for k, v in b.items() if k != "params"})
+    assert [r["score"] for r in serial] == sorted((r["score"] for r in serial), reverse=True)
+
+    persist("run1", serial)
+    s = get_session()
+    rows = s.scalars(select(SweepResult).where(SweepResult.run_id == "run1").order_by(SweepResult.rank)).all()
+    s.close()
+    assert [r.rank for r in rows] == [1, 2, 3, 4]
+    assert [json.loads(r.params) for r in rows] == [r["params"] for r in serial]
+    assert {json.dumps(asdict(p), sort_keys=True) for p in grid} == {json.dumps(json.loads(r.params), sort_keys=True) for r in rows}
+    assert [(r.score, r.buys, r.sells) for r in rows] == [(r["score"], r["buys"], r["sells"]) for r in serial]
@@ -0,0 +1,67 @@
+from decimal import Decimal
+import pytest
+from app.symbols import SymbolIndex, OrderRejected, floor_step
+
+class Info:
+    # exchangeInfo z jawnymi filtrami (krok 0.001, tick 0.01, minQty 0.001, minNotional 5)
+    def __init__(self, *extra):
+        self.symbols = [
+            {"symbol": "BTCUSDC", "status": "TRADING", "baseAsset": "BTC", "quoteAsset": "USDC", "quoteAssetPrecision": 8,
+             "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.01000000"},
+                         {"filterType": "LOT_SIZE", "stepSize": "0.00100000", "minQty": "0.00100000", "maxQty": "100.00000000"},
+                         {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True}]},
+            *extra]
+
+    def exchange_info(self, **kw):
+        return {"symbols": self.symbols}
+
+@pytest.fixture
+def index():
+    ix = SymbolIndex(3600)
+    ix.refresh(Info(
+        {"symbol": "ETHBTC", "status": "BREAK", "filters": []},
+        {"symbol": "DOGEUSDC", "status": "TRADING", "quoteAssetPrecision": 4,
+         "filters": [{"filterType": "LOT_SIZE", "stepSize": "1", "minQty": "1", "maxQty": "1000000"},
+                     {"filterType": "MARKET_LOT_SIZE", "stepSize": "10", "minQty": "20", "maxQty": "5000"},
+                     {"filterType": "MIN_NOTIONAL", "minNotional": "10", "applyToMarket": False}]}))
+    return ix
+
+def test_floors_to_step_and_tick(index):
+    assert index.market_quantity("BTCUSDC", 1.2345678) == Decimal("1.234")
+    assert index.market_quantity("BTCUSDC", 0.0019999) == Decimal("0.001")
+    assert index.round_price("BTCUSDC", 27123.456789) == Decimal("27123.45")
+    assert index.market_quote("BTCUSDC", 12.345678901234) == Decimal("12.34567890")
+
+def test_float_noise_does_not_lose_a_step(index):
+    # sumy ilości pakietów: 0.30000000000000004, 0.9999999999999999, 2.0999999999999996
+    assert index.market_quantity("BTCUSDC", 0.1 + 0.2) == Decimal("0.3")
+    assert index.market_quantity("BTCUSDC", 1.001 - 0.001) == Decimal("1")
+    assert index.market_quantity("BTCUSDC", 0.7 * 3) == Decimal("2.1")
+    assert floor_step(0.0029999, Decimal("0.001")) == Decimal("0.002")  # prawdziwa reszta zostaje
+
+def test_min_qty_boundary(index):
+    assert index.market_quantity("BTCUSDC", 0.001) == Decimal("0.001")
+    with pytest.raises(OrderRejected, match="minQty"):
+        index.market_quantity("BTCUSDC", 0.000999)
+    with pytest.raises(OrderRejected, match="maxQty"):
+        index.market_quantity("BTCUSDC", 100.001)
+
+def test_min_notional(index):
+    assert index.market_quantity("BTCUSDC", 0.01, price=500.0) == Decimal("0.01")  # dokładnie 5
+    with pytest.raises(OrderRejected, match="minNotional"):
+        index.market_quantity("BTCUSDC", 0.01, price=499.99)
+    assert index.market_quote("BTCUSDC", 5.0) == Decimal("5")
+    with pytest.raises(OrderRejected, match="minNotional"):
+        index.market_quote("BTCUSDC", 4.99999999)
+
+def test_market_lot_size_and_status(index):
+    # MARKET_LOT_SIZE zaostrza krok i minQty; applyToMarket=False wyłącza minNotional dla MARKET
+    assert index.market_quantity("DOGEUSDC", 57, price=0.01) == Decimal("50")
+    with pytest.raises(OrderRejected, match="minQty"):
+        index.market_quantity("DOGEUSDC", 19)
+    with pytest.raises(OrderRejected, match="maxQty"):
+        index.market_quantity("DOGEUSDC", 5010)
+    with pytest.raises(OrderRejected, match="BREAK"):
+        index.market_quantity("ETHBTC", 1)
+    with pytest.raises(OrderRejected, match="brak symbolu"):
+        index.market_quantity("XRPUSDC", 1)
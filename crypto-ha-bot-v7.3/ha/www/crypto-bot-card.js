@@ -5,23 +5,55 @@ class CryptoBotCard extends HTMLElement {
     this.attachShadow({ mode: "open" });
     this.render();
     this.refresh();
-    this.timer = setInterval(() => this.refresh(), 30000);
+    this.connect();
+  }
+  disconnectedCallback(){
+    if (this.timer) clearInterval(this.timer);
+    if (this.es) this.es.close();
+  }
+
+  // push z /events (SSE); pełne odświeżenie tylko na starcie, po "reset" i po zmianie pakietów
+  connect() {
+    if (this.es) this.es.close();
+    if (this.timer) clearInterval(this.timer);
+    if (!window.EventSource) { this.timer = setInterval(() => this.refresh(), 30000); return; }
+    this.es = new EventSource(`${this.config.backend_url}/events`);
+    const on = (ev, fn) => this.es.addEventListener(ev, e => fn(JSON.parse(e.data || "{}")));
+    on("market", p => this.onMarket(p));
+    on("log", l => this.onRow("logs", l));
+    on("alert", a => this.onRow("alerts", a));
+    on("package", () => this.refresh());
+    on("reset", () => this.refresh());
+    // zapasowo: rzadkie pełne odświeżenie (status workera, konfiguracja zmieniona gdzie indziej)
+    this.timer = setInterval(() => this.refresh(), 300000);
+  }
+  onMarket(p) {
+    const st = this.state;
+    if (!st || !st.pairs) return;
+    const key = p.pair === st.pairs[0] ? "h1" : p.pair === st.pairs[1] ? "h2" : null;
+    if (!key) return;
+    st[key] = (st[key] || []).concat([{ ts: p.ts, price: p.price }]).slice(-100);
+    this.scheduleRender();
+  }
+  onRow(key, row) {
+    const st = this.state;
+    if (!st) return;
+    st[key] = [row].concat(st[key] || []).slice(0, 50);
+    this.scheduleRender();
+  }
+  scheduleRender() {
+    if (this.pending) return;
+    this.pending = setTimeout(() => { this.pending = null; this.render(); }, 250);
   }
-  disconnectedCallback(){ if (this.timer) clearInterval(this.timer); }
 
   async refresh() {
     const b = this.config.backend_url;
     const pairs = this.config.pairs || ["BTCUSDC","ETHUSDC"];
     try {
-      const [health, conf, logs, alerts, p1, p2] = await Promise.all([
-        fetch(`${b}/health`).then(r=>r.json()),
-        fetch(`${b}/config`).then(r=>r.json()),
-        fetch(`${b}/logs?limit=50`).then(r=>r.json()),
-        fetch(`${b}/alerts?limit=50`).then(r=>r.json()),
-        fetch(`${b}/market/history?pair=${pairs[0]}&limit=100`).then(r=>r.json()),
-        fetch(`${b}/market/history?pair=${pairs[1]}&limit=100`).then(r=>r.json()),
-      ]);
-      this.state = { health, conf, logs, alerts, h1: p1.points||[], h2: p2.points||[], pairs };
+      // jedno zapytanie; przeglądarka rewaliduje je ETagiem (304 bez treści, gdy dane się nie zmieniły)
+      const d = await fetch(`${b}/dashboard?pairs=${pairs.slice(0,2).join(",")}&points=100&logs=50&alerts=50`, { cache: "no-cache" }).then(r=>r.json());
+      const hist = d.history || {};
+      this.state = { health: d.health, conf: d.config, logs: d.logs, alerts: d.alerts, h1: hist[pairs[0]]||[], h2: hist[pairs[1]]||[], pairs };
     } catch (e) {
       this.state = { error: e.toString() };
     }